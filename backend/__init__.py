@@ -0,0 +1,4 @@
+import time
+
+# when the backend started importing, for the startup report logged by main.lifespan
+IMPORT_STARTED = time.perf_counter()
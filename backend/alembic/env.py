@@ -1,3 +1,4 @@
+import re
 from logging.config import fileConfig
 
 from alembic import context
@@ -26,6 +27,32 @@ target_metadata = Base.metadata
 # override the db url using the get_db_url function
 config.set_main_option("sqlalchemy.url", get_db_url())
 
+
+# the search vector is postgres only and kept out of the model, see db_models.Transaction
+UNMODELLED = {("column", "search_vector"), ("index", "ix_transactions_search_vector")}
+
+
+PARTITION_NAME = r"transactions_\d{4}"
+
+
+def include_name(name, type_, parent_names):
+    # yearly transactions partitions are created at runtime, see crud.ensure_transaction_partitions
+    if type_ == "table":
+        return re.fullmatch(PARTITION_NAME, name) is None
+    if parent_names.get("table_name") == "transactions":
+        return (type_, name) not in UNMODELLED
+    return True
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # postgres copies foreign keys to the partitioned transactions onto each partition
+    if type_ == "foreign_key_constraint" and reflected:
+        return not any(
+            re.match(PARTITION_NAME + r"\.", element.target_fullname) for element in object.elements
+        )
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -48,6 +75,8 @@ def run_migrations_offline() -> None:
     context.configure(
         url=config.get_main_option("sqlalchemy.url"),
         target_metadata=target_metadata,
+        include_name=include_name,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -70,7 +99,12 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
+            include_object=include_object,
+        )
 
         with context.begin_transaction():
             context.run_migrations()
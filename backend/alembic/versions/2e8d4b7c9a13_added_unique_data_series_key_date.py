@@ -0,0 +1,55 @@
+"""added unique data series key date
+
+Revision ID: 2e8d4b7c9a13
+Revises: 9c2b6e4f1a57
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2e8d4b7c9a13"
+down_revision: Union[str, None] = "9c2b6e4f1a57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # keep the most recently added value for each key and date, tombstoning the rest so
+    # incremental backups replay the clean up
+    op.execute(
+        """
+        WITH duplicates AS (
+            DELETE FROM data_series
+            WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, row_number() OVER (
+                        PARTITION BY key_id, date_time ORDER BY id DESC
+                    ) AS recency
+                    FROM data_series
+                ) ranked
+                WHERE recency > 1
+            )
+            RETURNING id
+        )
+        INSERT INTO deleted_records (table_name, record_id)
+        SELECT 'data_series', id FROM duplicates
+        """
+    )
+    op.create_unique_constraint(
+        "unique_data_series_key_date", "data_series", ["key_id", "date_time"]
+    )
+    # the constraint's index covers the same lookups
+    op.drop_index("ix_data_series_key_id_date_time", table_name="data_series")
+
+
+def downgrade() -> None:
+    op.create_index(
+        "ix_data_series_key_id_date_time", "data_series", ["key_id", "date_time"], unique=False
+    )
+    op.drop_constraint("unique_data_series_key_date", "data_series", type_="unique")
@@ -0,0 +1,113 @@
+"""partitioned transactions by year
+
+Revision ID: 3d7b9f2e5a61
+Revises: 8f4a2c6e1b39
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3d7b9f2e5a61"
+down_revision: Union[str, None] = "8f4a2c6e1b39"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UTC_NOW = sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)")
+COLUMNS = (
+    "id, account_id, date_time, amount, is_value_adjustment, transaction_type, description, "
+    "reference, notes, created_at, updated_at"
+)
+
+
+def create_transactions_table(*constraints, **kwargs) -> None:
+    op.create_table(
+        "transactions",
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('transactions_id_seq')"),
+            nullable=False,
+        ),
+        sa.Column("account_id", sa.Integer(), nullable=False),
+        sa.Column("date_time", sa.DateTime(), nullable=False),
+        sa.Column("amount", sa.DECIMAL(precision=10, scale=2), nullable=False),
+        sa.Column("is_value_adjustment", sa.Boolean(), nullable=False),
+        sa.Column("transaction_type", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("reference", sa.String(), nullable=True),
+        sa.Column("notes", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=UTC_NOW, nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=UTC_NOW, nullable=False),
+        sa.ForeignKeyConstraint(["account_id"], ["accounts.id"]),
+        *constraints,
+        **kwargs,
+    )
+    op.create_index(
+        "ix_transactions_account_id_date_time",
+        "transactions",
+        ["account_id", "date_time"],
+        unique=False,
+        postgresql_include=["amount", "is_value_adjustment"],
+    )
+    op.create_index(
+        op.f("ix_transactions_updated_at"), "transactions", ["updated_at"], unique=False
+    )
+
+
+def move_old_transactions_aside() -> None:
+    # free up the index and constraint names, the data is copied across and the old table dropped
+    op.rename_table("transactions", "transactions_old")
+    op.drop_constraint("transactions_account_id_fkey", "transactions_old", type_="foreignkey")
+    op.drop_index("ix_transactions_account_id_date_time", table_name="transactions_old")
+    op.drop_index(op.f("ix_transactions_updated_at"), table_name="transactions_old")
+    op.execute(
+        "ALTER TABLE transactions_old RENAME CONSTRAINT transactions_pkey TO transactions_old_pkey"
+    )
+
+
+def copy_old_transactions() -> None:
+    op.execute(f"INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_old")
+    # the id sequence belonged to the old table, hand it over before dropping it
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id")
+    op.drop_table("transactions_old")
+
+
+def upgrade() -> None:
+    move_old_transactions_aside()
+    create_transactions_table(
+        sa.PrimaryKeyConstraint("id", "date_time"), postgresql_partition_by="RANGE (date_time)"
+    )
+
+    # a partition per year of existing data through next year, later years are created by the
+    # app as transactions arrive
+    first_year, last_year = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT CAST(EXTRACT(year FROM MIN(date_time)) AS INTEGER), "
+                "CAST(EXTRACT(year FROM MAX(date_time)) AS INTEGER) FROM transactions_old"
+            )
+        )
+        .one()
+    )
+    next_year = datetime.now().year + 1
+    for year in range(min(first_year or next_year, next_year), max(last_year or 0, next_year) + 1):
+        op.execute(
+            f"CREATE TABLE transactions_{year} PARTITION OF transactions "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        )
+
+    copy_old_transactions()
+
+
+def downgrade() -> None:
+    move_old_transactions_aside()
+    create_transactions_table(sa.PrimaryKeyConstraint("id"))
+    copy_old_transactions()
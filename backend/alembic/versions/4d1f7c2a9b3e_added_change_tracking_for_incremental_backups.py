@@ -0,0 +1,60 @@
+"""added change tracking for incremental backups
+
+Revision ID: 4d1f7c2a9b3e
+Revises: bf03f8f87e3e
+Create Date: 2026-10-19 10:30:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4d1f7c2a9b3e"
+down_revision: Union[str, None] = "bf03f8f87e3e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRACKED_TABLES = ["accounts", "transaction_rule", "transactions", "data_series"]
+UTC_NOW = sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)")
+
+
+def upgrade() -> None:
+    # existing rows get the migration time, so the first incremental backup holds everything
+    for table_name in TRACKED_TABLES:
+        op.add_column(
+            table_name,
+            sa.Column("created_at", sa.DateTime(), server_default=UTC_NOW, nullable=False),
+        )
+        op.add_column(
+            table_name,
+            sa.Column("updated_at", sa.DateTime(), server_default=UTC_NOW, nullable=False),
+        )
+        op.create_index(
+            op.f(f"ix_{table_name}_updated_at"), table_name, ["updated_at"], unique=False
+        )
+
+    op.create_table(
+        "deleted_records",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("table_name", sa.String(), nullable=False),
+        sa.Column("record_id", sa.Integer(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), server_default=UTC_NOW, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_deleted_records_deleted_at"), "deleted_records", ["deleted_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_deleted_records_deleted_at"), table_name="deleted_records")
+    op.drop_table("deleted_records")
+
+    for table_name in TRACKED_TABLES:
+        op.drop_index(op.f(f"ix_{table_name}_updated_at"), table_name=table_name)
+        op.drop_column(table_name, "updated_at")
+        op.drop_column(table_name, "created_at")
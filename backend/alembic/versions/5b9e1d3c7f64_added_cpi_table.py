@@ -0,0 +1,36 @@
+"""added cpi table
+
+Revision ID: 5b9e1d3c7f64
+Revises: 2e8d4b7c9a13
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.cpi import cpi_rows
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5b9e1d3c7f64"
+down_revision: Union[str, None] = "2e8d4b7c9a13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    cpi_table = op.create_table(
+        "cpi",
+        sa.Column("date_time", sa.DateTime(), nullable=False),
+        sa.Column("annual_rate", sa.Numeric(), nullable=False),
+        sa.Column("price_index", sa.Numeric(), nullable=False),
+        sa.PrimaryKeyConstraint("date_time"),
+    )
+    op.bulk_insert(cpi_table, cpi_rows())
+
+
+def downgrade() -> None:
+    op.drop_table("cpi")
@@ -0,0 +1,50 @@
+"""transaction amounts in pennies
+
+Revision ID: 6a1c8e4d2b70
+Revises: 3d7b9f2e5a61
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "6a1c8e4d2b70"
+down_revision: Union[str, None] = "3d7b9f2e5a61"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def replace_amount_column(old: str, new: str, new_type: sa.types.TypeEngine, convert: str) -> None:
+    # the covering index includes the amount so is rebuilt around the new column
+    op.add_column("transactions", sa.Column(new, new_type, nullable=True))
+    op.execute(f"UPDATE transactions SET {new} = {convert}")
+    op.alter_column("transactions", new, nullable=False)
+    op.drop_index("ix_transactions_account_id_date_time", table_name="transactions")
+    op.drop_column("transactions", old)
+    op.create_index(
+        "ix_transactions_account_id_date_time",
+        "transactions",
+        ["account_id", "date_time"],
+        unique=False,
+        postgresql_include=[new, "is_value_adjustment"],
+    )
+
+
+def upgrade() -> None:
+    replace_amount_column(
+        "amount", "amount_pennies", sa.BigInteger(), convert="CAST(ROUND(amount * 100) AS BIGINT)"
+    )
+
+
+def downgrade() -> None:
+    replace_amount_column(
+        "amount_pennies",
+        "amount",
+        sa.DECIMAL(precision=10, scale=2),
+        convert="CAST(amount_pennies AS DECIMAL(12, 0)) / 100",
+    )
@@ -0,0 +1,77 @@
+"""added data series keys and numeric values
+
+Revision ID: 7a3e5c1d8f20
+Revises: 4d1f7c2a9b3e
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7a3e5c1d8f20"
+down_revision: Union[str, None] = "4d1f7c2a9b3e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UTC_NOW = sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "data_series_keys",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=UTC_NOW, nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=UTC_NOW, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("key"),
+    )
+    op.create_index(
+        op.f("ix_data_series_keys_updated_at"), "data_series_keys", ["updated_at"], unique=False
+    )
+    op.execute(
+        "INSERT INTO data_series_keys (key) SELECT DISTINCT key FROM data_series ORDER BY key"
+    )
+
+    op.add_column("data_series", sa.Column("key_id", sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE data_series SET key_id = data_series_keys.id "
+        "FROM data_series_keys WHERE data_series_keys.key = data_series.key"
+    )
+    op.alter_column("data_series", "key_id", nullable=False)
+    op.create_foreign_key(
+        "data_series_key_id_fkey", "data_series", "data_series_keys", ["key_id"], ["id"]
+    )
+    op.create_index(op.f("ix_data_series_key_id"), "data_series", ["key_id"], unique=False)
+    op.drop_index("ix_data_series_key", table_name="data_series")
+    op.drop_column("data_series", "key")
+
+    # same rule as crud.parse_numeric
+    op.add_column("data_series", sa.Column("numeric_value", sa.Numeric(), nullable=True))
+    op.execute(
+        "UPDATE data_series SET numeric_value = REPLACE(TRIM(value), ',', '')::numeric "
+        "WHERE REPLACE(TRIM(value), ',', '') ~ '^-?[0-9]+(\\.[0-9]+)?$'"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("data_series", "numeric_value")
+
+    op.add_column("data_series", sa.Column("key", sa.String(), nullable=True))
+    op.execute(
+        "UPDATE data_series SET key = data_series_keys.key "
+        "FROM data_series_keys WHERE data_series_keys.id = data_series.key_id"
+    )
+    op.alter_column("data_series", "key", nullable=False)
+    op.create_index("ix_data_series_key", "data_series", ["key"], unique=False)
+    op.drop_index(op.f("ix_data_series_key_id"), table_name="data_series")
+    op.drop_constraint("data_series_key_id_fkey", "data_series", type_="foreignkey")
+    op.drop_column("data_series", "key_id")
+
+    op.drop_index(op.f("ix_data_series_keys_updated_at"), table_name="data_series_keys")
+    op.drop_table("data_series_keys")
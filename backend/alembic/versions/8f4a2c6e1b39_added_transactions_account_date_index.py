@@ -0,0 +1,40 @@
+"""added transactions account date index
+
+Revision ID: 8f4a2c6e1b39
+Revises: 5b9e1d3c7f64
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8f4a2c6e1b39"
+down_revision: Union[str, None] = "5b9e1d3c7f64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# no query filters on these alone, they only slowed down ingest
+UNUSED_INDEXED_COLUMNS = ["date_time", "description", "notes", "reference", "transaction_type"]
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_transactions_account_id_date_time",
+        "transactions",
+        ["account_id", "date_time"],
+        unique=False,
+        postgresql_include=["amount", "is_value_adjustment"],
+    )
+    for column in UNUSED_INDEXED_COLUMNS:
+        op.drop_index(op.f(f"ix_transactions_{column}"), table_name="transactions")
+
+
+def downgrade() -> None:
+    for column in UNUSED_INDEXED_COLUMNS:
+        op.create_index(op.f(f"ix_transactions_{column}"), "transactions", [column], unique=False)
+    op.drop_index("ix_transactions_account_id_date_time", table_name="transactions")
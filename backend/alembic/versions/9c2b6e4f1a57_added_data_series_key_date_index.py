@@ -0,0 +1,32 @@
+"""added data series key date index
+
+Revision ID: 9c2b6e4f1a57
+Revises: 7a3e5c1d8f20
+Create Date: 2026-10-19 11:30:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9c2b6e4f1a57"
+down_revision: Union[str, None] = "7a3e5c1d8f20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_data_series_key_id_date_time", "data_series", ["key_id", "date_time"], unique=False
+    )
+    # the composite index covers lookups by key alone
+    op.drop_index("ix_data_series_key_id", table_name="data_series")
+
+
+def downgrade() -> None:
+    op.create_index("ix_data_series_key_id", "data_series", ["key_id"], unique=False)
+    op.drop_index("ix_data_series_key_id_date_time", table_name="data_series")
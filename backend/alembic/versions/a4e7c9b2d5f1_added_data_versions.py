@@ -0,0 +1,33 @@
+"""added data versions
+
+Revision ID: a4e7c9b2d5f1
+Revises: 6a1c8e4d2b70
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4e7c9b2d5f1"
+down_revision: Union[str, None] = "6a1c8e4d2b70"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # keys without a row haven't changed since, the first write adds them
+    op.create_table(
+        "data_versions",
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("data_versions")
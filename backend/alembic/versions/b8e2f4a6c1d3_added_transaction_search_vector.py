@@ -0,0 +1,43 @@
+"""added transaction search vector
+
+Revision ID: b8e2f4a6c1d3
+Revises: a4e7c9b2d5f1
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b8e2f4a6c1d3"
+down_revision: Union[str, None] = "a4e7c9b2d5f1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# as db_models.TRANSACTION_SEARCH_VECTOR_SQL, kept here so the migration doesn't change with it
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(description, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(transaction_type, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(reference, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(notes, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    # generated and stored, so adding it rewrites every partition once
+    op.execute(
+        "ALTER TABLE transactions ADD COLUMN search_vector tsvector "
+        f"GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED"
+    )
+    op.execute(
+        "CREATE INDEX ix_transactions_search_vector ON transactions USING gin (search_vector)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transactions_search_vector", table_name="transactions")
+    op.drop_column("transactions", "search_vector")
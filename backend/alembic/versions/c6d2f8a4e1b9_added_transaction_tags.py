@@ -0,0 +1,73 @@
+"""added transaction tags
+
+Revision ID: c6d2f8a4e1b9
+Revises: b8e2f4a6c1d3
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c6d2f8a4e1b9"
+down_revision: Union[str, None] = "b8e2f4a6c1d3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UTC_NOW = sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)")
+
+
+def upgrade() -> None:
+    # nothing to backfill, tag rules are new, the tables fill as the rules run
+    op.create_table(
+        "tags",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=UTC_NOW, nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=UTC_NOW, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_index(op.f("ix_tags_updated_at"), "tags", ["updated_at"], unique=False)
+
+    op.create_table(
+        "transaction_tags",
+        sa.Column("transaction_id", sa.Integer(), nullable=False),
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.Column("account_id", sa.Integer(), nullable=False),
+        sa.Column("date_time", sa.DateTime(), nullable=False),
+        sa.Column("amount_pennies", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["account_id"], ["accounts.id"]),
+        sa.ForeignKeyConstraint(["tag_id"], ["tags.id"]),
+        sa.PrimaryKeyConstraint("transaction_id", "tag_id"),
+    )
+    op.create_index(
+        "ix_transaction_tags_account_id_date_time",
+        "transaction_tags",
+        ["account_id", "date_time"],
+        unique=False,
+    )
+
+    op.create_table(
+        "tag_monthly_totals",
+        sa.Column("account_id", sa.Integer(), nullable=False),
+        sa.Column("year_month", sa.String(), nullable=False),
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.Column("transaction_count", sa.Integer(), nullable=False),
+        sa.Column("total_pennies", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["account_id"], ["accounts.id"]),
+        sa.ForeignKeyConstraint(["tag_id"], ["tags.id"]),
+        sa.PrimaryKeyConstraint("account_id", "year_month", "tag_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("tag_monthly_totals")
+    op.drop_index("ix_transaction_tags_account_id_date_time", table_name="transaction_tags")
+    op.drop_table("transaction_tags")
+    op.drop_index(op.f("ix_tags_updated_at"), table_name="tags")
+    op.drop_table("tags")
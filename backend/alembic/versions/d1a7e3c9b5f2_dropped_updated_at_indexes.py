@@ -0,0 +1,41 @@
+"""dropped updated_at indexes
+
+Revision ID: d1a7e3c9b5f2
+Revises: c6d2f8a4e1b9
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d1a7e3c9b5f2"
+down_revision: Union[str, None] = "c6d2f8a4e1b9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# incremental backups scan these tables instead, see db_models.UpdatedCol
+INDEXED_TABLES = [
+    "accounts",
+    "transaction_rule",
+    "transactions",
+    "data_series_keys",
+    "data_series",
+    "tags",
+]
+
+
+def upgrade() -> None:
+    for table_name in INDEXED_TABLES:
+        op.drop_index(op.f(f"ix_{table_name}_updated_at"), table_name=table_name)
+
+
+def downgrade() -> None:
+    for table_name in INDEXED_TABLES:
+        op.create_index(
+            op.f(f"ix_{table_name}_updated_at"), table_name, ["updated_at"], unique=False
+        )
@@ -0,0 +1,73 @@
+"""cascaded tag deletes
+
+Revision ID: e4b8d2f6a3c7
+Revises: d1a7e3c9b5f2
+Create Date: 2026-10-20 11:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e4b8d2f6a3c7"
+down_revision: Union[str, None] = "d1a7e3c9b5f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# postgres' names for the unnamed foreign keys
+TAGS_ACCOUNT_FK = "transaction_tags_account_id_fkey"
+TOTALS_ACCOUNT_FK = "tag_monthly_totals_account_id_fkey"
+TAGS_TRANSACTION_FK = "transaction_tags_transaction_id_date_time_fkey"
+
+
+def upgrade() -> None:
+    # tags left behind by transactions deleted without them, then the totals counted again from
+    # the tags that are left
+    op.execute(
+        "DELETE FROM transaction_tags WHERE NOT EXISTS (SELECT 1 FROM transactions WHERE "
+        "transactions.id = transaction_tags.transaction_id "
+        "AND transactions.date_time = transaction_tags.date_time)"
+    )
+    op.execute("DELETE FROM tag_monthly_totals")
+    op.execute(
+        "INSERT INTO tag_monthly_totals "
+        "(account_id, year_month, tag_id, transaction_count, total_pennies) "
+        "SELECT account_id, to_char(date_time, 'YYYY-MM'), tag_id, count(*), sum(amount_pennies) "
+        "FROM transaction_tags GROUP BY 1, 2, 3"
+    )
+
+    op.drop_constraint(TAGS_ACCOUNT_FK, "transaction_tags", type_="foreignkey")
+    op.create_foreign_key(
+        TAGS_ACCOUNT_FK, "transaction_tags", "accounts", ["account_id"], ["id"], ondelete="CASCADE"
+    )
+    op.drop_constraint(TOTALS_ACCOUNT_FK, "tag_monthly_totals", type_="foreignkey")
+    op.create_foreign_key(
+        TOTALS_ACCOUNT_FK,
+        "tag_monthly_totals",
+        "accounts",
+        ["account_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+    op.create_foreign_key(
+        TAGS_TRANSACTION_FK,
+        "transaction_tags",
+        "transactions",
+        ["transaction_id", "date_time"],
+        ["id", "date_time"],
+        ondelete="CASCADE",
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint(TAGS_TRANSACTION_FK, "transaction_tags", type_="foreignkey")
+    op.drop_constraint(TOTALS_ACCOUNT_FK, "tag_monthly_totals", type_="foreignkey")
+    op.create_foreign_key(
+        TOTALS_ACCOUNT_FK, "tag_monthly_totals", "accounts", ["account_id"], ["id"]
+    )
+    op.drop_constraint(TAGS_ACCOUNT_FK, "transaction_tags", type_="foreignkey")
+    op.create_foreign_key(TAGS_ACCOUNT_FK, "transaction_tags", "accounts", ["account_id"], ["id"])
@@ -5,7 +5,7 @@ from abc import ABC, abstractmethod
 from datetime import datetime, timezone
 from decimal import ROUND_HALF_UP, Decimal
 from enum import StrEnum, auto
-from typing import List, Literal, Optional, Union
+from typing import Any, List, Literal, Optional, Type, TypeVar, Union
 
 from pydantic import BaseModel, ConfigDict, Field, computed_field, field_validator
 
@@ -14,6 +14,17 @@ logger = logging.getLogger(__name__)
 _orm_config = ConfigDict(from_attributes=True, extra="forbid")
 
 
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def construct_from_attributes(model: Type[ModelT], obj: Any, **values: Any) -> ModelT:
+    # model_validate(obj) without the validation, for rows read from our own database, values
+    # fill the fields obj doesn't have
+    return model.model_construct(
+        **{name: getattr(obj, name) for name in model.model_fields if name not in values}, **values
+    )
+
+
 def validate_decimal_places(
     value: Decimal, field_name: str, model_name: str, decimal_places: int = 2
 ) -> Decimal:
@@ -94,10 +105,27 @@ class IsValueAdjContainsAny(RuleCondition):
         # logger.info(f"{input=}, {transaction.is_value_adjustment=} {self.values=}")
 
 
+class TagContainsAny(RuleCondition):
+    # tags the transactions whose read_col contains any of the values, see crud.tag_transactions
+    type_id: Literal["tag_contains_any"] = "tag_contains_any"
+    values: List[str]
+    # the text columns, tag_transactions evaluates on the table's rows rather than the model
+    read_col: Literal["description", "transaction_type", "reference", "notes"] = "description"
+    tag: str = Field(min_length=1)
+
+    @field_validator("values", mode="before")
+    def values_to_lower(cls, value):
+        return [val.lower() for val in value]
+
+    def evaluate(self, transaction: Transaction) -> bool:
+        input = (getattr(transaction, self.read_col) or "").lower()
+        return any(val in input for val in self.values)
+
+
 class TransactionRuleCreate(BaseModel):
     model_config = _orm_config
     account_id: int
-    condition: Union[RuleCondition, IsValueAdjContainsAny]
+    condition: Union[RuleCondition, IsValueAdjContainsAny, TagContainsAny]
 
 
 class TransactionRule(TransactionRuleCreate):
@@ -128,6 +156,64 @@ class Transaction(TransactionCreate):
     id: int
 
 
+class TransactionWithBalance(Transaction):
+    balance: Decimal  # the account's balance after this transaction
+
+    @field_validator("balance", mode="after")
+    def validate_dp_balance(cls, value: Decimal) -> Decimal:
+        return validate_decimal_places(value, "balance", cls.__name__)
+
+
+class MonthlyTransactions(BaseModel):
+    # a month of an account's transactions, as a bank statement shows them
+    account_id: int
+    year_month: str
+    start_balance: Decimal
+    end_balance: Decimal
+    monthly_deposits: Decimal  # excluding value adjustments, as deposits_to_date does
+    deposits_to_date: Decimal
+    transactions: List[TransactionWithBalance]
+
+    @field_validator("start_balance", mode="after")
+    def validate_dp_sb(cls, value: Decimal) -> Decimal:
+        return validate_decimal_places(value, "start_balance", cls.__name__)
+
+    @field_validator("end_balance", mode="after")
+    def validate_dp_eb(cls, value: Decimal) -> Decimal:
+        return validate_decimal_places(value, "end_balance", cls.__name__)
+
+    @field_validator("monthly_deposits", mode="after")
+    def validate_dp_md(cls, value: Decimal) -> Decimal:
+        return validate_decimal_places(value, "monthly_deposits", cls.__name__)
+
+    @field_validator("deposits_to_date", mode="after")
+    def validate_dp_dtd(cls, value: Decimal) -> Decimal:
+        return validate_decimal_places(value, "deposits_to_date", cls.__name__)
+
+
+class TransactionSearchResult(Transaction):
+    rank: float
+    snippet: str  # the transaction's text, words matching the search between ** marks
+
+
+class Tag(BaseModel):
+    model_config = _orm_config
+    id: int
+    name: str
+
+
+class TagMonthlyTotal(BaseModel):
+    # the tagged transactions of a month, summed over the accounts asked for
+    tag: str
+    year_month: str
+    transaction_count: int
+    total: Decimal  # net, spending is negative
+
+    @field_validator("total", mode="after")
+    def validate_dp(cls, value: Decimal) -> Decimal:
+        return validate_decimal_places(value, "total", cls.__name__)
+
+
 class IngestResult(BaseModel):
     account_id: int
     transactions_deleted: int = 0
@@ -221,11 +307,27 @@ class DataSeries(DataSeriesCreate):
 
 class AddDataSeriesResult(BaseModel):
     values_added: int
+    values_updated: int = 0
+    values_unchanged: int = 0
+
+
+class DataSeriesPeriod(StrEnum):
+    calendar_year = auto()
+    tax_year = auto()  # uk tax year, 6th April to 5th April
+
+
+class DataSeriesAggregate(BaseModel):
+    key: str
+    period: int  # the year the calendar or tax year starts in
+    count: int
+    total: Optional[Decimal] = None  # sum of the numeric values, None if there are none
+    latest_value: str
+    latest_date_time: datetime
 
 
 class AccountBackup(BaseModel):
     account: AccountCreate
-    rule_conditions: List[Union[RuleCondition, IsValueAdjContainsAny]] = []
+    rule_conditions: List[Union[RuleCondition, IsValueAdjContainsAny, TagContainsAny]] = []
     transactions: List[TransactionCreate] = []
 
 
@@ -237,13 +339,35 @@ class Backup(BaseModel, ABC):
         use_enum_values = True
         discriminator = "version"
 
-    # @abstractmethod
-    # def upgrade(self, transaction: Transaction) -> bool:
-    #     pass
-    # in future a BackupV2 can implement upgrade(backupV1)
-
 
 class BackupV1(Backup):
     version: Literal["1.0.0"] = "1.0.0"
     accounts: List[AccountBackup] = []
     data_series: List[DataSeriesCreate] = []
+
+
+class BackupTable(BaseModel):
+    name: str
+    file_name: str
+    rows: int
+
+
+class BackupV2(Backup):
+    # the manifest of a v2 backup zip, each table is stored alongside it as a csv file
+    # v1 backups are upgraded to v2 on import, see backup.upgrade_v1
+    version: Literal["2.0.0"] = "2.0.0"
+    # set for incremental backups, which only hold rows changed or deleted after this time
+    since: Optional[datetime] = None
+    tables: List[BackupTable] = []
+
+
+class PoolStats(BaseModel):
+    pool_class: str
+    size: Optional[int] = None
+    checked_in: Optional[int] = None
+    checked_out: Optional[int] = None
+    overflow: Optional[int] = None
+    checkouts: int = 0
+    wait_seconds_total: float = 0
+    wait_seconds_max: float = 0
+    timeouts: int = 0
@@ -0,0 +1,224 @@
+import logging
+from datetime import datetime
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from backend import api_models, crud, db_models
+from backend.profiling import add_current_thread, remove_thread
+
+logger = logging.getLogger(__name__)
+
+# Async versions of the hot read paths in crud, running the same queries through crud's
+# *_select builders.  Writes stay in crud.
+
+T = TypeVar("T")
+
+
+async def run_off_loop(func: Callable[..., T], **kwargs) -> T:
+    # CPU bound work on the rows, in the threadpool so the event loop keeps serving other
+    # requests meanwhile.  The thread joins any profile of the request, as sync handlers do.
+    def call() -> T:
+        profile = add_current_thread()
+        try:
+            return func(**kwargs)
+        finally:
+            remove_thread(profile)
+
+    return await run_in_threadpool(call)
+
+
+async def get_account(account_id: int, db_session: AsyncSession) -> Optional[db_models.Account]:
+    return await db_session.get(db_models.Account, account_id)
+
+
+async def get_accounts(
+    db_session: AsyncSession, institution: Optional[str] = None, name: Optional[str] = None
+) -> List[api_models.Account]:
+    results = await db_session.scalars(crud.accounts_select(institution=institution, name=name))
+    return [api_models.construct_from_attributes(api_models.Account, result) for result in results]
+
+
+async def get_transactions(
+    db_session: AsyncSession,
+    account_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: Optional[int] = None,
+) -> List[api_models.Transaction]:
+    results = await db_session.scalars(
+        crud.transactions_select(
+            account_id=account_id,
+            start_date=start_date,
+            end_date=end_date,
+            after=after,
+            limit=limit,
+        )
+    )
+    return [
+        api_models.construct_from_attributes(api_models.Transaction, result) for result in results
+    ]
+
+
+async def count_transactions(
+    db_session: AsyncSession,
+    account_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> int:
+    return await db_session.scalar(
+        crud.transactions_count_select(
+            account_id=account_id, start_date=start_date, end_date=end_date
+        )
+    )
+
+
+async def stream_transactions(
+    db_session: AsyncSession,
+    account_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: Optional[int] = None,
+    batch_size: int = 1000,
+) -> AsyncIterator[List[api_models.Transaction]]:
+    # batches from a server side cursor, so only batch_size rows are held at a time
+    query = crud.transactions_select(
+        account_id=account_id, start_date=start_date, end_date=end_date, after=after, limit=limit
+    ).execution_options(yield_per=batch_size)
+    results = await db_session.stream_scalars(query)
+    async for partition in results.partitions():
+        yield [
+            api_models.construct_from_attributes(api_models.Transaction, result)
+            for result in partition
+        ]
+
+
+async def get_last_transaction_dates(
+    db_session: AsyncSession, account_ids: Optional[List[int]] = None
+) -> Dict[int, datetime]:
+    results = await db_session.execute(crud.last_transaction_dates_select(account_ids=account_ids))
+    return {account_id: last_date for account_id, last_date in results}
+
+
+async def get_balance(
+    db_session: AsyncSession,
+    account_ids: Optional[List[int]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> List[api_models.BalanceResult]:
+    balance_query, deposits_query, max_date_query = crud.balance_selects(
+        account_ids=account_ids, start_date=start_date, end_date=end_date
+    )
+    return crud.build_balance_results(
+        (await db_session.execute(balance_query)).all(),
+        (await db_session.execute(deposits_query)).all(),
+        (await db_session.execute(max_date_query)).all(),
+        account_ids=account_ids,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+
+async def get_monthly_transactions(
+    db_session: AsyncSession, account_id: int, month_start: datetime
+) -> api_models.MonthlyTransactions:
+    rows = (
+        await db_session.execute(crud.monthly_transactions_select(account_id, month_start))
+    ).all()
+    return crud.build_monthly_transactions(rows, account_id=account_id, month_start=month_start)
+
+
+async def get_monthly_balances(
+    db_session: AsyncSession,
+    account_ids: Optional[List[int]] = None,
+    interpolate: bool = True,
+    real_terms: Optional[int] = None,
+) -> List[api_models.MonthlyBalanceResult]:
+    rows = (await db_session.execute(crud.monthly_balances_select(account_ids=account_ids))).all()
+    empty_account_ids = await db_session.scalars(
+        crud.account_ids_without_transactions_select(account_ids=account_ids)
+    )
+    price_indexes = None
+    if real_terms is not None:
+        price_indexes = crud.build_price_indexes(
+            (await db_session.execute(crud.price_indexes_select())).all()
+        )
+
+    accounts = await get_accounts(db_session)
+    return await run_off_loop(
+        crud.build_monthly_balances,
+        rows=rows,
+        accounts=accounts,
+        empty_account_ids=list(empty_account_ids),
+        interpolate=interpolate,
+        price_indexes=price_indexes,
+        real_terms=real_terms,
+    )
+
+
+async def get_data_series(
+    db_session: AsyncSession,
+    keys: Optional[List[str]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    latest: bool = False,
+) -> List[api_models.DataSeries]:
+    results = await db_session.execute(
+        crud.data_series_select(keys=keys, start_date=start_date, end_date=end_date, latest=latest)
+    )
+    return [api_models.DataSeries.model_validate(result) for result in results]
+
+
+async def get_data_versions(
+    db_session: AsyncSession, keys: Iterable[str] = (), prefixes: Iterable[str] = ()
+) -> Dict[str, int]:
+    results = await db_session.execute(crud.data_versions_select(keys=keys, prefixes=prefixes))
+    return dict(results.all())
+
+
+async def search_transactions(
+    db_session: AsyncSession,
+    tsquery: str,
+    account_ids: Optional[List[int]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = 50,
+) -> List[api_models.TransactionSearchResult]:
+    results = await db_session.execute(
+        crud.transaction_search_select(
+            tsquery, account_ids=account_ids, start_date=start_date, end_date=end_date, limit=limit
+        )
+    )
+    return crud.build_search_results(results.all())
+
+
+async def get_tags(db_session: AsyncSession) -> List[api_models.Tag]:
+    results = await db_session.scalars(crud.tags_select())
+    return [api_models.Tag.model_validate(tag) for tag in results]
+
+
+async def get_tag_monthly_totals(
+    db_session: AsyncSession,
+    account_ids: Optional[List[int]] = None,
+    tags: Optional[List[str]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> List[api_models.TagMonthlyTotal]:
+    results = await db_session.execute(
+        crud.tag_monthly_totals_select(
+            account_ids=account_ids, tags=tags, start_date=start_date, end_date=end_date
+        )
+    )
+    return crud.build_tag_monthly_totals(results.all())
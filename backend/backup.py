@@ -0,0 +1,394 @@
+import csv
+import io
+import json
+import logging
+import zipfile
+from datetime import datetime, timezone
+from decimal import Decimal
+from enum import Enum
+from typing import IO, Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import Table, select, text
+from sqlalchemy.orm import Session
+
+from backend import api_models, crud, db_models
+from backend.db import lift_statement_timeout
+from backend.dialects import is_postgres
+from backend.money import to_pennies
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+COPY_OPTIONS = "FORMAT csv, HEADER true, NULL '\\N'"
+CSV_NULL = "\\N"
+
+# tables in the order they need restoring to satisfy foreign keys
+BACKUP_TABLES: List[Table] = [
+    db_models.Account.__table__,
+    db_models.TransactionRule.__table__,
+    db_models.Transaction.__table__,
+    db_models.DataSeriesKey.__table__,
+    db_models.DataSeries.__table__,
+]
+# only included in incremental backups, a full backup has no deletes to replay
+DELETED_RECORDS_TABLE: Table = db_models.DeletedRecord.__table__
+
+# columns in backups from older schemas that have since been replaced, restored by staging the old
+# column and converting it: {table: {old column: (old type, new column, conversion sql)}}
+LEGACY_COLUMNS: Dict[str, Dict[str, Tuple[str, str, str]]] = {
+    db_models.Transaction.__tablename__: {
+        "amount": ("DECIMAL(10, 2)", "amount_pennies", "CAST(ROUND(amount * 100) AS BIGINT)"),
+    },
+}
+
+
+def write_backup(
+    db_session: Session, zip_file: zipfile.ZipFile, since: Optional[datetime] = None
+) -> api_models.BackupV2:
+    _require_postgres(db_session)
+    lift_statement_timeout(db_session)
+    backup = api_models.BackupV2(since=to_utc(since) if since else None)
+    cursor = db_session.connection().connection.cursor()
+    dialect = db_session.get_bind().dialect
+
+    tables = BACKUP_TABLES if since is None else BACKUP_TABLES + [DELETED_RECORDS_TABLE]
+    for table in tables:
+        file_name = f"{table.name}.csv"
+        query = select(*table.columns).order_by(table.c.id)
+        if since is not None:
+            changed_col = table.c.get("updated_at", table.c.get("deleted_at"))
+            query = query.where(changed_col > to_utc(since).replace(tzinfo=None))
+        compiled = query.compile(dialect=dialect)
+        query_str = cursor.mogrify(str(compiled), compiled.params).decode()
+
+        with zip_file.open(file_name, "w") as table_file:
+            cursor.copy_expert(f"COPY ({query_str}) TO STDOUT WITH ({COPY_OPTIONS})", table_file)
+
+        backup.tables.append(
+            api_models.BackupTable(name=table.name, file_name=file_name, rows=cursor.rowcount)
+        )
+
+    zip_file.writestr(MANIFEST_FILENAME, backup.model_dump_json(indent=2))
+    return backup
+
+
+def restore_backups(
+    db_session: Session,
+    zip_file: zipfile.ZipFile,
+    incremental_zip_files: Optional[List[zipfile.ZipFile]] = None,
+) -> List[api_models.BackupV2]:
+    # assume caller already checked db is empty
+    # the full backup is restored first then each incremental backup is applied on top
+    _require_postgres(db_session)
+    opened = [_open_backup(zip_file)]
+    opened.extend(
+        sorted(
+            (_open_backup(incremental) for incremental in incremental_zip_files or []),
+            key=lambda backup_and_files: to_utc(backup_and_files[0].backup_datetime),
+        )
+    )
+
+    try:
+        backups = [backup for backup, _ in opened]
+        _check_backup_chain(backups)
+        lift_statement_timeout(db_session)
+
+        for backup, table_files in opened:
+            if backup.since is None:
+                for table in BACKUP_TABLES:
+                    if table.name not in table_files:
+                        continue
+                    if table.name == db_models.Transaction.__tablename__:
+                        # staged so the partitions its rows need can be created first
+                        upsert_table_from_csv(db_session, table, table_files[table.name])
+                    else:
+                        copy_table_from_csv(db_session, table, table_files[table.name])
+            else:
+                _apply_incremental_backup(db_session, table_files)
+
+        for table in BACKUP_TABLES + [DELETED_RECORDS_TABLE]:
+            reset_id_sequence(db_session, table)
+        crud.tag_transactions(db_session)  # tags aren't backed up, the rules give them again
+        crud.bump_all_data_versions(db_session)
+        db_session.commit()
+    except Exception:
+        db_session.rollback()
+        raise
+    finally:
+        for _, table_files in opened:
+            for table_file in table_files.values():
+                table_file.close()
+
+    return backups
+
+
+def copy_table_from_csv(
+    db_session: Session,
+    table: Table,
+    table_file: IO[bytes],
+    target_name: Optional[str] = None,
+    legacy_columns: Iterable[str] = (),
+) -> List[str]:
+    # the header row names the columns so backups from older schemas restore with defaults
+    header = table_file.readline().decode().strip()
+    columns = next(csv.reader([header]))
+    unknown_columns = set(columns) - set(table.columns.keys()) - set(legacy_columns)
+    if unknown_columns:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown columns {unknown_columns} in backup of table {table.name}.",
+        )
+
+    preparer = db_session.get_bind().dialect.identifier_preparer
+    column_list = ", ".join(preparer.quote(column) for column in columns)
+    cursor = db_session.connection().connection.cursor()
+    cursor.copy_expert(
+        f"COPY {preparer.quote(target_name or table.name)} ({column_list}) FROM STDIN "
+        f"WITH ({COPY_OPTIONS.replace('HEADER true', 'HEADER false')})",
+        table_file,
+    )
+    logger.info(f"Restored {cursor.rowcount} rows to {table.name}")
+    return columns
+
+
+def upsert_table_from_csv(db_session: Session, table: Table, table_file: IO[bytes]):
+    # COPY can't update existing rows so copy into a temporary table and merge from there
+    # the restore is one transaction, a table can be staged again by a later backup in the chain
+    tmp_name = f"tmp_{table.name}"
+    db_session.execute(text(f"DROP TABLE IF EXISTS {tmp_name}"))
+    db_session.execute(
+        text(f"CREATE TEMP TABLE {tmp_name} (LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DROP")
+    )
+    legacy_columns = LEGACY_COLUMNS.get(table.name, {})
+    for old_column, (old_type, new_column, _) in legacy_columns.items():
+        db_session.execute(text(f"ALTER TABLE {tmp_name} ADD COLUMN {old_column} {old_type}"))
+        db_session.execute(text(f"ALTER TABLE {tmp_name} ALTER COLUMN {new_column} DROP NOT NULL"))
+    columns = copy_table_from_csv(
+        db_session, table, table_file, target_name=tmp_name, legacy_columns=legacy_columns
+    )
+
+    for old_column, (_, new_column, conversion) in legacy_columns.items():
+        if old_column in columns:
+            db_session.execute(text(f"UPDATE {tmp_name} SET {new_column} = {conversion}"))
+            columns = [new_column if column == old_column else column for column in columns]
+
+    if table.name == db_models.Transaction.__tablename__:
+        years = db_session.execute(
+            text(f"SELECT DISTINCT CAST(EXTRACT(year FROM date_time) AS INTEGER) FROM {tmp_name}")
+        ).scalars()
+        crud.ensure_transaction_partitions(db_session, years)
+
+    preparer = db_session.get_bind().dialect.identifier_preparer
+    key_columns = [column.name for column in table.primary_key.columns]
+    column_list = ", ".join(preparer.quote(column) for column in columns)
+    updates = ", ".join(
+        f"{preparer.quote(column)} = EXCLUDED.{preparer.quote(column)}"
+        for column in columns
+        if column not in key_columns
+    )
+    db_session.execute(
+        text(
+            f"INSERT INTO {table.name} ({column_list}) SELECT {column_list} FROM {tmp_name} "
+            f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {updates}"
+        )
+    )
+
+
+def reset_id_sequence(db_session: Session, table: Table):
+    # rows are copied with their ids so move the sequence past them
+    db_session.execute(
+        text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"COALESCE(MAX(id), 0) + 1, false) FROM {table.name}"
+        )
+    )
+
+
+def upgrade_v1(backup: api_models.BackupV1) -> tuple[api_models.BackupV2, Dict[str, IO[bytes]]]:
+    # v1 stored per account objects without ids, assign ids in backup order
+    rows: Dict[str, List[Dict[str, Any]]] = {table.name: [] for table in BACKUP_TABLES}
+
+    for account_id, account_backup in enumerate(backup.accounts, start=1):
+        rows[db_models.Account.__tablename__].append(
+            {"id": account_id, **account_backup.account.model_dump()}
+        )
+
+        for condition in account_backup.rule_conditions:
+            rows[db_models.TransactionRule.__tablename__].append(
+                {
+                    "id": len(rows[db_models.TransactionRule.__tablename__]) + 1,
+                    "account_id": account_id,
+                    "condition": json.dumps(condition.model_dump()),
+                }
+            )
+
+        for transaction in account_backup.transactions:
+            rows[db_models.Transaction.__tablename__].append(
+                {
+                    "id": len(rows[db_models.Transaction.__tablename__]) + 1,
+                    **transaction.model_dump(exclude={"amount"}),
+                    "amount_pennies": to_pennies(transaction.amount),
+                    "account_id": account_id,
+                }
+            )
+
+    # v1 backups predate the unique key and date constraint, the last duplicate wins
+    unique_data_series = {(value.key, value.date_time): value for value in backup.data_series}
+    key_ids: Dict[str, int] = {}
+    for data_series_id, data_series in enumerate(unique_data_series.values(), start=1):
+        if data_series.key not in key_ids:
+            key_ids[data_series.key] = len(key_ids) + 1
+            rows[db_models.DataSeriesKey.__tablename__].append(
+                {"id": key_ids[data_series.key], "key": data_series.key}
+            )
+
+        rows[db_models.DataSeries.__tablename__].append(
+            {
+                "id": data_series_id,
+                "date_time": data_series.date_time,
+                "key_id": key_ids[data_series.key],
+                "value": data_series.value,
+                "numeric_value": crud.parse_numeric(data_series.value),
+            }
+        )
+
+    backup_v2 = api_models.BackupV2(backup_datetime=backup.backup_datetime)
+    table_files = {}
+    for table_name, table_rows in rows.items():
+        if not table_rows:
+            continue
+        table_files[table_name] = _rows_to_csv(table_rows)
+        backup_v2.tables.append(
+            api_models.BackupTable(
+                name=table_name, file_name=f"{table_name}.csv", rows=len(table_rows)
+            )
+        )
+
+    return backup_v2, table_files
+
+
+def to_utc(dt: datetime) -> datetime:
+    # naive datetimes are assumed to already be utc, as stored in the db
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _require_postgres(db_session: Session):
+    # backups stream tables with postgres COPY
+    if not is_postgres(db_session):
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Backups are only supported with a PostgreSQL database.",
+        )
+
+
+def _open_backup(zip_file: zipfile.ZipFile) -> tuple[api_models.BackupV2, Dict[str, IO[bytes]]]:
+    zip_file_list = zip_file.namelist()
+
+    if MANIFEST_FILENAME in zip_file_list:
+        backup = _read_manifest(zip_file)
+        return backup, {table.name: zip_file.open(table.file_name) for table in backup.tables}
+
+    if len(zip_file_list) == 1 and zip_file_list[0].endswith(".json"):
+        backup_v1 = _read_json(zip_file, zip_file_list[0], api_models.BackupV1)
+        logger.info(f"Upgrading v1 backup from {backup_v1.backup_datetime}")
+        return upgrade_v1(backup_v1)
+
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"ZIP file must contain a {MANIFEST_FILENAME} or exactly one .json file.",
+    )
+
+
+def _check_backup_chain(backups: List[api_models.BackupV2]):
+    if backups[0].since is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The first backup to import must be a full backup, not an incremental one.",
+        )
+
+    for previous, incremental in zip(backups, backups[1:]):
+        if incremental.since is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Backup from {incremental.backup_datetime} is not an incremental backup.",
+            )
+        # overlapping backups are fine as rows are upserted, a gap would lose changes
+        if to_utc(incremental.since) > to_utc(previous.backup_datetime):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Incremental backup since {incremental.since} does not follow on from "
+                f"the backup taken at {previous.backup_datetime}.",
+            )
+
+
+def _apply_incremental_backup(db_session: Session, table_files: Dict[str, IO[bytes]]):
+    for table in BACKUP_TABLES:
+        if table.name in table_files:
+            upsert_table_from_csv(db_session, table, table_files[table.name])
+
+    if DELETED_RECORDS_TABLE.name not in table_files:
+        return
+
+    upsert_table_from_csv(
+        db_session, DELETED_RECORDS_TABLE, table_files[DELETED_RECORDS_TABLE.name]
+    )
+    for table in reversed(BACKUP_TABLES):
+        result = db_session.execute(
+            text(
+                f"DELETE FROM {table.name} WHERE id IN (SELECT record_id FROM "
+                f"tmp_{DELETED_RECORDS_TABLE.name} WHERE table_name = :table_name)"
+            ),
+            {"table_name": table.name},
+        )
+        if result.rowcount:
+            logger.info(f"Deleted {result.rowcount} rows from {table.name}")
+
+
+def _rows_to_csv(rows: List[Dict[str, Any]]) -> IO[bytes]:
+    text_file = io.StringIO()
+    writer = csv.writer(text_file)
+    writer.writerow(rows[0].keys())
+    for row in rows:
+        writer.writerow(_csv_value(value) for value in row.values())
+    return io.BytesIO(text_file.getvalue().encode())
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return CSV_NULL
+    if isinstance(value, Enum):
+        # sqlalchemy stores enums by name
+        return value.name
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _read_manifest(zip_file: zipfile.ZipFile) -> api_models.BackupV2:
+    backup = _read_json(zip_file, MANIFEST_FILENAME, api_models.BackupV2)
+
+    zip_file_list = zip_file.namelist()
+    table_names = {table.name for table in BACKUP_TABLES + [DELETED_RECORDS_TABLE]}
+    for table in backup.tables:
+        if table.name not in table_names or table.file_name not in zip_file_list:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Backup table {table.name} is not supported or missing from the ZIP file.",
+            )
+    return backup
+
+
+def _read_json(zip_file: zipfile.ZipFile, file_name: str, model: type[api_models.Backup]):
+    try:
+        with zip_file.open(file_name) as json_file:
+            return model(**json.load(json_file))
+    except (json.JSONDecodeError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Error processing JSON file: {str(e)}")
@@ -1,43 +1,59 @@
 import logging
+import math
+from dataclasses import dataclass
 from datetime import datetime
-from decimal import ROUND_HALF_UP, Decimal, getcontext
-from statistics import mean, median
+from statistics import median
 from typing import List, Tuple
 
-from backend.api_models import (
-    Account,
-    AccountType,
-    InterpolationType,
-    MonthlyBalance,
-    MonthlyBalanceResult,
-)
+from backend.api_models import Account, AccountType, InterpolationType, MonthlyBalance
+from backend.money import from_pennies, round_pennies
 
 logger = logging.getLogger(__name__)
 
-getcontext().prec = 28
-
 ACCOUNT_TYPES_WITH_GROWTH = [AccountType.pensions, AccountType.savings, AccountType.asset]
 
 
-def extend_monthly_balances_to_now(account: Account, result: MonthlyBalanceResult):
+@dataclass
+class MonthlyPennies:
+    # MonthlyBalance in integer pennies, interpolation works on these and converts at the end
+    year_month: str
+    start_balance: int
+    monthly_balance: int
+    end_balance: int
+    deposits_to_date: int
+    interpolated: InterpolationType = InterpolationType.none
+
+    def to_api(self) -> MonthlyBalance:
+        # exact pennies, so the decimal places validators have nothing to check
+        return MonthlyBalance.model_construct(
+            year_month=self.year_month,
+            start_balance=from_pennies(self.start_balance),
+            monthly_balance=from_pennies(self.monthly_balance),
+            end_balance=from_pennies(self.end_balance),
+            deposits_to_date=from_pennies(self.deposits_to_date),
+            interpolated=self.interpolated,
+        )
+
+
+def extend_monthly_balances_to_now(account: Account, monthly_balances: List[MonthlyPennies]):
     if not account.is_active:
         return  # only extend active accounts
 
     now_year_month: str = datetime.now().strftime("%Y-%m")
-    if result.end_year_month == now_year_month:
+    if monthly_balances[-1].year_month == now_year_month:
         return  # nothing to do
 
-    latest_balance: MonthlyBalance = result.monthly_balances[-1]
-    additional_balance: Decimal = Decimal(0)
-    additional_deposits: Decimal = Decimal(0)
+    latest_balance: MonthlyPennies = monthly_balances[-1]
+    additional_balance: float = 0
+    additional_deposits: float = 0
     if account.account_type in ACCOUNT_TYPES_WITH_GROWTH:
         try:
             median_growth_factor, median_monthly_deposit = calculate_growth_factor_for_account(
-                result.monthly_balances
+                monthly_balances
             )
 
             months = get_num_months_between(latest_balance.year_month, now_year_month)
-            target_end_balance: Decimal = calculate_balance_after_growth(
+            target_end_balance: int = calculate_balance_after_growth(
                 latest_balance.end_balance, median_growth_factor, months
             )
             additional_balance = target_end_balance - latest_balance.end_balance
@@ -48,7 +64,7 @@ def extend_monthly_balances_to_now(account: Account, result: MonthlyBalanceResul
         except ValueError as e:
             logging.warning(f"Error calculating growth factor for account {account.id}: {e}")
 
-    result.monthly_balances.append(
+    monthly_balances.append(
         create_interpolated_mb(
             prev=latest_balance,
             year_month=now_year_month,
@@ -60,10 +76,10 @@ def extend_monthly_balances_to_now(account: Account, result: MonthlyBalanceResul
 
 
 def fill_gap_in_non_growth_account(
-    current_mb: MonthlyBalance,
-    next_mb: MonthlyBalance,
+    current_mb: MonthlyPennies,
+    next_mb: MonthlyPennies,
     gap_months: int,
-    updated_balances: List[MonthlyBalance],
+    updated_balances: List[MonthlyPennies],
 ):
     if gap_months <= 0:
         return  # No gap to fill
@@ -84,10 +100,10 @@ def fill_gap_in_non_growth_account(
 
 
 def fill_gap_in_growth_account(
-    current_mb: MonthlyBalance,
-    next_mb: MonthlyBalance,
+    current_mb: MonthlyPennies,
+    next_mb: MonthlyPennies,
     gap_months: int,
-    updated_balances: List[MonthlyBalance],
+    updated_balances: List[MonthlyPennies],
 ):
     if gap_months <= 0:
         logging.warning("Ended up in fill_gap_in_growth_account with no gap to fill.")
@@ -135,8 +151,9 @@ def fill_gap_in_growth_account(
     # logging.info(f"Gap fill completed {growth_factor=} {monthly_deposit=}")
 
 
-def fill_missing_months(account: Account, result: MonthlyBalanceResult):
-    monthly_balances = result.monthly_balances
+def fill_missing_months(
+    account: Account, monthly_balances: List[MonthlyPennies]
+) -> List[MonthlyPennies]:
     updated_balances = []
 
     for i in range(len(monthly_balances) - 1):
@@ -162,36 +179,32 @@ def fill_missing_months(account: Account, result: MonthlyBalanceResult):
     final_mb = monthly_balances[-1]
     updated_balances.append(final_mb)
 
-    # Update the result with the newly interpolated monthly balances
-    result.monthly_balances = updated_balances
+    return updated_balances
 
 
 # helper functions
 # todo default year_month to None and then set to next_year_month(prev) and default type to inter
 def create_interpolated_mb(
-    prev: MonthlyBalance,
+    prev: MonthlyPennies,
     year_month: str,
     interpolated: InterpolationType,
-    additional_balance: Decimal = Decimal(0),
-    additional_deposits: Decimal = Decimal(0),
-) -> MonthlyBalance:
-    return MonthlyBalance(
+    additional_balance: float = 0,
+    additional_deposits: float = 0,
+) -> MonthlyPennies:
+    monthly_balance = round_pennies(additional_balance)
+    return MonthlyPennies(
         year_month=year_month,
-        start_balance=quantize_decimal(prev.end_balance),
-        monthly_balance=quantize_decimal(additional_balance),
-        end_balance=quantize_decimal(prev.end_balance + additional_balance),
-        deposits_to_date=quantize_decimal(prev.deposits_to_date + additional_deposits),
+        start_balance=prev.end_balance,
+        monthly_balance=monthly_balance,
+        end_balance=prev.end_balance + monthly_balance,
+        deposits_to_date=prev.deposits_to_date + round_pennies(additional_deposits),
         interpolated=interpolated,
     )
 
 
-def quantize_decimal(value: Decimal, decimal_places: int = 2) -> Decimal:
-    return value.quantize(Decimal("1." + "0" * decimal_places), rounding=ROUND_HALF_UP)
-
-
 def calculate_growth_factor_for_account(
-    monthly_balances: List[MonthlyBalance], max_sample_size: int = 12
-) -> Tuple[Decimal, Decimal]:
+    monthly_balances: List[MonthlyPennies], max_sample_size: int = 12
+) -> Tuple[float, float]:
     # Filter out balances with InterpolationType.none
     filtered_balances = [mb for mb in monthly_balances if mb.interpolated == InterpolationType.none]
 
@@ -221,13 +234,13 @@ def calculate_growth_factor_for_account(
         )
 
         growth_factor = calculate_monthly_growth_factor(
-            start_amount, end_amount, deposit_this_month, Decimal(num_months)
+            start_amount, end_amount, deposit_this_month, num_months
         )
         growth_factors.append(growth_factor)
         monthly_deposits.append(deposit_this_month)
 
     # logger.info(f"{growth_factors=} {monthly_deposits=}")
-    median_growth_factor = Decimal(median(growth_factors))
+    median_growth_factor = median(growth_factors)
 
     if (
         len(monthly_deposits) < (max_sample_size / 2)
@@ -235,30 +248,28 @@ def calculate_growth_factor_for_account(
     ):
         # if we don't have half the sample size or no proof deposits happened after the first month, set to zero
         # logger.info("Setting median_monthly_deposit to zero")
-        median_monthly_deposit = Decimal(0)
+        median_monthly_deposit = 0
     else:
-        median_monthly_deposit = Decimal(median(monthly_deposits))
+        median_monthly_deposit = median(monthly_deposits)
 
     return median_growth_factor, median_monthly_deposit
 
 
 def calculate_monthly_growth_factor(
-    start_amount: Decimal,
-    end_amount: Decimal,
-    deposits_between: Decimal = Decimal(0),
-    months: Decimal = Decimal(1),
-):
+    start_amount: int,
+    end_amount: int,
+    deposits_between: float = 0,
+    months: int = 1,
+) -> float:
     if start_amount == 0 or months == 0:
-        return Decimal(1.0)
+        return 1.0
     else:
-        return ((end_amount - deposits_between) / start_amount) ** (Decimal(1) / months)
+        # math.pow raises ValueError rather than going complex for a negative ratio
+        return math.pow((end_amount - deposits_between) / start_amount, 1 / months)
 
 
-def calculate_balance_after_growth(
-    start_amount: Decimal, growth_factor: Decimal, months: int
-) -> Decimal:
-    end_amount = start_amount * (growth_factor**months)
-    return quantize_decimal(end_amount)
+def calculate_balance_after_growth(start_amount: int, growth_factor: float, months: int) -> int:
+    return round_pennies(start_amount * (growth_factor**months))
 
 
 def get_num_months_between(start_month_year: str, end_month_year: str) -> int:
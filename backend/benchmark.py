@@ -0,0 +1,300 @@
+import argparse
+import io
+import json
+import logging
+import math
+import subprocess
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from dateutil.relativedelta import relativedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy_utils import create_database, drop_database
+
+from backend import crud
+from backend.api_models import AccountType
+from backend.db import (
+    Base,
+    create_async_db_engine,
+    create_db_engine,
+    get_async_db_session,
+    get_async_session_factory,
+    get_db_session,
+    get_db_url,
+    is_sqlite,
+)
+from backend.dialects import is_postgres
+from backend.main import app
+from backend.sample_data import Dataset, create_dataset
+
+logger = logging.getLogger(__name__)
+
+# End to end API benchmark over a generated dataset, run against a new database on the
+# DATABASE_URL server and writing a JSON report to compare between runs:
+#
+#   python -m backend.benchmark --accounts 12 --years 10 --transactions-per-month 40 -o before.json
+#   python -m backend.benchmark --accounts 12 --years 10 --transactions-per-month 40 \
+#       -o after.json --compare before.json
+#
+# Requests go through the app in process, so the latencies include routing, validation and
+# serialization but not the network.
+
+
+@dataclass
+class Operation:
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    items: int = 0  # rows returned or processed over all runs
+
+    def as_dict(self) -> dict:
+        total = sum(self.latencies)
+        return dict(
+            runs=len(self.latencies),
+            total_seconds=round(total, 4),
+            mean_ms=round(total / len(self.latencies) * 1000, 2),
+            p50_ms=round(percentile(self.latencies, 50) * 1000, 2),
+            p95_ms=round(percentile(self.latencies, 95) * 1000, 2),
+            max_ms=round(max(self.latencies) * 1000, 2),
+            runs_per_second=round(len(self.latencies) / total, 2),
+            items_per_second=round(self.items / total, 1),
+        )
+
+
+def percentile(values: List[float], percent: float) -> float:
+    # nearest rank
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def measure(
+    name: str, runs: int, run: Callable[[int], int], prepare: Optional[Callable[[], None]] = None
+) -> Operation:
+    # run(i) does the work once and returns the number of items it handled, prepare is untimed
+    operation = Operation(name=name)
+    for i in range(runs):
+        if prepare is not None:
+            prepare()
+        start = time.perf_counter()
+        operation.items += run(i)
+        operation.latencies.append(time.perf_counter() - start)
+    logger.info(f"{name}: {operation.as_dict()}")
+    return operation
+
+
+def get(client: TestClient, url: str) -> int:
+    response = client.get(url)
+    response.raise_for_status()
+    return len(response.json())
+
+
+def create_ingest_csv(dataset: Dataset, account_id: int) -> bytes:
+    # the account's last full month, ingesting it replaces those transactions with themselves
+    transactions = [tx for tx in dataset.transactions if tx.account_id == account_id]
+    last_month = max(tx.date_time for tx in transactions) - relativedelta(months=1)
+    month = [
+        tx
+        for tx in transactions
+        if (tx.date_time.year, tx.date_time.month) == (last_month.year, last_month.month)
+    ]
+    lines = ['"date","transaction_type","description","amount","notes"']
+    for tx in month:
+        lines.append(
+            f'"{tx.date_time:%d/%m/%Y}","{tx.transaction_type}","{tx.description}","{tx.amount}",'
+        )
+    return ("\n".join(lines) + "\n").encode()
+
+
+def load_dataset(db_session: Session, dataset: Dataset) -> int:
+    crud.create_accounts(db_session=db_session, accounts=dataset.accounts)
+    crud.create_transaction_rules(db_session=db_session, rules=dataset.rules)
+    crud.create_transactions(db_session=db_session, transactions=dataset.transactions)
+    return len(dataset.transactions)
+
+
+def run_benchmark(
+    client: TestClient, db_session: Session, dataset: Dataset, runs: int
+) -> Dict[str, Operation]:
+    operations = [
+        measure("load_dataset", 1, lambda _: load_dataset(db_session, dataset)),
+        measure("accounts_summary", runs, lambda _: get(client, "/api/accounts/summary/")),
+        measure("balance_monthly", runs, lambda _: get(client, "/api/balance/monthly/")),
+        measure(
+            "transactions",
+            runs,
+            lambda i: get(
+                client, f"/api/accounts/{dataset.specs[i % len(dataset.specs)].id}/transactions/"
+            ),
+        ),
+    ]
+
+    current_account = next(
+        (spec for spec in dataset.specs if spec.account_type == AccountType.current_credit), None
+    )
+    if current_account is not None:
+        csv_file = create_ingest_csv(dataset, current_account.id)
+
+        def ingest(_) -> int:
+            response = client.post(
+                f"/api/accounts/{current_account.id}/transactions/?ingest_type=csv",
+                files={"upload_file": ("transactions.csv", csv_file, "text/csv")},
+            )
+            response.raise_for_status()
+            return response.json()["transactions_inserted"]
+
+        operations.append(measure("ingest_csv", runs, ingest))
+
+    def run_rules(_) -> int:
+        crud.run_rules(db_session=db_session)
+        return len(dataset.rules)
+
+    operations.append(measure("run_rules", runs, run_rules))
+
+    if is_postgres(db_session):
+        # backups are postgres only
+        backups = []
+
+        def export(_) -> int:
+            response = client.get("/api/accounts/export/")
+            response.raise_for_status()
+            backups.append(response.content)
+            return len(dataset.transactions)
+
+        operations.append(measure("export", runs, export))
+
+        def empty_database():
+            # import needs an empty database
+            db_session.close()
+            Base.metadata.drop_all(bind=db_session.get_bind())
+            Base.metadata.create_all(bind=db_session.get_bind())
+
+        def import_backup(i) -> int:
+            response = client.post(
+                "/api/accounts/import/",
+                files={"file": ("backup.zip", io.BytesIO(backups[i]), "application/zip")},
+            )
+            response.raise_for_status()
+            return len(dataset.transactions)
+
+        operations.append(measure("import", runs, import_backup, prepare=empty_database))
+
+    return {operation.name: operation for operation in operations}
+
+
+def get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def create_report(
+    operations: Dict[str, Operation], dataset: Dataset, args: argparse.Namespace, dialect: str
+) -> dict:
+    return dict(
+        created=datetime.now().isoformat(timespec="seconds"),
+        git_commit=get_git_commit(),
+        database=dialect,
+        dataset=dict(
+            accounts=args.accounts,
+            years=args.years,
+            transactions_per_month=args.transactions_per_month,
+            seed=args.seed,
+            transactions=len(dataset.transactions),
+        ),
+        runs=args.runs,
+        operations={name: operation.as_dict() for name, operation in operations.items()},
+    )
+
+
+def compare_reports(report: dict, baseline: dict) -> List[str]:
+    lines = [f"{'operation':<20} {'p50 ms before':>14} {'after':>10} {'change':>8}"]
+    for name, stats in report["operations"].items():
+        if (before := baseline["operations"].get(name)) is None:
+            continue
+        change = (stats["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100
+        lines.append(f"{name:<20} {before['p50_ms']:>14} {stats['p50_ms']:>10} {change:>+7.1f}%")
+    if (baseline["dataset"], baseline["database"]) != (report["dataset"], report["database"]):
+        lines.append("warning: the datasets or databases differ, the numbers aren't comparable")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API over a generated dataset")
+    parser.add_argument("--accounts", type=int, default=12)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--transactions-per-month", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--runs", type=int, default=20, help="Times to run each operation")
+    parser.add_argument("-o", "--output", help="Path to write the JSON report to")
+    parser.add_argument("--compare", type=argparse.FileType("r"), help="A report to compare to")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    dataset = create_dataset(
+        num_accounts=args.accounts,
+        years=args.years,
+        transactions_per_month=args.transactions_per_month,
+        seed=args.seed,
+    )
+
+    db_name = f"benchmark_{uuid.uuid4().hex}"
+    if is_sqlite(get_db_url()):
+        db_url = f"sqlite:///file:{db_name}?mode=memory&cache=shared&uri=true"
+    else:
+        db_url = make_url(get_db_url()).set(database=db_name).render_as_string(False)
+        create_database(db_url)
+
+    engine = create_db_engine(db_url)
+    async_engine = create_async_db_engine(db_url)
+    try:
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        async_session_factory = async_sessionmaker(
+            async_engine, autoflush=False, expire_on_commit=False
+        )
+
+        def get_db_override():
+            with session_factory() as db_session:
+                yield db_session
+
+        async def get_async_db_override():
+            async with async_session_factory() as async_db_session:
+                yield async_db_session
+
+        app.dependency_overrides[get_db_session] = get_db_override
+        app.dependency_overrides[get_async_db_session] = get_async_db_override
+        app.dependency_overrides[get_async_session_factory] = lambda: async_session_factory
+
+        # one event loop for every request, so the async pool is used as it is when served
+        with TestClient(app) as client, session_factory() as db_session:
+            try:
+                operations = run_benchmark(client, db_session, dataset, args.runs)
+            finally:
+                client.portal.call(async_engine.dispose)
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+        if not is_sqlite(db_url):
+            drop_database(db_url)
+
+    report = create_report(operations, dataset, args, engine.dialect.name)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        print("\n".join(compare_reports(report, json.load(args.compare))))
+
+
+if __name__ == "__main__":
+    main()
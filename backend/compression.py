@@ -0,0 +1,184 @@
+import os
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Response compression, negotiated from the request's Accept-Encoding.  COMPRESSION_ENCODINGS
+# lists the encodings to offer in order of preference, empty turns compression off.  Responses
+# smaller than COMPRESSION_MINIMUM_SIZE bytes aren't worth it and go out as they are, as do ones
+# already encoded or of a type that doesn't compress (backup zips).  Streamed responses are
+# compressed a chunk at a time and flushed after each, so they still arrive as they're sent.
+
+COMPRESSION_ENCODINGS = [
+    encoding.strip()
+    for encoding in os.getenv("COMPRESSION_ENCODINGS", "br,gzip").split(",")
+    if encoding.strip()
+]
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # 11 is the max, too slow per request
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/xml")
+
+
+class Compressor(ABC):
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        pass
+
+    @abstractmethod
+    def flush(self) -> bytes:
+        # whatever's buffered, so a streamed chunk can be decoded on arrival
+        pass
+
+    @abstractmethod
+    def finish(self) -> bytes:
+        pass
+
+
+class GzipCompressor(Compressor):
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 for the gzip wrapper
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliCompressor(Compressor):
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def create_compressor(encoding: str) -> Compressor:
+    if encoding == "gzip":
+        return GzipCompressor(GZIP_LEVEL)
+    if encoding == "br":
+        return BrotliCompressor(BROTLI_QUALITY)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def parse_accept_encoding(accept_encoding: str) -> Dict[str, float]:
+    # encoding to quality, e.g. "br;q=0.8, gzip" -> {"br": 0.8, "gzip": 1.0}
+    accepted = {}
+    for item in accept_encoding.split(","):
+        encoding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if encoding.strip():
+            accepted[encoding.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(accept_encoding: str, encodings: List[str]) -> Optional[str]:
+    # the client's highest quality encoding, our preference breaking ties
+    accepted = parse_accept_encoding(accept_encoding)
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "")
+    return "content-encoding" not in headers and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        encodings: Optional[List[str]] = None,
+        minimum_size: Optional[int] = None,
+    ):
+        self.app = app
+        self.encodings = COMPRESSION_ENCODINGS if encodings is None else encodings
+        self.minimum_size = COMPRESSION_MINIMUM_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        encoding = choose_encoding(accept_encoding, self.encodings)
+
+        # the start is held back until the first body shows whether it's worth compressing
+        start_message: Optional[Message] = None
+        compressor: Optional[Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start_message, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                # negotiated, so caches key on it whether or not this one is compressed
+                MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                start_message = message
+                if encoding is None or not _compressible(Headers(raw=message["headers"])):
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = create_compressor(encoding)
+                headers = MutableHeaders(scope=start_message)
+                headers["Content-Encoding"] = encoding
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    body = compressor.compress(body) + compressor.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start_message)
+
+            if more_body:
+                body = compressor.compress(body) + compressor.flush()
+            else:
+                body = compressor.compress(body) + compressor.finish()
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,105 @@
+import logging
+from datetime import datetime
+from decimal import Decimal, getcontext
+from typing import Dict, Iterable, List
+
+from backend.balance_interpolation import MonthlyPennies
+from backend.money import round_pennies
+
+logger = logging.getLogger(__name__)
+
+getcontext().prec = 28
+
+# https://www.rateinflation.com/inflation-rate/uk-historical-inflation-rate/
+UK_CPI_RATES: Dict[int, Decimal] = {
+    1989: Decimal("0.05216"),
+    1990: Decimal("0.06999"),
+    1991: Decimal("0.07519"),
+    1992: Decimal("0.04232"),
+    1993: Decimal("0.02533"),
+    1994: Decimal("0.01994"),
+    1995: Decimal("0.0263"),
+    1996: Decimal("0.02425"),
+    1997: Decimal("0.01825"),
+    1998: Decimal("0.01557"),
+    1999: Decimal("0.01329"),
+    2000: Decimal("0.00796"),
+    2001: Decimal("0.01234"),
+    2002: Decimal("0.01259"),
+    2003: Decimal("0.01362"),
+    2004: Decimal("0.01344"),
+    2005: Decimal("0.02057"),
+    2006: Decimal("0.02329"),
+    2007: Decimal("0.02323"),
+    2008: Decimal("0.03602"),
+    2009: Decimal("0.02165"),
+    2010: Decimal("0.03298"),
+    2011: Decimal("0.04464"),
+    2012: Decimal("0.02828"),
+    2013: Decimal("0.02565"),
+    2014: Decimal("0.01461"),
+    2015: Decimal("0.0004"),
+    2016: Decimal("0.0066"),
+    2017: Decimal("0.02683"),
+    2018: Decimal("0.02478"),
+    2019: Decimal("0.01791"),
+    2020: Decimal("0.00851"),
+    2021: Decimal("0.02588"),
+    2022: Decimal("0.09067"),
+    2023: Decimal("0.07303"),
+    2024: Decimal("0.02530"),
+}
+
+
+def cpi_rows(annual_rates: Dict[int, Decimal] = UK_CPI_RATES) -> List[Dict]:
+    # A cumulative price index per month, starting at 1 in january of the first year.  Each
+    # year's rate is spread evenly over its months by compounding, so the index for january of
+    # the next year is the previous january's index grown by the full annual rate.
+    rows = []
+    price_index = Decimal(1)
+    for year, annual_rate in sorted(annual_rates.items()):
+        monthly_factor = (1 + annual_rate) ** (Decimal(1) / 12)
+        for month in range(1, 13):
+            rows.append(
+                dict(
+                    date_time=datetime(year=year, month=month, day=1),
+                    annual_rate=annual_rate,
+                    price_index=price_index,
+                )
+            )
+            price_index *= monthly_factor
+        # avoid drift from the twelve roundings of the monthly factor
+        price_index = rows[-12]["price_index"] * (1 + annual_rate)
+    return rows
+
+
+def price_index_for_month(price_indexes: Dict[str, Decimal], year_month: str) -> Decimal:
+    if year_month in price_indexes:
+        return price_indexes[year_month]
+
+    # months outside the cpi data use the nearest known index
+    known = sorted(price_indexes)
+    return price_indexes[known[0] if year_month < known[0] else known[-1]]
+
+
+def deflate_monthly_balances(
+    accounts_monthly_balances: Iterable[List[MonthlyPennies]],
+    price_indexes: Dict[str, Decimal],
+    base_year: int,
+):
+    # Express balances in the prices of january of base_year, adjusting in place.  Factors are
+    # computed once per month and shared by every account.
+    base_index = price_index_for_month(price_indexes, f"{base_year}-01")
+    factors: Dict[str, float] = {}
+
+    for monthly_balances in accounts_monthly_balances:
+        for mb in monthly_balances:
+            if mb.year_month not in factors:
+                factors[mb.year_month] = float(
+                    base_index / price_index_for_month(price_indexes, mb.year_month)
+                )
+            factor = factors[mb.year_month]
+            mb.start_balance = round_pennies(mb.start_balance * factor)
+            mb.end_balance = round_pennies(mb.end_balance * factor)
+            mb.monthly_balance = mb.end_balance - mb.start_balance
+            mb.deposits_to_date = round_pennies(mb.deposits_to_date * factor)
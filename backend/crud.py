@@ -1,25 +1,60 @@
+import csv
+import io
 import logging
+import re
+import secrets
 from datetime import datetime, timedelta, timezone
 from decimal import ROUND_HALF_UP, Decimal, getcontext
-from typing import Dict, List, Optional, Union
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
 
 from dateutil.relativedelta import relativedelta
 from fastapi import HTTPException, status
-from sqlalchemy import func, text
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    BigInteger,
+    ColumnElement,
+    Integer,
+    Row,
+    Select,
+    case,
+    cast,
+    delete,
+    func,
+    insert,
+    literal_column,
+    or_,
+    select,
+    text,
+    tuple_,
+)
+from sqlalchemy.orm import Session, aliased
 
 from backend import api_models, db_models
 from backend.balance_interpolation import (
+    MonthlyPennies,
     extend_monthly_balances_to_now,
     fill_missing_months,
 )
-from backend.util import Timer
+from backend.cpi import deflate_monthly_balances
+from backend.db import lift_statement_timeout
+from backend.dialects import SqlDecimal, is_postgres, tax_year_date, upsert, year_month
+from backend.metrics import INTERPOLATION_SECONDS, RULE_EVALUATION_SECONDS
+from backend.money import from_pennies
 
 logger = logging.getLogger(__name__)
 
 
 getcontext().prec = 28
 
+NUMERIC_PATTERN = re.compile(r"^-?[0-9]+(\.[0-9]+)?$")
+
+DATA_SERIES_BATCH_SIZE = 1000
+
+TAG_BATCH_SIZE = 1000
+
+SEARCH_TERM_PATTERN = re.compile(r'(-?)(?:"([^"]*)"?|(\S+))')
+SNIPPET_MARK = "**"
+
 
 def two_dp(value):
     return Decimal(value).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
@@ -33,23 +68,30 @@ def get_account(account_id: int, db_session: Session) -> Optional[db_models.Acco
     return db_session.query(db_models.Account).get(account_id)
 
 
+# The *_select builders are shared with async_crud so the sync and async paths run the same SQL
+
+
+def accounts_select(institution: Optional[str] = None, name: Optional[str] = None) -> Select:
+    query = select(db_models.Account)
+
+    if institution:
+        query = query.where(db_models.Account.institution == institution)
+    if name:
+        query = query.where(db_models.Account.name == name)
+
+    return query
+
+
 def get_accounts(
     db_session: Session,
     institution: Optional[str] = None,
     name: Optional[str] = None,
     as_db_model: bool = False,
 ) -> List[api_models.Account]:
-    query = db_session.query(db_models.Account)
-
-    if institution:
-        query = query.filter(db_models.Account.institution == institution)
-    if name:
-        query = query.filter(db_models.Account.name == name)
-
-    results = query.all()
+    results = db_session.scalars(accounts_select(institution=institution, name=name)).all()
     if as_db_model:
         return results
-    return [api_models.Account.model_validate(result) for result in results]
+    return [api_models.construct_from_attributes(api_models.Account, result) for result in results]
 
 
 def create_accounts(
@@ -67,6 +109,7 @@ def create_accounts(
         db_models.Account(**account.model_dump()) for account in accounts
     ]
     db_session.add_all(new_accounts)
+    bump_data_versions(db_session, [ACCOUNTS_VERSION])
     db_session.commit()
     for new_account in new_accounts:
         db_session.refresh(new_account)
@@ -76,33 +119,197 @@ def create_accounts(
     return new_accounts
 
 
-def get_transactions(
-    db_session: Session,
+def transactions_select(
     account_id: int,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    as_db_model: bool = False,
-) -> List[db_models.Transaction] | List[api_models.Transaction]:
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: Optional[int] = None,
+) -> Select:
+    query = _transactions_filter(select(db_models.Transaction), account_id, start_date, end_date)
+
+    if after is not None:
+        # Keyset pagination, after is the (date_time, id) of the last transaction already seen.
+        # The plain date_time bound lets the (account_id, date_time) index start at the page.
+        after_date_time, after_id = after
+        query = query.where(
+            db_models.Transaction.date_time >= after_date_time,
+            tuple_(db_models.Transaction.date_time, db_models.Transaction.id)
+            > tuple_(after_date_time, after_id),
+        )
+
+    # logger.info(str(query.compile(compile_kwargs={"literal_binds": True})))
+
+    query = query.order_by(db_models.Transaction.date_time.asc(), db_models.Transaction.id.asc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query
 
-    query = db_session.query(db_models.Transaction).filter(
-        db_models.Transaction.account_id == account_id
+
+def transactions_count_select(
+    account_id: int, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None
+) -> Select:
+    return _transactions_filter(
+        select(func.count()).select_from(db_models.Transaction), account_id, start_date, end_date
     )
 
+
+def _transactions_filter(
+    query: Select, account_id: int, start_date: Optional[datetime], end_date: Optional[datetime]
+) -> Select:
+    query = query.where(db_models.Transaction.account_id == account_id)
+
     if start_date:
-        query = query.filter(db_models.Transaction.date_time >= start_date)
+        query = query.where(db_models.Transaction.date_time >= start_date)
 
     if end_date:
-        query = query.filter(db_models.Transaction.date_time <= end_date)
+        query = query.where(db_models.Transaction.date_time <= end_date)
 
-    query = query.order_by(db_models.Transaction.date_time.asc())
+    return query
 
-    # logger.info(str(query.statement.compile(compile_kwargs={"literal_binds": True})))
 
-    results = query.all()
+def get_transactions(
+    db_session: Session,
+    account_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    as_db_model: bool = False,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: Optional[int] = None,
+) -> List[db_models.Transaction] | List[api_models.Transaction]:
+    results = db_session.scalars(
+        transactions_select(
+            account_id=account_id,
+            start_date=start_date,
+            end_date=end_date,
+            after=after,
+            limit=limit,
+        )
+    ).all()
 
     if as_db_model:
         return results
-    return [api_models.Transaction.model_validate(result) for result in results]
+    return [
+        api_models.construct_from_attributes(api_models.Transaction, result) for result in results
+    ]
+
+
+def build_tsquery(search: str) -> Optional[str]:
+    # Search box syntax to a tsquery: every word has to match, "quoted words" as a phrase, word*
+    # as a prefix and -word mustn't match.  Only word characters are kept, so any input makes a
+    # valid tsquery.  None without a word to match, the index can't find rows by absence alone.
+    terms = []
+    for negated, phrase, word in SEARCH_TERM_PATTERN.findall(search):
+        words = re.findall(r"\w+", phrase or word)
+        if not words:
+            continue
+        term = " <-> ".join(words)
+        if word.endswith("*"):
+            term += ":*"
+        terms.append(f"!({term})" if negated else term)
+    if all(term.startswith("!") for term in terms):
+        return None
+    return " & ".join(terms)
+
+
+def transaction_search_select(
+    tsquery: str,
+    account_ids: Optional[List[int]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = 50,
+) -> Select:
+    # postgres only, see db_models.transaction_search_vector.  The best matches come from the GIN
+    # index in the inner query, the snippets are only made for those.
+    transaction = db_models.Transaction
+    config = literal_column(f"'{db_models.TRANSACTION_SEARCH_CONFIG}'::regconfig")
+    query = func.to_tsquery(config, tsquery)
+    rank = func.ts_rank_cd(db_models.transaction_search_vector, query).label("rank")
+
+    matches = select(transaction, rank).where(db_models.transaction_search_vector.op("@@")(query))
+    if account_ids:
+        matches = matches.where(transaction.account_id.in_(account_ids))
+    if start_date:
+        matches = matches.where(transaction.date_time >= start_date)
+    if end_date:
+        matches = matches.where(transaction.date_time <= end_date)
+    matches = (
+        matches.order_by(rank.desc(), transaction.date_time.desc(), transaction.id.desc())
+        .limit(limit)
+        .subquery("matches")
+    )
+
+    match = aliased(transaction, matches)
+    text_columns = [match.description, match.transaction_type, match.reference, match.notes]
+    snippet = func.ts_headline(
+        config,
+        func.concat_ws(" ", *text_columns),
+        query,
+        f"StartSel={SNIPPET_MARK}, StopSel={SNIPPET_MARK}",
+    ).label("snippet")
+    return select(match, matches.c.rank, snippet).order_by(
+        matches.c.rank.desc(), match.date_time.desc(), match.id.desc()
+    )
+
+
+def build_search_results(rows: Sequence[Row]) -> List[api_models.TransactionSearchResult]:
+    return [
+        api_models.construct_from_attributes(
+            api_models.TransactionSearchResult, row[0], rank=row.rank, snippet=row.snippet
+        )
+        for row in rows
+    ]
+
+
+def search_transactions(
+    db_session: Session,
+    tsquery: str,
+    account_ids: Optional[List[int]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = 50,
+) -> List[api_models.TransactionSearchResult]:
+    rows = db_session.execute(
+        transaction_search_select(
+            tsquery, account_ids=account_ids, start_date=start_date, end_date=end_date, limit=limit
+        )
+    ).all()
+    return build_search_results(rows)
+
+
+def transaction_partition_name(year: int) -> str:
+    return f"{db_models.Transaction.__tablename__}_{year:d}"
+
+
+def ensure_transaction_partitions(db_session: Session, years: Iterable[int]):
+    # Rows can only be inserted once the partition for their year exists, call this before any
+    # insert into transactions.  Runs in the caller's transaction.
+    if not is_postgres(db_session):
+        return  # only postgres partitions
+
+    existing = set(
+        db_session.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+                "WHERE pg_inherits.inhparent = CAST(:table_name AS regclass)"
+            ),
+            {"table_name": db_models.Transaction.__tablename__},
+        ).scalars()
+    )
+
+    for year in sorted(set(years)):
+        partition_name = transaction_partition_name(year)
+        if partition_name in existing:
+            continue
+        logger.info(f"Creating transactions partition {partition_name}")
+        db_session.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name} "
+                f"PARTITION OF {db_models.Transaction.__tablename__} "
+                f"FOR VALUES FROM ('{year:d}-01-01') TO ('{year + 1:d}-01-01')"
+            )
+        )
 
 
 def create_transactions(
@@ -119,12 +326,16 @@ def create_transactions(
     new_transactions: List[db_models.Transaction] = [
         db_models.Transaction(**transaction.model_dump()) for transaction in transactions
     ]
-    db_session.add_all(new_transactions)
-    db_session.commit()
-
+    ensure_transaction_partitions(
+        db_session, {transaction.date_time.year for transaction in new_transactions}
+    )
     # make a list of all account_ids we've added transactions for
     account_ids = list({transaction.account_id for transaction in new_transactions})
 
+    db_session.add_all(new_transactions)
+    bump_data_versions(db_session, transactions_version_keys(account_ids))
+    db_session.commit()
+
     # todo switch uses of list to set where we're passing optional id sets.
     run_rules(db_session, account_ids)
 
@@ -136,18 +347,87 @@ def create_transactions(
     return new_transactions
 
 
-def get_last_transaction_dates(
-    db_session: Session, account_ids: Optional[List[int]] = None
-) -> Dict[int, datetime]:
-    # Start the query to get the last transaction date for each account_id
-    query = db_session.query(
+TRANSACTION_COPY_COLUMNS = (
+    "account_id",
+    "date_time",
+    "amount_pennies",
+    "is_value_adjustment",
+    "transaction_type",
+    "description",
+)
+TRANSACTION_COPY_BATCH_SIZE = 10000
+
+
+def copy_transactions(db_session: Session, rows: Iterable[Tuple], years: Iterable[int]) -> int:
+    # Bulk load of TRANSACTION_COPY_COLUMNS tuples for large generated datasets, streamed through
+    # COPY on postgres.  Unlike create_transactions rules aren't run, call run_rules once the load
+    # is done.  years are the years the rows cover, for their partitions.  Millions of rows are
+    # one COPY, run without the requests' statement timeout.
+    lift_statement_timeout(db_session)
+    ensure_transaction_partitions(db_session, years)
+    table = db_models.Transaction.__table__
+
+    if not is_postgres(db_session):
+        rows = iter(rows)
+        count = 0
+        while batch := list(islice(rows, TRANSACTION_COPY_BATCH_SIZE)):
+            db_session.execute(
+                table.insert(), [dict(zip(TRANSACTION_COPY_COLUMNS, row)) for row in batch]
+            )
+            count += len(batch)
+        bump_all_data_versions(db_session)  # the rows stream past, unseen
+        db_session.commit()
+        return count
+
+    cursor = db_session.connection().connection.cursor()
+    cursor.copy_expert(
+        f"COPY {table.name} ({', '.join(TRANSACTION_COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        _CsvRowStream(rows),
+    )
+    bump_all_data_versions(db_session)  # the rows stream past, unseen
+    db_session.commit()
+    return cursor.rowcount
+
+
+class _CsvRowStream:
+    # a file for COPY to read, formatting rows as it's read so they're never all in memory
+    def __init__(self, rows: Iterable[Tuple]):
+        self.rows = iter(rows)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.pending = b""
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.pending) < size:
+            batch = list(islice(self.rows, 1000))
+            if not batch:
+                break
+            self.writer.writerows(batch)
+            self.pending += self.buffer.getvalue().encode()
+            self.buffer.seek(0)
+            self.buffer.truncate()
+        if size < 0:
+            size = len(self.pending)
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk
+
+
+def last_transaction_dates_select(account_ids: Optional[List[int]] = None) -> Select:
+    # the last transaction date for each account_id
+    query = select(
         db_models.Transaction.account_id, func.max(db_models.Transaction.date_time)
     ).group_by(db_models.Transaction.account_id)
 
     if account_ids:
-        query = query.filter(db_models.Transaction.account_id.in_(account_ids))
+        query = query.where(db_models.Transaction.account_id.in_(account_ids))
 
-    results = query.all()
+    return query
+
+
+def get_last_transaction_dates(
+    db_session: Session, account_ids: Optional[List[int]] = None
+) -> Dict[int, datetime]:
+    results = db_session.execute(last_transaction_dates_select(account_ids=account_ids)).all()
 
     # Convert the results to a dictionary
     account_last_transaction_date = {account_id: last_date for account_id, last_date in results}
@@ -155,56 +435,71 @@ def get_last_transaction_dates(
     return account_last_transaction_date
 
 
-def get_balance(
-    db_session: Session,
+def sum_pennies(column: ColumnElement, label: str) -> ColumnElement:
+    # SUM of a BIGINT is NUMERIC in postgres, cast back so the drivers return ints
+    return cast(func.sum(column), BigInteger).label(label)
+
+
+def balance_selects(
     account_ids: Optional[List[int]] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-) -> List[api_models.BalanceResult]:
-    results = []
-
+) -> Tuple[Select, Select, Select]:
     # Base queries
-    balance_query = db_session.query(
-        db_models.Transaction.account_id, func.sum(db_models.Transaction.amount).label("balance")
+    balance_query = select(
+        db_models.Transaction.account_id,
+        sum_pennies(db_models.Transaction.amount_pennies, "balance"),
     )
-    deposits_query = db_session.query(
+    deposits_query = select(
         db_models.Transaction.account_id,
-        func.sum(db_models.Transaction.amount).label("deposits_to_date"),
-    ).filter(db_models.Transaction.is_value_adjustment == False)
-    max_date_query = db_session.query(
+        sum_pennies(db_models.Transaction.amount_pennies, "deposits_to_date"),
+    ).where(db_models.Transaction.is_value_adjustment == False)
+    max_date_query = select(
         db_models.Transaction.account_id,
         func.max(db_models.Transaction.date_time).label("last_transaction_date"),
     )
 
     # Apply filters
     if account_ids:
-        balance_query = balance_query.filter(db_models.Transaction.account_id.in_(account_ids))
-        deposits_query = deposits_query.filter(db_models.Transaction.account_id.in_(account_ids))
-        max_date_query = max_date_query.filter(db_models.Transaction.account_id.in_(account_ids))
+        balance_query = balance_query.where(db_models.Transaction.account_id.in_(account_ids))
+        deposits_query = deposits_query.where(db_models.Transaction.account_id.in_(account_ids))
+        max_date_query = max_date_query.where(db_models.Transaction.account_id.in_(account_ids))
     if start_date:
-        balance_query = balance_query.filter(db_models.Transaction.date_time >= start_date)
-        deposits_query = deposits_query.filter(db_models.Transaction.date_time >= start_date)
-        max_date_query = max_date_query.filter(db_models.Transaction.date_time >= start_date)
+        balance_query = balance_query.where(db_models.Transaction.date_time >= start_date)
+        deposits_query = deposits_query.where(db_models.Transaction.date_time >= start_date)
+        max_date_query = max_date_query.where(db_models.Transaction.date_time >= start_date)
     if end_date:
-        balance_query = balance_query.filter(db_models.Transaction.date_time <= end_date)
-        deposits_query = deposits_query.filter(db_models.Transaction.date_time <= end_date)
-        max_date_query = max_date_query.filter(db_models.Transaction.date_time <= end_date)
+        balance_query = balance_query.where(db_models.Transaction.date_time <= end_date)
+        deposits_query = deposits_query.where(db_models.Transaction.date_time <= end_date)
+        max_date_query = max_date_query.where(db_models.Transaction.date_time <= end_date)
 
     # Group by account ID
-    balance_query = balance_query.group_by(db_models.Transaction.account_id)
-    deposits_query = deposits_query.group_by(db_models.Transaction.account_id)
-    max_date_query = max_date_query.group_by(db_models.Transaction.account_id)
+    return (
+        balance_query.group_by(db_models.Transaction.account_id),
+        deposits_query.group_by(db_models.Transaction.account_id),
+        max_date_query.group_by(db_models.Transaction.account_id),
+    )
+
+
+def build_balance_results(
+    balance_rows: Sequence[Row],
+    deposits_rows: Sequence[Row],
+    max_date_rows: Sequence[Row],
+    account_ids: Optional[List[int]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> List[api_models.BalanceResult]:
+    results = []
 
-    # Execute the queries
-    balance_results = {row.account_id: row.balance for row in balance_query.all()}
-    deposits_results = {row.account_id: row.deposits_to_date for row in deposits_query.all()}
-    max_date_results = {row.account_id: row.last_transaction_date for row in max_date_query.all()}
+    balance_results = {row.account_id: row.balance for row in balance_rows}
+    deposits_results = {row.account_id: row.deposits_to_date for row in deposits_rows}
+    max_date_results = {row.account_id: row.last_transaction_date for row in max_date_rows}
 
     all_account_ids = account_ids or list(balance_results.keys())
 
     for account_id in all_account_ids:
-        balance = balance_results.get(account_id, Decimal(0))
-        deposits_to_date = deposits_results.get(account_id, Decimal(0))
+        balance = from_pennies(balance_results.get(account_id, 0))
+        deposits_to_date = from_pennies(deposits_results.get(account_id, 0))
         last_transaction_date = max_date_results.get(account_id)
         results.append(
             api_models.BalanceResult(
@@ -220,6 +515,104 @@ def get_balance(
     return results
 
 
+def get_balance(
+    db_session: Session,
+    account_ids: Optional[List[int]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> List[api_models.BalanceResult]:
+    balance_query, deposits_query, max_date_query = balance_selects(
+        account_ids=account_ids, start_date=start_date, end_date=end_date
+    )
+    return build_balance_results(
+        db_session.execute(balance_query).all(),
+        db_session.execute(deposits_query).all(),
+        db_session.execute(max_date_query).all(),
+        account_ids=account_ids,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+
+def monthly_transactions_select(account_id: int, month_start: datetime) -> Select:
+    # The month's transactions with running totals from window functions, outer joined to the
+    # totals before the month so a month without transactions still gets its row.  Both sides are
+    # ranges of the (account_id, date_time) index, the totals before an index only scan of it.
+    transaction = db_models.Transaction
+    deposit = case((transaction.is_value_adjustment, 0), else_=transaction.amount_pennies)
+    before = (
+        select(
+            func.coalesce(cast(func.sum(transaction.amount_pennies), BigInteger), 0).label(
+                "start_pennies"
+            ),
+            func.coalesce(cast(func.sum(deposit), BigInteger), 0).label("start_deposits_pennies"),
+        )
+        .where(transaction.account_id == account_id, transaction.date_time < month_start)
+        .subquery("before_month")
+    )
+    running = dict(order_by=(transaction.date_time, transaction.id), rows=(None, 0))
+
+    return (
+        select(
+            before.c.start_pennies,
+            before.c.start_deposits_pennies,
+            transaction,
+            cast(func.sum(transaction.amount_pennies).over(**running), BigInteger).label(
+                "running_pennies"
+            ),
+            cast(func.sum(deposit).over(**running), BigInteger).label("running_deposits_pennies"),
+        )
+        .select_from(
+            before.outerjoin(
+                transaction,
+                (transaction.account_id == account_id)
+                & (transaction.date_time >= month_start)
+                & (transaction.date_time < get_first_day_of_next_month(month_start)),
+            )
+        )
+        .order_by(transaction.date_time, transaction.id)
+    )
+
+
+def build_monthly_transactions(
+    rows: Sequence[Row], account_id: int, month_start: datetime
+) -> api_models.MonthlyTransactions:
+    start_pennies, start_deposits_pennies = rows[0].start_pennies, rows[0].start_deposits_pennies
+    running_pennies = running_deposits_pennies = 0
+    transactions = []
+    for row in rows:
+        if row.Transaction is None:
+            continue  # the outer join's row for a month without transactions
+        running_pennies, running_deposits_pennies = (
+            row.running_pennies,
+            row.running_deposits_pennies,
+        )
+        transactions.append(
+            api_models.construct_from_attributes(
+                api_models.TransactionWithBalance,
+                row.Transaction,
+                balance=from_pennies(start_pennies + running_pennies),
+            )
+        )
+
+    return api_models.MonthlyTransactions.model_construct(
+        account_id=account_id,
+        year_month=month_start.strftime("%Y-%m"),
+        start_balance=from_pennies(start_pennies),
+        end_balance=from_pennies(start_pennies + running_pennies),
+        monthly_deposits=from_pennies(running_deposits_pennies),
+        deposits_to_date=from_pennies(start_deposits_pennies + running_deposits_pennies),
+        transactions=transactions,
+    )
+
+
+def get_monthly_transactions(
+    db_session: Session, account_id: int, month_start: datetime
+) -> api_models.MonthlyTransactions:
+    rows = db_session.execute(monthly_transactions_select(account_id, month_start)).all()
+    return build_monthly_transactions(rows, account_id=account_id, month_start=month_start)
+
+
 def set_balance(
     db_session: Session,
     account_id: int,
@@ -329,90 +722,154 @@ def set_balance(
     return results
 
 
+def record_deletions(db_session: Session, table_name: str, record_ids: List[int]):
+    # caller commits, the tombstones are written in the same transaction as the delete
+    db_session.add_all(
+        [
+            db_models.DeletedRecord(table_name=table_name, record_id=record_id)
+            for record_id in record_ids
+        ]
+    )
+
+
+# data version keys, transactions are versioned per account so writes to different accounts
+# don't queue on one row
+ACCOUNTS_VERSION = "accounts"
+DATA_SERIES_VERSION = "data_series"
+TRANSACTIONS_VERSION_PREFIX = "transactions:"
+
+
+def transactions_version_keys(account_ids: Iterable[int]) -> List[str]:
+    return [f"{TRANSACTIONS_VERSION_PREFIX}{account_id}" for account_id in account_ids]
+
+
+def bump_data_versions(db_session: Session, keys: Iterable[str]):
+    # Caller commits, the new versions land in the same transaction as the change.  Random rather
+    # than counted, so a rebuilt database can't hand out a version a client holds an ETag for.
+    # Sorted so concurrent writers lock the rows in the same order.
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    version = secrets.randbits(63)
+    stmt = upsert(db_session, db_models.DataVersion).values(
+        [dict(key=key, version=version) for key in keys]
+    )
+    db_session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[db_models.DataVersion.key], set_=dict(version=stmt.excluded.version)
+        )
+    )
+
+
+def bump_all_data_versions(db_session: Session):
+    # for writes that can touch anything, e.g. restoring a backup or a bulk load
+    account_ids = db_session.scalars(select(db_models.Account.id)).all()
+    bump_data_versions(
+        db_session,
+        [ACCOUNTS_VERSION, DATA_SERIES_VERSION] + transactions_version_keys(account_ids),
+    )
+
+
+def data_versions_select(keys: Iterable[str] = (), prefixes: Iterable[str] = ()) -> Select:
+    return select(db_models.DataVersion.key, db_models.DataVersion.version).where(
+        or_(
+            db_models.DataVersion.key.in_(list(keys)),
+            *[db_models.DataVersion.key.startswith(prefix) for prefix in prefixes],
+        )
+    )
+
+
+def get_data_versions(
+    db_session: Session, keys: Iterable[str] = (), prefixes: Iterable[str] = ()
+) -> Dict[str, int]:
+    return dict(db_session.execute(data_versions_select(keys=keys, prefixes=prefixes)).all())
+
+
 def get_first_day_of_next_month(date: datetime) -> datetime:
     next_month = date.replace(day=28) + timedelta(days=4)  # this will never fail
     return next_month.replace(day=1)
 
 
-def get_account_ids_without_transactions(
-    db_session: Session, account_ids: Optional[List[int]] = None
-) -> List[int]:
+def account_ids_without_transactions_select(account_ids: Optional[List[int]] = None) -> Select:
     query = (
-        db_session.query(db_models.Account.id)
+        select(db_models.Account.id)
         .outerjoin(db_models.Transaction)
-        .filter(db_models.Transaction.id == None)
+        .where(db_models.Transaction.id == None)
     )
 
     if account_ids:
-        query = query.filter(db_models.Account.id.in_(account_ids))
+        query = query.where(db_models.Account.id.in_(account_ids))
+
+    return query
 
-    result = query.all()
-    account_ids_without_transactions = [row[0] for row in result]
 
-    return account_ids_without_transactions
+def get_account_ids_without_transactions(
+    db_session: Session, account_ids: Optional[List[int]] = None
+) -> List[int]:
+    return list(
+        db_session.scalars(account_ids_without_transactions_select(account_ids=account_ids)).all()
+    )
+
 
+def monthly_balances_select(account_ids: Optional[List[int]] = None) -> Select:
+    # per account and month: the month's total and deposits, with running totals of each
+    transaction = db_models.Transaction
+    month = year_month(transaction.date_time)
+    deposit = case((transaction.is_value_adjustment, 0), else_=transaction.amount_pennies)
+    running = dict(partition_by=transaction.account_id, order_by=month)
 
-def get_monthly_balances(
-    db_session: Session, account_ids: Optional[List[int]] = None, interpolate: bool = True
-) -> List[api_models.MonthlyBalanceResult]:
+    query = (
+        select(
+            transaction.account_id,
+            month.label("year_month"),
+            sum_pennies(transaction.amount_pennies, "monthly_balance"),
+            cast(func.sum(func.sum(transaction.amount_pennies)).over(**running), BigInteger).label(
+                "cumulative_balance"
+            ),
+            sum_pennies(deposit, "monthly_deposit"),
+            cast(func.sum(func.sum(deposit)).over(**running), BigInteger).label(
+                "cumulative_deposits"
+            ),
+        )
+        .group_by(transaction.account_id, month)
+        .order_by(transaction.account_id, month)
+    )
 
-    # Prepare the SQL text query
-    sql_query = """
-        SELECT
-            account_id,
-            DATE_TRUNC('month', date_time) AS month,
-            CAST(SUM(amount) AS DECIMAL) AS monthly_balance,
-            CAST(SUM(SUM(amount)) OVER (
-                PARTITION BY account_id
-                ORDER BY DATE_TRUNC('month', date_time)
-            ) AS DECIMAL) AS cumulative_balance,
-            CAST(SUM(CASE WHEN is_value_adjustment THEN 0 ELSE amount END) AS DECIMAL) AS monthly_deposit,
-            CAST(SUM(SUM(CASE WHEN is_value_adjustment THEN 0 ELSE amount END)) OVER (
-                PARTITION BY account_id
-                ORDER BY DATE_TRUNC('month', date_time)
-            ) AS DECIMAL) AS cumulative_deposits
-        FROM transactions
-        {where_clause}
-        GROUP BY account_id, DATE_TRUNC('month', date_time)
-        ORDER BY account_id, month;
-    """
-
-    # Prepare the WHERE clause if account_ids are provided
-    where_clause = ""
     if account_ids:
-        where_clause = "WHERE account_id IN :account_ids"
+        query = query.where(transaction.account_id.in_(account_ids))
 
-    sql_query = sql_query.format(where_clause=where_clause)
+    return query
 
-    # Execute the SQL query
-    result = db_session.execute(
-        text(sql_query), {"account_ids": tuple(account_ids)} if account_ids else {}
-    ).fetchall()
 
-    # Process results
-    results = {}
+def build_monthly_balances(
+    rows: Sequence[Row],
+    accounts: List[api_models.Account],
+    empty_account_ids: List[int],
+    interpolate: bool = True,
+    price_indexes: Optional[Dict[str, Decimal]] = None,
+    real_terms: Optional[int] = None,
+) -> List[api_models.MonthlyBalanceResult]:
+    # Process results, in integer pennies until the api models are built
+    results: Dict[int, List[MonthlyPennies]] = {}
 
-    for row in result:
+    for row in rows:
         account_id = row[0]
-        year_month_str = row[1].strftime("%Y-%m")
+        year_month_str = row[1]
 
         if account_id not in results:
-            start_balance = Decimal(0)
-            results[account_id] = api_models.MonthlyBalanceResult(
-                account_id=account_id,
-                monthly_balances=[],
-            )
+            start_balance = 0
+            results[account_id] = []
         else:
-            previous_month_balance = results[account_id].monthly_balances[-1].end_balance
+            previous_month_balance = results[account_id][-1].end_balance
             start_balance = previous_month_balance
 
-        monthly_balance = Decimal(row[2])
+        monthly_balance = row[2]
         end_balance = start_balance + monthly_balance
 
         # Adjust deposits_to_date to reflect cumulative deposits considering negative amounts (withdrawals)
-        deposits_to_date = Decimal(row[5])
+        deposits_to_date = row[5]
 
-        monthly_balance_obj = api_models.MonthlyBalance(
+        monthly_balance_obj = MonthlyPennies(
             year_month=year_month_str,
             start_balance=start_balance,
             monthly_balance=monthly_balance,
@@ -420,47 +877,53 @@ def get_monthly_balances(
             deposits_to_date=deposits_to_date,
         )
 
-        results[account_id].monthly_balances.append(monthly_balance_obj)
-
-    # Get the account objects
-    accounts = get_accounts(db_session)
+        results[account_id].append(monthly_balance_obj)
 
     if interpolate:
         # Fill in the missing months where there were no transactions
-        for account_id, result in results.items():
+        for account_id, monthly_balances in results.items():
             account = next(account for account in accounts if account.id == account_id)
 
-            try:
-                # Add a final value to the current date for accounts we don't have up-to-date data for
-                extend_monthly_balances_to_now(account, result)
-            except Exception as ex:
-                logger.error(f"Interpolation Error: Failed to extend {account_id=} to now.  {ex=}")
-
-            try:
-                # Gap fill to ensure we have data for all months up to the current month
-                fill_missing_months(account, result)
-            except Exception as ex:
-                logger.error(f"Interpolation Error: Failed to gap fill {account_id=}.  {ex=}")
+            with INTERPOLATION_SECONDS.time(account_id=account_id):
+                try:
+                    # Add a final value to the current date for accounts we don't have up-to-date data for
+                    extend_monthly_balances_to_now(account, monthly_balances)
+                except Exception as ex:
+                    logger.error(
+                        f"Interpolation Error: Failed to extend {account_id=} to now.  {ex=}"
+                    )
+
+                try:
+                    # Gap fill to ensure we have data for all months up to the current month
+                    results[account_id] = fill_missing_months(account, monthly_balances)
+                except Exception as ex:
+                    logger.error(f"Interpolation Error: Failed to gap fill {account_id=}.  {ex=}")
+
+    for account_id in empty_account_ids:
+        # Add an empty monthly balance so we don't have to make monthly_balances optional
+        results[account_id] = [
+            MonthlyPennies(
+                year_month=datetime.now().strftime("%Y-%m"),
+                start_balance=0,
+                monthly_balance=0,
+                end_balance=0,
+                deposits_to_date=0,
+            )
+        ]
 
-    # Find accounts with no transactions
-    empty_accounts = get_account_ids_without_transactions(
-        db_session=db_session, account_ids=account_ids
-    )
+    if real_terms is not None:
+        if not price_indexes:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No CPI data found")
+        # after interpolation so extended and gap filled months are deflated too
+        deflate_monthly_balances(results.values(), price_indexes, base_year=real_terms)
 
-    for account_id in empty_accounts:
-        # Add an empty monthly balance so we don't have to make monthly_balances optional
-        results[account_id] = api_models.MonthlyBalanceResult(
+    results = {
+        account_id: api_models.MonthlyBalanceResult.model_construct(
             account_id=account_id,
-            monthly_balances=[
-                api_models.MonthlyBalance(
-                    year_month=datetime.now().strftime("%Y-%m"),
-                    start_balance=Decimal(0),
-                    monthly_balance=Decimal(0),
-                    end_balance=Decimal(0),
-                    deposits_to_date=Decimal(0),
-                )
-            ],
+            monthly_balances=[mb.to_api() for mb in monthly_balances],
         )
+        for account_id, monthly_balances in results.items()
+    }
 
     # Sort by earliest start date
     results = dict(sorted(results.items(), key=lambda item: item[1].start_year_month))
@@ -468,6 +931,48 @@ def get_monthly_balances(
     return list(results.values())
 
 
+def get_monthly_balances(
+    db_session: Session,
+    account_ids: Optional[List[int]] = None,
+    interpolate: bool = True,
+    real_terms: Optional[int] = None,
+) -> List[api_models.MonthlyBalanceResult]:
+    return build_monthly_balances(
+        rows=db_session.execute(monthly_balances_select(account_ids=account_ids)).all(),
+        accounts=get_accounts(db_session),
+        # Find accounts with no transactions
+        empty_account_ids=get_account_ids_without_transactions(
+            db_session=db_session, account_ids=account_ids
+        ),
+        interpolate=interpolate,
+        price_indexes=get_price_indexes(db_session) if real_terms is not None else None,
+        real_terms=real_terms,
+    )
+
+
+def price_indexes_select() -> Select:
+    return select(db_models.Cpi.date_time, db_models.Cpi.price_index).order_by(
+        db_models.Cpi.date_time
+    )
+
+
+def build_price_indexes(rows: Sequence[Row]) -> Dict[str, Decimal]:
+    return {date_time.strftime("%Y-%m"): price_index for date_time, price_index in rows}
+
+
+def get_price_indexes(db_session: Session) -> Dict[str, Decimal]:
+    return build_price_indexes(db_session.execute(price_indexes_select()).all())
+
+
+def get_cpi_rates(db_session: Session) -> Dict[int, Decimal]:
+    rows = db_session.execute(
+        select(db_models.Cpi.date_time, db_models.Cpi.annual_rate)
+        .filter(func.extract("month", db_models.Cpi.date_time) == 1)
+        .order_by(db_models.Cpi.date_time)
+    ).all()
+    return {date_time.year: annual_rate for date_time, annual_rate in rows}
+
+
 # todo split this file up
 
 
@@ -527,8 +1032,14 @@ def get_rules(
 
 
 # todo all these optional lists should be sets
-def run_rules(db_session: Session, account_ids: Optional[Union[int, List[int]]] = None):
-    logger.info(f"Running rules, {account_ids=}")
+def run_rules(
+    db_session: Session,
+    account_ids: Optional[Union[int, List[int]]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+):
+    # on the transactions between the dates, e.g. those an ingest replaced, all of them by default
+    logger.info(f"Running rules, {account_ids=}, {start_date=}, {end_date=}")
 
     if account_ids is not None and not isinstance(account_ids, list):
         account_ids = [account_ids]
@@ -536,11 +1047,17 @@ def run_rules(db_session: Session, account_ids: Optional[Union[int, List[int]]]
     rules: List[api_models.TransactionRule] = get_rules(
         db_session=db_session, account_ids=account_ids
     )
+    changed_account_ids: Set[int] = set()
 
     try:
         for rule in rules:
+            if isinstance(rule.condition, api_models.TagContainsAny):
+                continue  # tagged in bulk below
             transactions: List[api_models.Transaction] = get_transactions(
-                db_session=db_session, account_id=rule.account_id
+                db_session=db_session,
+                account_id=rule.account_id,
+                start_date=start_date,
+                end_date=end_date,
             )
 
             logger.info(
@@ -548,10 +1065,21 @@ def run_rules(db_session: Session, account_ids: Optional[Union[int, List[int]]]
                 f" on account_id={rule.account_id} for {len(transactions)} transactions"
             )
 
-            for transaction in transactions:
-                rule.condition.evaluate(transaction)
-                db_session.merge(db_models.Transaction(**transaction.model_dump()))
-
+            with RULE_EVALUATION_SECONDS.time(condition_type=rule.condition.__class__.__name__):
+                for transaction in transactions:
+                    before = transaction.model_copy()
+                    rule.condition.evaluate(transaction)
+                    # merging loads the row, skip the ones the rule left as they were
+                    if transaction != before:
+                        db_session.merge(db_models.Transaction(**transaction.model_dump()))
+                        changed_account_ids.add(transaction.account_id)
+
+        # tagging selects the rows afresh, and the session doesn't autoflush
+        db_session.flush()
+        changed_account_ids |= tag_transactions(
+            db_session, account_ids=account_ids, start_date=start_date, end_date=end_date
+        )
+        bump_data_versions(db_session, transactions_version_keys(changed_account_ids))
         db_session.commit()
     except Exception as e:
         # logger.error(f"Error running rules: {e}")
@@ -561,98 +1089,437 @@ def run_rules(db_session: Session, account_ids: Optional[Union[int, List[int]]]
     # logger.info(f"Rules run.")
 
 
+def get_tag_ids(db_session: Session, names: Set[str]) -> Dict[str, int]:
+    tag_ids: Dict[str, int] = dict(
+        db_session.execute(
+            select(db_models.Tag.name, db_models.Tag.id).where(db_models.Tag.name.in_(names))
+        ).all()
+    )
+
+    new_tags = [db_models.Tag(name=name) for name in names - tag_ids.keys()]
+    if new_tags:
+        db_session.add_all(new_tags)
+        db_session.flush()
+        tag_ids.update({new_tag.name: new_tag.id for new_tag in new_tags})
+
+    return tag_ids
+
+
+def tags_select() -> Select:
+    return select(db_models.Tag).order_by(db_models.Tag.name)
+
+
+def get_tags(db_session: Session) -> List[api_models.Tag]:
+    return [api_models.Tag.model_validate(tag) for tag in db_session.scalars(tags_select())]
+
+
+# (account_id, date_time, amount_pennies, tag_id) of a transaction's tag
+TagRow = Tuple[int, datetime, int, int]
+
+
+def transaction_tags_select(
+    account_id: int, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None
+) -> Select:
+    transaction_tag = db_models.TransactionTag
+    query = select(
+        transaction_tag.transaction_id,
+        transaction_tag.account_id,
+        transaction_tag.date_time,
+        transaction_tag.amount_pennies,
+        transaction_tag.tag_id,
+    ).where(transaction_tag.account_id == account_id)
+    if start_date:
+        query = query.where(transaction_tag.date_time >= start_date)
+    if end_date:
+        query = query.where(transaction_tag.date_time <= end_date)
+    return query
+
+
+def tag_transactions(
+    db_session: Session,
+    account_ids: Optional[List[int]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> Set[int]:
+    # Gives the transactions between the dates the tags of their account's tag rules and takes
+    # away those no rule gives them any more, writing only the differences and adding them to the
+    # monthly totals.  Caller commits, returns the accounts whose tags changed.
+    if account_ids is None:
+        account_ids = db_session.scalars(select(db_models.Account.id)).all()
+    rules = [
+        rule
+        for rule in get_rules(db_session=db_session, account_ids=account_ids)
+        if isinstance(rule.condition, api_models.TagContainsAny)
+    ]
+    tag_ids = get_tag_ids(db_session, {rule.condition.tag for rule in rules})
+    transaction_tag = db_models.TransactionTag
+    changed_account_ids: Set[int] = set()
+
+    for account_id in account_ids:
+        account_rules = [rule for rule in rules if rule.account_id == account_id]
+        wanted: Dict[Tuple[int, int], TagRow] = {}
+        if account_rules:
+            # rows rather than models, the rules only read the columns
+            transactions = db_session.execute(
+                _transactions_filter(
+                    select(*db_models.Transaction.__table__.columns),
+                    account_id,
+                    start_date,
+                    end_date,
+                )
+            )
+            with RULE_EVALUATION_SECONDS.time(condition_type=api_models.TagContainsAny.__name__):
+                for transaction in transactions:
+                    for rule in account_rules:
+                        if rule.condition.evaluate(transaction):
+                            tag_id = tag_ids[rule.condition.tag]
+                            wanted[(transaction.id, tag_id)] = (
+                                account_id,
+                                transaction.date_time,
+                                transaction.amount_pennies,
+                                tag_id,
+                            )
+
+        existing: Dict[Tuple[int, int], TagRow] = {
+            (row.transaction_id, row.tag_id): tuple(row)[1:]
+            for row in db_session.execute(
+                transaction_tags_select(account_id, start_date=start_date, end_date=end_date)
+            )
+        }
+        added = sorted(wanted.keys() - existing.keys())
+        removed = sorted(existing.keys() - wanted.keys())
+        if not added and not removed:
+            continue
+
+        logger.info(f"Tagging account {account_id=}, {len(added)} added, {len(removed)} removed")
+        for start in range(0, len(removed), TAG_BATCH_SIZE):
+            db_session.execute(
+                delete(transaction_tag).where(
+                    tuple_(transaction_tag.transaction_id, transaction_tag.tag_id).in_(
+                        removed[start : start + TAG_BATCH_SIZE]
+                    )
+                )
+            )
+        if added:
+            db_session.execute(
+                insert(transaction_tag),
+                [
+                    dict(
+                        transaction_id=transaction_id,
+                        tag_id=tag_id,
+                        account_id=account_id,
+                        date_time=wanted[(transaction_id, tag_id)][1],
+                        amount_pennies=wanted[(transaction_id, tag_id)][2],
+                    )
+                    for transaction_id, tag_id in added
+                ],
+            )
+        add_to_tag_monthly_totals(db_session, [wanted[key] for key in added])
+        add_to_tag_monthly_totals(db_session, [existing[key] for key in removed], sign=-1)
+        changed_account_ids.add(account_id)
+
+    return changed_account_ids
+
+
+def delete_transaction_tags(
+    db_session: Session, account_id: int, start_date: datetime, end_date: datetime
+):
+    # before deleting the account's transactions between the dates, which would cascade to the
+    # tags without taking them off the totals.  Caller commits.
+    transaction_tag = db_models.TransactionTag
+    deleted = db_session.execute(
+        delete(transaction_tag)
+        .where(
+            transaction_tag.account_id == account_id,
+            transaction_tag.date_time.between(start_date, end_date),
+        )
+        .returning(
+            transaction_tag.account_id,
+            transaction_tag.date_time,
+            transaction_tag.amount_pennies,
+            transaction_tag.tag_id,
+        )
+    ).all()
+    add_to_tag_monthly_totals(db_session, deleted, sign=-1)
+
+
+def add_to_tag_monthly_totals(db_session: Session, tag_rows: Iterable[TagRow], sign: int = 1):
+    # Counts the tags into (or with sign -1 out of) the monthly totals, upserting the change so
+    # only the months touched are written.  Caller commits.
+    changes: Dict[Tuple[int, str, int], Tuple[int, int]] = {}
+    for account_id, date_time, amount_pennies, tag_id in tag_rows:
+        key = (account_id, date_time.strftime("%Y-%m"), tag_id)
+        count, pennies = changes.get(key, (0, 0))
+        changes[key] = (count + sign, pennies + sign * amount_pennies)
+    if not changes:
+        return
+
+    total = db_models.TagMonthlyTotal
+    # sorted so concurrent writers lock the rows in the same order
+    rows = [
+        dict(
+            account_id=account_id,
+            year_month=month,
+            tag_id=tag_id,
+            transaction_count=count,
+            total_pennies=pennies,
+        )
+        for (account_id, month, tag_id), (count, pennies) in sorted(changes.items())
+    ]
+    for start in range(0, len(rows), TAG_BATCH_SIZE):
+        stmt = upsert(db_session, total).values(rows[start : start + TAG_BATCH_SIZE])
+        db_session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[total.account_id, total.year_month, total.tag_id],
+                set_=dict(
+                    transaction_count=total.transaction_count + stmt.excluded.transaction_count,
+                    total_pennies=total.total_pennies + stmt.excluded.total_pennies,
+                ),
+            )
+        )
+    # months left with nothing tagged
+    db_session.execute(
+        delete(total).where(
+            total.account_id.in_({account_id for account_id, _, _ in changes}),
+            total.transaction_count == 0,
+        )
+    )
+
+
+def tag_monthly_totals_select(
+    account_ids: Optional[List[int]] = None,
+    tags: Optional[List[str]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> Select:
+    # reads the precomputed totals, summing the accounts together
+    total = db_models.TagMonthlyTotal
+    query = (
+        select(
+            db_models.Tag.name.label("tag"),
+            total.year_month,
+            func.sum(total.transaction_count).label("transaction_count"),
+            func.sum(total.total_pennies).label("total_pennies"),
+        )
+        .select_from(total)
+        .join(db_models.Tag, db_models.Tag.id == total.tag_id)
+    )
+    if account_ids is not None:
+        query = query.where(total.account_id.in_(account_ids))
+    if tags is not None:
+        query = query.where(db_models.Tag.name.in_(tags))
+    if start_date:
+        query = query.where(total.year_month >= start_date.strftime("%Y-%m"))
+    if end_date:
+        query = query.where(total.year_month <= end_date.strftime("%Y-%m"))
+    return query.group_by(db_models.Tag.name, total.year_month).order_by(
+        total.year_month, db_models.Tag.name
+    )
+
+
+def build_tag_monthly_totals(rows: Sequence[Row]) -> List[api_models.TagMonthlyTotal]:
+    return [
+        api_models.TagMonthlyTotal.model_construct(
+            tag=row.tag,
+            year_month=row.year_month,
+            transaction_count=int(row.transaction_count),
+            total=from_pennies(row.total_pennies),
+        )
+        for row in rows
+    ]
+
+
+def get_tag_monthly_totals(
+    db_session: Session,
+    account_ids: Optional[List[int]] = None,
+    tags: Optional[List[str]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> List[api_models.TagMonthlyTotal]:
+    rows = db_session.execute(
+        tag_monthly_totals_select(
+            account_ids=account_ids, tags=tags, start_date=start_date, end_date=end_date
+        )
+    ).all()
+    return build_tag_monthly_totals(rows)
+
+
+def parse_numeric(value: str) -> Optional[Decimal]:
+    # keep in step with the migration that backfilled data_series.numeric_value
+    value = value.strip().replace(",", "")
+    if NUMERIC_PATTERN.match(value) is None:
+        return None
+    return Decimal(value)
+
+
+def get_data_series_key_ids(db_session: Session, keys: Set[str]) -> Dict[str, int]:
+    key_ids: Dict[str, int] = dict(
+        db_session.execute(
+            select(db_models.DataSeriesKey.key, db_models.DataSeriesKey.id).where(
+                db_models.DataSeriesKey.key.in_(keys)
+            )
+        ).all()
+    )
+
+    new_keys = [db_models.DataSeriesKey(key=key) for key in keys - key_ids.keys()]
+    if new_keys:
+        db_session.add_all(new_keys)
+        db_session.flush()
+        key_ids.update({new_key.key: new_key.id for new_key in new_keys})
+
+    return key_ids
+
+
 def create_data_series(
     db_session: Session,
     values: List[api_models.DataSeriesCreate],
 ) -> api_models.AddDataSeriesResult:
-    new_data_series = [db_models.DataSeries(**value.model_dump()) for value in values]
-
+    # the last value wins when a key and date appear more than once in the same request
+    unique_values = {(value.key, value.date_time): value for value in values}
+    inserted = updated = 0
     try:
-        db_session.add_all(new_data_series)
+        key_ids = get_data_series_key_ids(db_session, {value.key for value in values})
+        now = db_models.utc_now()
+        rows = [
+            dict(
+                key_id=key_ids[value.key],
+                date_time=value.date_time,
+                value=value.value,
+                numeric_value=parse_numeric(value.value),
+                created_at=now,
+                updated_at=now,
+            )
+            for value in unique_values.values()
+        ]
+        for start in range(0, len(rows), DATA_SERIES_BATCH_SIZE):
+            stmt = upsert(db_session, db_models.DataSeries).values(
+                rows[start : start + DATA_SERIES_BATCH_SIZE]
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[db_models.DataSeries.key_id, db_models.DataSeries.date_time],
+                set_=dict(
+                    value=stmt.excluded.value,
+                    numeric_value=stmt.excluded.numeric_value,
+                    updated_at=stmt.excluded.updated_at,
+                ),
+                # rows holding the same value are left alone so updated_at stays put
+                where=db_models.DataSeries.value.is_distinct_from(stmt.excluded.value),
+            ).returning(db_models.DataSeries.created_at == db_models.DataSeries.updated_at)
+            # updates keep the original created_at, so only fresh inserts still match
+            was_inserted = db_session.execute(stmt).scalars().all()
+            inserted += sum(was_inserted)
+            updated += len(was_inserted) - sum(was_inserted)
+        if inserted or updated:
+            bump_data_versions(db_session, [DATA_SERIES_VERSION])
         db_session.commit()
     except Exception as ex:
         logger.error(f"Error adding data series: {ex}")
         db_session.rollback()
         raise
 
-    return api_models.AddDataSeriesResult(values_added=len(new_data_series))
+    return api_models.AddDataSeriesResult(
+        values_added=inserted,
+        values_updated=updated,
+        values_unchanged=len(rows) - inserted - updated,
+    )
 
 
-def get_data_series(
-    db_session: Session,
+def data_series_select(
     keys: Optional[List[str]] = None,
-    as_db_model: bool = False,
-) -> Union[List[api_models.DataSeries], List[db_models.DataSeries]]:
-    query = db_session.query(db_models.DataSeries)
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    latest: bool = False,
+) -> Select:
+    query = select(
+        db_models.DataSeries.id,
+        db_models.DataSeries.date_time,
+        db_models.DataSeriesKey.key,
+        db_models.DataSeries.value,
+    ).join(db_models.DataSeries.series_key)
 
     if keys:
-        query = query.filter(db_models.DataSeries.key.in_(keys))
+        query = query.where(db_models.DataSeriesKey.key.in_(keys))
+    if start_date:
+        query = query.where(db_models.DataSeries.date_time >= start_date)
+    if end_date:
+        query = query.where(db_models.DataSeries.date_time <= end_date)
+
+    if latest:
+        # one row per key, ranked along the unique key and date index backwards
+        ranked = query.add_columns(
+            func.row_number()
+            .over(
+                partition_by=db_models.DataSeries.key_id,
+                order_by=(db_models.DataSeries.date_time.desc(), db_models.DataSeries.id.desc()),
+            )
+            .label("rank")
+        ).subquery()
+        return (
+            select(ranked.c.id, ranked.c.date_time, ranked.c.key, ranked.c.value)
+            .where(ranked.c.rank == 1)
+            .order_by(ranked.c.key)
+        )
+    return query.order_by(db_models.DataSeries.date_time, db_models.DataSeries.id)
 
-    results = query.all()
 
-    if as_db_model:
-        return results
+def get_data_series(
+    db_session: Session,
+    keys: Optional[List[str]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    latest: bool = False,
+) -> List[api_models.DataSeries]:
+    results = db_session.execute(
+        data_series_select(keys=keys, start_date=start_date, end_date=end_date, latest=latest)
+    ).all()
 
     return [api_models.DataSeries.model_validate(result) for result in results]
 
 
-def get_account_backup(db_session: Session) -> api_models.BackupV1:
-    db_accounts = get_accounts(db_session=db_session, as_db_model=True)
-    api_rules = get_rules(db_session=db_session)
+def _data_series_period(period: api_models.DataSeriesPeriod, date_time: ColumnElement):
+    if period == api_models.DataSeriesPeriod.tax_year:
+        date_time = tax_year_date(date_time)
+    return func.cast(func.extract("year", date_time), Integer)
 
-    backup = api_models.BackupV1()
-
-    backup.data_series = [
-        api_models.DataSeriesCreate.model_validate(ds)
-        for ds in get_data_series(db_session=db_session, as_db_model=True)
-    ]
 
-    for db_account in db_accounts:
-        db_txs: List[db_models.Transaction] = get_transactions(
-            db_session=db_session, account_id=db_account.id, as_db_model=True
+def get_data_series_aggregates(
+    db_session: Session,
+    period: api_models.DataSeriesPeriod,
+    keys: Optional[List[str]] = None,
+) -> List[api_models.DataSeriesAggregate]:
+    period_col = _data_series_period(period, db_models.DataSeries.date_time)
+    ranked = select(
+        db_models.DataSeriesKey.key,
+        period_col.label("period"),
+        db_models.DataSeries.date_time,
+        db_models.DataSeries.value,
+        db_models.DataSeries.numeric_value,
+        func.row_number()
+        .over(
+            partition_by=(db_models.DataSeriesKey.key, period_col),
+            order_by=(db_models.DataSeries.date_time.desc(), db_models.DataSeries.id.desc()),
         )
+        .label("recency"),
+    ).join(db_models.DataSeries.series_key)
 
-        conditions: List[api_models.RuleCondition] = [
-            rule.condition for rule in api_rules if rule.account_id == db_account.id
-        ]
-
-        transactions: List[api_models.TransactionCreate] = [
-            api_models.TransactionCreate.model_validate(tx) for tx in db_txs
-        ]
-        # this will leave transactions with the account_id field set but we'll overwrite that on import
+    if keys:
+        ranked = ranked.where(db_models.DataSeriesKey.key.in_(keys))
 
-        backup.accounts.append(
-            api_models.AccountBackup(
-                account=api_models.AccountCreate.model_validate(db_account),
-                rule_conditions=conditions,
-                transactions=transactions,
-            )
+    ranked = ranked.subquery()
+    query = (
+        select(
+            ranked.c.key,
+            ranked.c.period,
+            func.count().label("count"),
+            func.sum(ranked.c.numeric_value, type_=SqlDecimal()).label("total"),
+            func.max(case((ranked.c.recency == 1, ranked.c.value))).label("latest_value"),
+            func.max(ranked.c.date_time).label("latest_date_time"),
         )
-    return backup
-
-
-def restore_account_backup(db_session: Session, backup: api_models.BackupV1):
-    # assume caller already checked db is empty
-
-    # could accept different versions here and upgrade, just handle v1 for now
-
-    create_data_series(db_session=db_session, values=backup.data_series)
-    accounts_to_create = [account_backup.account for account_backup in backup.accounts]
-    new_accounts = create_accounts(db_session=db_session, accounts=accounts_to_create)
-
-    for new_account, account_backup in zip(new_accounts, backup.accounts):
-        rules = [
-            api_models.TransactionRuleCreate(account_id=new_account.id, condition=val)
-            for val in account_backup.rule_conditions
-        ]
-        create_transaction_rules(db_session=db_session, rules=rules)
-
-        transactions_to_create = [
-            db_models.Transaction(
-                account_id=new_account.id, **transaction.model_dump(exclude={"account_id"})
-            )
-            for transaction in account_backup.transactions
-        ]
+        .group_by(ranked.c.key, ranked.c.period)
+        .order_by(ranked.c.key, ranked.c.period)
+    )
 
-        db_session.add_all(transactions_to_create)
-    db_session.commit()
+    return [
+        api_models.DataSeriesAggregate.model_validate(row._asdict())
+        for row in db_session.execute(query).all()
+    ]
@@ -1,25 +1,108 @@
+from datetime import datetime, timezone
+from decimal import Decimal
 from functools import partial
 
 from sqlalchemy import (
-    DECIMAL,
+    JSON,
+    BigInteger,
     Boolean,
     Column,
     DateTime,
     Enum,
     ForeignKey,
+    ForeignKeyConstraint,
+    Index,
     Integer,
+    Numeric,
+    PrimaryKeyConstraint,
     String,
     UniqueConstraint,
+    cast,
+    event,
+    literal_column,
+    text,
 )
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql.functions import FunctionElement
 
 from backend.api_models import AccountType, IngestType
+from backend.cpi import cpi_rows
 from backend.db import Base
+from backend.money import from_pennies, to_pennies
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class utcnow(FunctionElement):
+    # server side equivalent of utc_now for rows written outside the ORM (e.g. backup COPY)
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow, "postgresql")
+def _pg_utcnow(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
+@compiles(utcnow, "sqlite")
+def _sqlite_utcnow(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"  # already utc in sqlite
+
+
+# Tables partitioned in postgres carry the partition key in their primary key, but sqlite only
+# generates ids for a lone INTEGER PRIMARY KEY, so there they are keyed on the id alone.
+
+
+def _is_sqlite_rowid(column) -> bool:
+    return bool(column.table.kwargs.get("postgresql_partition_by")) and column.autoincrement is True
+
+
+@compiles(CreateColumn, "sqlite")
+def _sqlite_create_column(element, compiler, **kw):
+    column = element.element
+    if _is_sqlite_rowid(column):
+        return f"{compiler.preparer.format_column(column)} INTEGER NOT NULL PRIMARY KEY"
+    return compiler.visit_create_column(element, **kw)
+
+
+@compiles(PrimaryKeyConstraint, "sqlite")
+def _sqlite_primary_key(constraint, compiler, **kw):
+    if any(_is_sqlite_rowid(column) for column in constraint.columns):
+        return None  # declared on the id column instead
+    return compiler.visit_primary_key_constraint(constraint, **kw)
+
+
+@compiles(ForeignKeyConstraint, "sqlite")
+def _sqlite_foreign_key(constraint, compiler, **kw):
+    elements = [element for element in constraint.elements if _is_sqlite_rowid(element.column)]
+    if not elements:
+        return compiler.visit_foreign_key_constraint(constraint, **kw)
+    # referencing the id alone, the rest of the partitioned primary key isn't unique there
+    local, remote = elements[0].parent, elements[0].column
+    preparer = compiler.preparer
+    return (
+        f"FOREIGN KEY({preparer.format_column(local)}) REFERENCES "
+        f"{preparer.format_table(remote.table)} ({preparer.format_column(remote)})"
+        f"{compiler.define_constraint_cascades(constraint)}"
+    )
+
 
 ReqCol = partial(Column, nullable=False)
 OptCol = partial(Column, nullable=True)
 
+# Change tracking, used by incremental backups.  updated_at isn't indexed: an incremental export
+# filters each table in one sequential pass (~0.2s a million transactions), cheaper overall than
+# keeping an index up to date on every ingested row.
+CreatedCol = partial(ReqCol, DateTime, default=utc_now, server_default=utcnow())
+UpdatedCol = partial(ReqCol, DateTime, default=utc_now, onupdate=utc_now, server_default=utcnow())
+
 
 class Account(Base):
     __tablename__ = "accounts"
@@ -37,6 +120,9 @@ class Account(Base):
     ac_number = OptCol(String)
     external_link = OptCol(String)
 
+    created_at = CreatedCol()
+    updated_at = UpdatedCol()
+
     # relationships
     transactions = relationship("Transaction", back_populates="account")
     transaction_rules = relationship("TransactionRule", back_populates="account")
@@ -46,25 +132,89 @@ class Account(Base):
 
 
 class Transaction(Base):
+    # Range partitioned by year on date_time, so the partition key is part of the primary key.
+    # Partitions are created as rows arrive, see crud.ensure_transaction_partitions.
     __tablename__ = "transactions"
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
 
     # required fields
     account_id = ReqCol(Integer, ForeignKey("accounts.id"))
-    date_time = ReqCol(DateTime, index=True)
-    amount = ReqCol(DECIMAL(precision=10, scale=2))
+    date_time = ReqCol(DateTime, primary_key=True)
+    amount_pennies = ReqCol(BigInteger)  # see amount for the Decimal pounds
     is_value_adjustment = ReqCol(Boolean, default=False)
 
     # optional fields
-    transaction_type = OptCol(String, index=True)
-    description = OptCol(String, index=True)
+    transaction_type = OptCol(String)
+    description = OptCol(String)
     # fitid = OptCol(String, index=True, unique=True)
-    reference = OptCol(String, index=True)
-    notes = OptCol(String, index=True)
+    reference = OptCol(String)
+    notes = OptCol(String)
+
+    created_at = CreatedCol()
+    updated_at = UpdatedCol()
 
     # relationships
     account = relationship("Account", back_populates="transactions")
 
+    @hybrid_property
+    def amount(self) -> Decimal:
+        # the api's view of amount_pennies, in pounds
+        return from_pennies(self.amount_pennies)
+
+    @amount.inplace.setter
+    def _amount_setter(self, value: Decimal):
+        self.amount_pennies = to_pennies(value)
+
+    @amount.inplace.expression
+    @classmethod
+    def _amount_expression(cls):
+        return cast(cls.amount_pennies, Numeric) / 100
+
+    # Every hot query filters by account and date range, including amount_pennies and
+    # is_value_adjustment lets balances and monthly aggregates run as index only scans.  Keep
+    # indexes to those the queries use (see test_query_plans), each one slows bulk ingest.
+    __table_args__ = (
+        Index(
+            "ix_transactions_account_id_date_time",
+            "account_id",
+            "date_time",
+            postgresql_include=["amount_pennies", "is_value_adjustment"],
+        ),
+        {"postgresql_partition_by": "RANGE (date_time)"},
+    )
+
+
+# Full text search over the transaction's text, description weighted highest.  A generated tsvector
+# with a GIN index, postgres only so it stays out of the model (and backups), the migration adds
+# it and so does this for databases built with create_all.  Partitions inherit both.  Alembic's
+# env.py leaves both out of autogenerate and check.
+TRANSACTION_SEARCH_CONFIG = "english"
+TRANSACTION_SEARCH_VECTOR_SQL = " || ".join(
+    f"setweight(to_tsvector('{TRANSACTION_SEARCH_CONFIG}', coalesce({column}, '')), '{weight}')"
+    for column, weight in [
+        ("description", "A"),
+        ("transaction_type", "B"),
+        ("reference", "B"),
+        ("notes", "C"),
+    ]
+)
+transaction_search_vector = literal_column("transactions.search_vector", TSVECTOR)
+
+
+@event.listens_for(Transaction.__table__, "after_create")
+def _add_transaction_search_vector(target, connection, **kw):
+    if connection.dialect.name != "postgresql":
+        return
+    connection.execute(
+        text(
+            "ALTER TABLE transactions ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS ({TRANSACTION_SEARCH_VECTOR_SQL}) STORED"
+        )
+    )
+    connection.execute(
+        text("CREATE INDEX ix_transactions_search_vector ON transactions USING gin (search_vector)")
+    )
+
 
 class TransactionRule(Base):
     __tablename__ = "transaction_rule"
@@ -72,14 +222,75 @@ class TransactionRule(Base):
 
     # required fields
     account_id = ReqCol(Integer, ForeignKey("accounts.id"))
-    condition = ReqCol(JSONB)
+    condition = ReqCol(JSON().with_variant(JSONB(), "postgresql"))
+
+    created_at = CreatedCol()
+    updated_at = UpdatedCol()
 
     # relationships
     account = relationship("Account", back_populates="transaction_rules")
 
 
-# todo will need tags on transactions
-# might be helpful: https://www.databasesoup.com/2015/01/tag-all-things.html
+class Tag(Base):
+    __tablename__ = "tags"
+    id = Column(Integer, primary_key=True)
+
+    # required fields
+    name = ReqCol(String, unique=True)
+
+    created_at = CreatedCol()
+    updated_at = UpdatedCol()
+
+
+class TransactionTag(Base):
+    # The tags the tag rules give transactions, see crud.tag_transactions.  Derived from the rules,
+    # so not part of backups.  The account, date and amount are copied here for the monthly totals.
+    # Deleting transactions cascades to their tags, so anything deleting transactions that keeps
+    # the totals deletes the tags first, see crud.delete_transaction_tags.
+    __tablename__ = "transaction_tags"
+    transaction_id = Column(Integer, primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+
+    # required fields
+    account_id = ReqCol(Integer, ForeignKey("accounts.id", ondelete="CASCADE"))
+    date_time = ReqCol(DateTime)
+    amount_pennies = ReqCol(BigInteger)
+
+    __table_args__ = (
+        # the partition key is part of the transactions' primary key, see Transaction
+        ForeignKeyConstraint(
+            ["transaction_id", "date_time"],
+            ["transactions.id", "transactions.date_time"],
+            ondelete="CASCADE",
+        ),
+        Index("ix_transaction_tags_account_id_date_time", "account_id", "date_time"),
+    )
+
+
+class TagMonthlyTotal(Base):
+    # Sums of the tagged transactions per account, month and tag, updated along with their tags
+    # (see crud.add_to_tag_monthly_totals) so spending by tag reads these instead of grouping the
+    # transactions.  Derived, so not part of backups.
+    __tablename__ = "tag_monthly_totals"
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    year_month = Column(String, primary_key=True)  # 'YYYY-MM'
+    tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+
+    # required fields
+    transaction_count = ReqCol(Integer)
+    total_pennies = ReqCol(BigInteger)
+
+
+class DataSeriesKey(Base):
+    # key dictionary so data series rows don't repeat the key strings
+    __tablename__ = "data_series_keys"
+    id = Column(Integer, primary_key=True)
+
+    # required fields
+    key = ReqCol(String, unique=True)
+
+    created_at = CreatedCol()
+    updated_at = UpdatedCol()
 
 
 class DataSeries(Base):
@@ -88,5 +299,56 @@ class DataSeries(Base):
 
     # required fields
     date_time = ReqCol(DateTime, index=True)
-    key = ReqCol(String, index=True)
+    key_id = ReqCol(Integer, ForeignKey("data_series_keys.id"))
     value = ReqCol(String)
+
+    # optional fields
+    numeric_value = OptCol(Numeric)  # set when value holds a number, see crud.parse_numeric
+
+    created_at = CreatedCol()
+    updated_at = UpdatedCol()
+
+    # relationships
+    series_key = relationship("DataSeriesKey")
+    key = association_proxy("series_key", "key")
+
+    # one value per key and date, re-ingesting upserts; the index behind it serves key lookups,
+    # date ranges within a key and latest value per key
+    __table_args__ = (UniqueConstraint("key_id", "date_time", name="unique_data_series_key_date"),)
+
+
+class DeletedRecord(Base):
+    # tombstones for deleted rows so incremental backups can replay deletes
+    __tablename__ = "deleted_records"
+    id = Column(Integer, primary_key=True)
+
+    # required fields
+    table_name = ReqCol(String)
+    record_id = ReqCol(Integer)
+    deleted_at = ReqCol(DateTime, default=utc_now, server_default=utcnow(), index=True)
+
+
+class DataVersion(Base):
+    # changes with the data under its key, the read endpoints' ETags are built from these, see
+    # crud.bump_data_versions.  Derived, so not part of backups.
+    __tablename__ = "data_versions"
+    key = Column(String, primary_key=True)
+
+    # required fields
+    version = ReqCol(BigInteger)
+
+
+class Cpi(Base):
+    # reference data rather than user data, so not part of backups
+    __tablename__ = "cpi"
+    date_time = Column(DateTime, primary_key=True)  # first of the month
+
+    # required fields
+    annual_rate = ReqCol(Numeric)
+    price_index = ReqCol(Numeric)  # cumulative, see cpi.cpi_rows
+
+
+@event.listens_for(Cpi.__table__, "after_create")
+def _seed_cpi(target, connection, **kw):
+    # databases built with create_all rather than migrations still get cpi data
+    connection.execute(target.insert(), cpi_rows())
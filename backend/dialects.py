@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from sqlalchemy import DateTime, Float, Numeric, String, TypeDecorator
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+# SQL that differs between postgres and sqlite, compiled per dialect so the queries built from
+# these run on both.
+
+
+def is_postgres(db_session: Session) -> bool:
+    return db_session.get_bind().dialect.name == "postgresql"
+
+
+def upsert(db_session: Session, table):
+    # both dialects share the INSERT ... ON CONFLICT api, keyed by index_elements
+    return (pg_insert if is_postgres(db_session) else sqlite_insert)(table)
+
+
+class SqlDecimal(TypeDecorator):
+    # Numeric results, sqlite has no exact decimal type so its floats are read back through
+    # their shortest repr rather than padded out to ten places
+    impl = Numeric
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(Float())
+        return dialect.type_descriptor(Numeric())
+
+    def process_result_value(self, value, dialect):
+        if isinstance(value, float):
+            return Decimal(repr(value))
+        return value
+
+
+class year_month(FunctionElement):
+    # 'YYYY-MM' of a timestamp, for grouping by month
+    type = String()
+    inherit_cache = True
+
+
+@compiles(year_month, "postgresql")
+def _pg_year_month(element, compiler, **kw):
+    return f"TO_CHAR({compiler.process(element.clauses, **kw)}, 'YYYY-MM')"
+
+
+@compiles(year_month, "sqlite")
+def _sqlite_year_month(element, compiler, **kw):
+    return f"STRFTIME('%Y-%m', {compiler.process(element.clauses, **kw)})"
+
+
+class tax_year_date(FunctionElement):
+    # shifts back 3 months and 5 days, moving 6th April to 1st January so the year of the
+    # result is the uk tax year
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(tax_year_date, "postgresql")
+def _pg_tax_year_date(element, compiler, **kw):
+    return f"({compiler.process(element.clauses, **kw)} - INTERVAL '3 months 5 days')"
+
+
+@compiles(tax_year_date, "sqlite")
+def _sqlite_tax_year_date(element, compiler, **kw):
+    return f"DATETIME({compiler.process(element.clauses, **kw)}, '-3 months', '-5 days')"
@@ -9,13 +9,13 @@ from tempfile import SpooledTemporaryFile
 from typing import Any, Dict, Iterable, List, Optional, Set
 
 from fastapi import HTTPException, status
-from ofxtools.Parser import OFXTree
 from sqlalchemy import delete, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from backend import api_models, db_models
+from backend import api_models, crud, db_models
 from backend.api_models import IngestType
+from backend.metrics import INGEST_ROWS, INGEST_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -55,21 +55,39 @@ class FileIngester(ABC):
         result.end_date = max(self.transactions, key=lambda tx: tx.date_time).date_time
         result.transactions_deleted = self.delete_transactions(result.start_date, result.end_date)
         result.transactions_inserted = len(self.transactions)
+        crud.ensure_transaction_partitions(
+            self.db_session, {transaction.date_time.year for transaction in self.transactions}
+        )
         self.db_session.bulk_save_objects(self.transactions)
+        crud.bump_data_versions(self.db_session, crud.transactions_version_keys([self.account_id]))
         self.db_session.commit()
         return result
 
     def delete_transactions(self, start_date: datetime, end_date: datetime) -> int:
-        stmt = delete(db_models.Transaction).where(
-            db_models.Transaction.date_time.between(start_date, end_date)
-            & (db_models.Transaction.account_id == self.account_id)
+        # the tags first, deleting the transactions would cascade to them uncounted
+        crud.delete_transaction_tags(self.db_session, self.account_id, start_date, end_date)
+        stmt = (
+            delete(db_models.Transaction)
+            .where(
+                db_models.Transaction.date_time.between(start_date, end_date)
+                & (db_models.Transaction.account_id == self.account_id)
+            )
+            .returning(db_models.Transaction.id)
         )
-        result = self.db_session.execute(stmt)
-        return result.rowcount
+        deleted_ids = self.db_session.execute(stmt).scalars().all()
+        crud.record_deletions(
+            db_session=self.db_session,
+            table_name=db_models.Transaction.__tablename__,
+            record_ids=deleted_ids,
+        )
+        return len(deleted_ids)
 
 
 class OFXFileIngester(FileIngester):
     def ingest(self, file: SpooledTemporaryFile) -> api_models.IngestResult:
+        # slow to import, most processes never parse ofx
+        from ofxtools.Parser import OFXTree
+
         parser = OFXTree()
 
         with warnings.catch_warnings():
@@ -244,4 +262,7 @@ def ingest_file(
                 detail=f"Ingest type {ingest_type} not supported!",
             )
 
-    return ingest_class(account_id=account_id, db_session=db_session).ingest(file=file)
+    with INGEST_SECONDS.time(ingest_type=ingest_type.value):
+        result = ingest_class(account_id=account_id, db_session=db_session).ingest(file=file)
+    INGEST_ROWS.inc(result.transactions_inserted, ingest_type=ingest_type.value)
+    return result
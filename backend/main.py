@@ -1,6 +1,10 @@
+import json
 import logging
 import os
+import sys
+import time
 import traceback
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
@@ -8,8 +12,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from sqlalchemy.exc import SQLAlchemyError
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend import IMPORT_STARTED
+from backend.compression import COMPRESSION_ENCODINGS, CompressionMiddleware
+from backend.db import Base, dispose_engines, get_engine, init_engines
+from backend.metrics import STARTUP_SECONDS, metrics_endpoint
+from backend.profiling import ProfilingMiddleware, profile_endpoint
+from backend.request_metrics import RequestMetricsMiddleware
 from backend.rest_api import get_api_router
 from backend.rest_api.metadata import API_VERSION
 
@@ -22,6 +32,35 @@ logging.getLogger("ofxtools").setLevel(logging.ERROR)
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # cold start is the backend's imports plus creating the engines, reported to track it
+    startup = dict(imports_seconds=time.perf_counter() - IMPORT_STARTED)
+    start = time.perf_counter()
+    init_engines()
+    engine = get_engine()
+    if engine.dialect.name == "sqlite":
+        # the alembic migrations are postgres only, a sqlite database gets the current schema
+        Base.metadata.create_all(bind=engine)
+    startup["engines_seconds"] = time.perf_counter() - start
+
+    for phase, seconds in startup.items():
+        STARTUP_SECONDS.set(seconds, phase=phase.removesuffix("_seconds"))
+    logger.info(
+        "startup "
+        + json.dumps(
+            dict(
+                **{name: round(seconds, 3) for name, seconds in startup.items()},
+                modules=len(sys.modules),
+            )
+        )
+    )
+
+    yield
+
+    await dispose_engines()
+
+
 def _configure_app() -> FastAPI:
     version = f"v{API_VERSION}"
 
@@ -42,11 +81,19 @@ def _configure_app() -> FastAPI:
             "name": "Metadata",
             "description": "",
         },
+        {
+            "name": "Tags",
+            "description": "",
+        },
+        {
+            "name": "Transactions",
+            "description": "",
+        },
     ]
 
     app = FastAPI(
         docs_url="/documentation",
-        # lifespan=lifespan,
+        lifespan=lifespan,
         version=version,
         title="Finances",
         summary="Home Finances Application.",
@@ -59,6 +106,8 @@ def _configure_app() -> FastAPI:
     )
 
     app.include_router(get_api_router())
+    app.add_api_route("/metrics", metrics_endpoint, include_in_schema=False)
+    app.add_api_route("/profiles/{profile_id}", profile_endpoint, include_in_schema=False)
 
     logger.info(f"CORS: {ALLOWED_ORIGINS=}")
     app.add_middleware(
@@ -67,25 +116,49 @@ def _configure_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],  # Allow all methods
         allow_headers=["*"],  # Allow all headers
+        expose_headers=["X-Next-Cursor", "X-Total-Count"],  # transaction paging
     )
 
+    logger.info(f"Compression: {COMPRESSION_ENCODINGS=}")
+    app.add_middleware(CompressionMiddleware)
     app.add_middleware(LoggingMiddleware)
+    app.add_middleware(RequestMetricsMiddleware)
+    app.add_middleware(ProfilingMiddleware)
 
     return app
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+class LoggingMiddleware:
+    # logs unhandled errors with the request and, if nothing has been sent yet, answers with a 500
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_tracking_start(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
         try:
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send_tracking_start)
         except Exception as exc:
+            request = Request(scope)
             logger.error(f"Unhandled error: {exc}")
             logger.error(f"Request URL: {request.url}")
             logger.error(f"Request method: {request.method}")
             logger.error(f"Request headers: {request.headers}")
             logger.error(f"Stack trace: {traceback.format_exc()}")
-            raise
+            if response_started:
+                raise
+            response = JSONResponse(content={"detail": str(exc)}, status_code=500)
+            await response(scope, receive, send)
 
 
 app = _configure_app()
@@ -126,13 +199,3 @@ async def sqlalchemy_exception_handler(request: Request, exc: SQLAlchemyError):
             "detail": f"An internal server error occurred.  SQLAlchemyError - {exc.__class__.__name__}"
         },
     )
-
-
-@app.middleware("http")
-async def add_cors_headers(request: Request, call_next):
-    try:
-        response = await call_next(request)
-    except Exception as e:
-        response = JSONResponse(content={"detail": str(e)}, status_code=500)
-
-    return response
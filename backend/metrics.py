@@ -0,0 +1,229 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import Engine, event
+from sqlalchemy.engine.interfaces import CacheStats
+
+from backend.db import engines_initialised, get_async_engine, get_engine, get_pool_stats
+
+# In-process metrics served at /metrics in the prometheus text format, for prometheus to scrape
+# directly.  Values are per process, each worker reports its own.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List["Metric"] = []
+        self.collectors: List[Callable[[], None]] = []  # refresh metrics just before rendering
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, object] = {}
+        REGISTRY.metrics.append(self)
+
+    def _label_values(self, labels: Dict[str, object]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, label_values)} {_format_value(value)}"
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels):
+        # for totals counted elsewhere, e.g. the pool wait stats
+        with self._lock:
+            self._values[self._label_values(labels)] = value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._label_values(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        bucket_labelnames = self.labelnames + ("le",)
+        for label_values, (counts, total) in sorted(values.items()):
+            for upper_bound, count in zip(self.buckets, counts):
+                bucket_labels = _format_labels(
+                    bucket_labelnames, label_values + (_format_value(upper_bound),)
+                )
+                yield f"{self.name}_bucket{bucket_labels} {count}"
+            labels = _format_labels(self.labelnames, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {counts[-1]}"
+
+
+# api
+STARTUP_SECONDS = Gauge(
+    "startup_seconds", "Time the process took to start, by phase: imports and engines.", ["phase"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to serve a request, by route template.",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being served.")
+
+# pipelines
+INGEST_SECONDS = Histogram(
+    "ingest_duration_seconds",
+    "Time to ingest a file, rows per second is ingest_rows_total over this sum.",
+    ["ingest_type"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+INGEST_ROWS = Counter("ingest_rows_total", "Transactions inserted by ingests.", ["ingest_type"])
+RULE_EVALUATION_SECONDS = Histogram(
+    "rule_evaluation_seconds",
+    "Time to apply a transaction rule to its account's transactions.",
+    ["condition_type"],
+)
+INTERPOLATION_SECONDS = Histogram(
+    "balance_interpolation_seconds",
+    "Time to extend and gap fill an account's monthly balances.",
+    ["account_id"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+# caches, the hit ratio is hits over hits and misses
+SQL_COMPILED_CACHE = Counter(
+    "sqlalchemy_compiled_cache_total",
+    "Statement executions by whether their compiled SQL came from the cache.",
+    ["result"],
+)
+
+# connection pools, refreshed on each scrape
+DB_POOL_SIZE = Gauge("db_pool_size", "Configured pool size.", ["engine"])
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections in use.", ["engine"])
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond the pool size.", ["engine"])
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connection checkouts.", ["engine"])
+DB_POOL_WAIT_SECONDS = Counter(
+    "db_pool_wait_seconds_total", "Time spent waiting to check out a connection.", ["engine"]
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total", "Checkouts that timed out waiting for a connection.", ["engine"]
+)
+
+
+def _collect_pool_metrics():
+    if not engines_initialised():
+        return
+    for name, pool in (("sync", get_engine().pool), ("async", get_async_engine().pool)):
+        stats = get_pool_stats(pool)
+        DB_POOL_SIZE.set(stats.size or 0, engine=name)
+        DB_POOL_CHECKED_OUT.set(stats.checked_out or 0, engine=name)
+        DB_POOL_OVERFLOW.set(stats.overflow or 0, engine=name)
+        DB_POOL_CHECKOUTS.set_total(stats.checkouts, engine=name)
+        DB_POOL_WAIT_SECONDS.set_total(stats.wait_seconds_total, engine=name)
+        DB_POOL_TIMEOUTS.set_total(stats.timeouts, engine=name)
+
+
+REGISTRY.collectors.append(_collect_pool_metrics)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_compiled_cache(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    if context.cache_hit is CacheStats.CACHE_HIT:
+        SQL_COMPILED_CACHE.inc(result="hit")
+    elif context.cache_hit is CacheStats.CACHE_MISS:
+        SQL_COMPILED_CACHE.inc(result="miss")
+
+
+def metrics_endpoint() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
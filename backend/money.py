@@ -0,0 +1,20 @@
+import math
+from decimal import ROUND_HALF_UP, Decimal
+
+# Money is held internally as integer pennies, in the database and through aggregation and
+# interpolation, and only becomes a Decimal of pounds at the api boundary.
+
+
+def to_pennies(amount: Decimal) -> int:
+    # rounds half up like the DECIMAL(10,2) column this replaced
+    return int(Decimal(amount).scaleb(2).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_pennies(pennies: int) -> Decimal:
+    # exactly two decimal places, e.g. 1234 -> Decimal("12.34")
+    return Decimal(int(pennies)).scaleb(-2)
+
+
+def round_pennies(value: float) -> int:
+    # half away from zero, matching ROUND_HALF_UP on Decimals
+    return int(math.copysign(math.floor(abs(value) + 0.5), value))
@@ -0,0 +1,158 @@
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional, Set
+
+from fastapi import HTTPException, status
+from fastapi.responses import PlainTextResponse
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Opt-in sampling profiler for single requests.  With PROFILING_ENABLED set, a request sent with
+# an "X-Profile: 1" header or a "profile=1" query parameter is sampled every PROFILE_INTERVAL_MS
+# and its stacks are kept in memory in the folded format flamegraph.pl, inferno and speedscope
+# read.  The response's X-Profile-Id header gives the id to fetch it from /profiles/{id}.
+#
+# The event loop thread is sampled along with any threadpool thread running the handler, so for
+# async endpoints concurrent requests on the loop show up in the profile too, as does the loop
+# waiting on the database in select.
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_INTERVAL_SECONDS = int(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILES_PER_MINUTE = int(os.getenv("PROFILES_PER_MINUTE", "6"))
+PROFILES_KEPT = int(os.getenv("PROFILES_KEPT", "20"))
+
+PROFILE_HEADER = b"x-profile"
+
+
+class Profile:
+    def __init__(self, interval: float):
+        self.id = uuid.uuid4().hex
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.thread_ids: Set[int] = set()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+
+    def start(self):
+        self.thread_ids.add(threading.get_ident())
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self.thread_ids):
+                if frame := frames.get(thread_id):
+                    self.stacks[_fold(frame)] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _fold(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class RateLimiter:
+    def __init__(self, limit: int, window_seconds: float = 60):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self._times: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            while self._times and now - self._times[0] >= self.window_seconds:
+                self._times.popleft()
+            if len(self._times) >= self.limit:
+                return False
+            self._times.append(now)
+            return True
+
+
+_rate_limiter = RateLimiter(PROFILES_PER_MINUTE)
+_profiles: Dict[str, Profile] = OrderedDict()
+_profiles_lock = threading.Lock()
+_active_profile: ContextVar[Optional[Profile]] = ContextVar("active_profile", default=None)
+
+
+def _store(profile: Profile):
+    with _profiles_lock:
+        _profiles[profile.id] = profile
+        while len(_profiles) > PROFILES_KEPT:
+            _profiles.popitem(last=False)
+
+
+def add_current_thread() -> Optional[Profile]:
+    # for handlers running in the threadpool, remove_thread when they return
+    if profile := _active_profile.get():
+        profile.thread_ids.add(threading.get_ident())
+    return profile
+
+
+def remove_thread(profile: Optional[Profile]):
+    if profile is not None:
+        profile.thread_ids.discard(threading.get_ident())
+
+
+def _profile_requested(scope: Scope) -> bool:
+    if dict(scope["headers"]).get(PROFILE_HEADER) == b"1":
+        return True
+    return b"profile=1" in scope.get("query_string", b"").split(b"&")
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if not (PROFILING_ENABLED and scope["type"] == "http" and _profile_requested(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        if not _rate_limiter.allow():
+            logger.warning(f"Not profiling {scope['path']}, over {PROFILES_PER_MINUTE}/minute")
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(PROFILE_INTERVAL_SECONDS)
+
+        async def send_with_profile_id(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", profile.id)
+            await send(message)
+
+        token = _active_profile.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.stop()
+            _active_profile.reset(token)
+            _store(profile)
+            logger.info(f"Profiled {scope['path']}: {profile.id=}")
+
+
+def profile_endpoint(profile_id: str) -> PlainTextResponse:
+    with _profiles_lock:
+        profile = _profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found.")
+    return PlainTextResponse(profile.folded())
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Callable, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import Engine, event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT
+from backend.profiling import add_current_thread, remove_thread
+
+logger = logging.getLogger(__name__)
+
+# Request scoped timings: every query a request runs is timed by the sqlalchemy events below,
+# and RequestMetricsMiddleware reports the totals in a Server-Timing header and a log line.  The
+# metrics live in a context variable, which threadpool endpoints and asyncio.gather tasks inherit,
+# so they all add to the same request's totals.
+
+
+@dataclass
+class RequestMetrics:
+    start: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    db_seconds: float = 0.0  # summed, so concurrent queries can add up to more than the request
+    rows: int = 0  # returned or affected, where the driver reports it (sqlite doesn't for selects)
+    handler_end: Optional[float] = None
+    serialize_seconds: float = 0.0
+    total_seconds: float = 0.0
+
+    def record_query(self, seconds: float, rowcount: int):
+        self.queries += 1
+        self.db_seconds += seconds
+        self.rows += max(rowcount, 0)
+
+    def response_started(self):
+        # the handler has returned, the rest up to now is response validation and serialization
+        now = time.perf_counter()
+        if self.handler_end is not None:
+            self.serialize_seconds = now - self.handler_end
+        self.total_seconds = now - self.start
+
+    @property
+    def python_seconds(self) -> float:
+        return max(self.total_seconds - self.db_seconds - self.serialize_seconds, 0.0)
+
+    def server_timing(self) -> str:
+        return ", ".join(
+            [
+                f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"',
+                f"python;dur={self.python_seconds * 1000:.1f}",
+                f"serialize;dur={self.serialize_seconds * 1000:.1f}",
+                f"total;dur={self.total_seconds * 1000:.1f}",
+            ]
+        )
+
+    def as_dict(self) -> dict:
+        return dict(
+            queries=self.queries,
+            rows=self.rows,
+            db_ms=round(self.db_seconds * 1000, 1),
+            python_ms=round(self.python_seconds * 1000, 1),
+            serialize_ms=round(self.serialize_seconds * 1000, 1),
+            total_ms=round(self.total_seconds * 1000, 1),
+        )
+
+
+_request_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+def get_request_metrics() -> Optional[RequestMetrics]:
+    return _request_metrics.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_start"].pop()
+    if metrics := _request_metrics.get():
+        metrics.record_query(seconds, cursor.rowcount)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # failed statements never reach after_cursor_execute
+    if exception_context.connection is not None:
+        query_starts = exception_context.connection.info.get("query_start")
+        if query_starts:
+            query_starts.pop()
+
+
+class TimedRoute(APIRoute):
+    # marks when the endpoint returns, separating its time from response serialization
+    def get_route_handler(self) -> Callable:
+        call = self.dependant.call
+        if asyncio.iscoroutinefunction(call):
+
+            @wraps(call)
+            async def timed_call(*args, **kwargs):
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    mark_handler_end()
+
+        else:
+
+            @wraps(call)
+            def timed_call(*args, **kwargs):
+                # runs in the threadpool, which a profile has to sample as well as the loop
+                profile = add_current_thread()
+                try:
+                    return call(*args, **kwargs)
+                finally:
+                    remove_thread(profile)
+                    mark_handler_end()
+
+        self.dependant.call = timed_call
+        return super().get_route_handler()
+
+
+def mark_handler_end():
+    # the first call wins, so handlers serializing their own response can mark where that starts
+    metrics = _request_metrics.get()
+    if metrics is not None and metrics.handler_end is None:
+        metrics.handler_end = time.perf_counter()
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics()
+        token = _request_metrics.set(metrics)
+        status_code = None
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+
+        async def send_with_metrics(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                metrics.response_started()
+                MutableHeaders(scope=message).append("Server-Timing", metrics.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            _request_metrics.reset(token)
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # labelled by route template so ids in paths don't each get their own series
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - metrics.start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status_code or 500,
+            )
+            logger.info(
+                "request "
+                + json.dumps(
+                    dict(
+                        method=scope["method"],
+                        path=scope["path"],
+                        status=status_code,
+                        **metrics.as_dict(),
+                    )
+                )
+            )
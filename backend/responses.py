@@ -0,0 +1,88 @@
+import hashlib
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+
+from backend.request_metrics import mark_handler_end
+
+# Clients keep responses but revalidate them every time, a request sent with the ETag of what
+# it has gets a 304 without the response being built while the data is unchanged.
+CACHE_CONTROL = "private, no-cache"
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+@lru_cache
+def _type_adapter(response_type: Any) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+
+def trusted_json_response(
+    content: Any, response_type: Any, headers: Optional[Dict[str, str]] = None
+) -> Response:
+    # For responses built from our own data: returning a Response skips FastAPI validating the
+    # content against the route's response_model (which stays for the docs) and its jsonable
+    # encoding, instead pydantic's serializer writes the JSON straight to bytes.  The output is
+    # the same, Decimals as strings and datetimes in ISO format.
+    mark_handler_end()  # what follows is serialization
+    return Response(
+        _type_adapter(response_type).dump_json(content),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(batches: AsyncIterator[List[Any]], item_type: Any) -> StreamingResponse:
+    # one JSON document a line, each batch written as it arrives so nothing holds the whole result
+    adapter = _type_adapter(item_type)
+
+    async def lines():
+        async for batch in batches:
+            yield b"".join(adapter.dump_json(item) + b"\n" for item in batch)
+
+    mark_handler_end()
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def data_etag(versions: Dict[str, int]) -> str:
+    # Weak, as compression changes the bytes but not the data.  The month is in there because
+    # balances are interpolated up to the current one, and the api version for format changes.
+    # here, the rest_api package imports this module
+    from backend.rest_api.metadata import API_VERSION
+
+    state = [API_VERSION, datetime.now().strftime("%Y-%m"), sorted(versions.items())]
+    return f'W/"{hashlib.blake2b(repr(state).encode(), digest_size=12).hexdigest()}"'
+
+
+def cache_headers(etag: str, vary: Optional[str] = None) -> Dict[str, str]:
+    # vary, for urls with more than one representation, goes on their 304s too
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if vary is not None:
+        headers["Vary"] = vary
+    return headers
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match compares weakly, ignoring the W/ prefixes
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in {
+        candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")
+    }
+
+
+def not_modified(request: Request, etag: str, vary: Optional[str] = None) -> Optional[Response]:
+    # the 304 to return if the client already has this version
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None or not etag_matches(if_none_match, etag):
+        return None
+    mark_handler_end()
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag, vary))
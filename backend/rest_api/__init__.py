@@ -6,6 +6,8 @@ from backend.rest_api.accounts import router as _accounts_router
 from backend.rest_api.balance import router as _balance_router
 from backend.rest_api.data_series import router as _data_series_router
 from backend.rest_api.metadata import router as _metadata_router
+from backend.rest_api.tags import router as _tags_router
+from backend.rest_api.transactions import router as _transactions_router
 
 
 def get_api_router():
@@ -14,5 +16,7 @@ def get_api_router():
     api_router.include_router(_balance_router)
     api_router.include_router(_data_series_router)
     api_router.include_router(_metadata_router)
+    api_router.include_router(_tags_router)
+    api_router.include_router(_transactions_router)
 
     return api_router
@@ -1,11 +1,14 @@
+import asyncio
+import base64
 import json
 import logging
 import zipfile
+from contextlib import ExitStack
 from datetime import datetime
 from decimal import Decimal
 from pathlib import Path as PathLibPath
-from tempfile import TemporaryDirectory, mkstemp
-from typing import Dict, List, Optional, Union
+from tempfile import mkstemp
+from typing import Dict, List, Optional, Tuple, Union
 
 from dateutil import parser
 from fastapi import (
@@ -16,20 +19,31 @@ from fastapi import (
     HTTPException,
     Path,
     Query,
+    Request,
     UploadFile,
     status,
 )
 from fastapi.responses import FileResponse
-from pydantic import ValidationError
-from pydantic.json import pydantic_encoder
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import Session
 
-from backend import api_models, crud, db_models
-from backend.db import get_db_session
-from backend.ingest import ingest_file
+from backend import api_models, async_crud, crud, db_models
+from backend.db import get_async_db_session, get_async_session_factory, get_db_session
+from backend.request_metrics import TimedRoute
+from backend.responses import (
+    NDJSON_MEDIA_TYPE,
+    cache_headers,
+    data_etag,
+    ndjson_response,
+    not_modified,
+    trusted_json_response,
+    wants_ndjson,
+)
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/accounts", tags=["Accounts"])
+router = APIRouter(prefix="/accounts", tags=["Accounts"], route_class=TimedRoute)
+
+TRANSACTIONS_PAGE_LIMIT = 10000
 
 
 def parse_date(date_str: Optional[str] = None) -> Optional[datetime]:
@@ -56,6 +70,32 @@ def end_date_parser(end_date: Optional[str] = None) -> Optional[datetime]:
     return parse_date(end_date)
 
 
+def since_parser(since: Optional[str] = None) -> Optional[datetime]:
+    return parse_date(since)
+
+
+def encode_cursor(transaction: api_models.Transaction) -> str:
+    # opaque to clients, the (date_time, id) of the last transaction on a page
+    key = [transaction.date_time.isoformat(), transaction.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def cursor_parser(
+    cursor: Optional[str] = Query(
+        None, description="The X-Next-Cursor header of the previous page, for the next one."
+    )
+) -> Optional[Tuple[datetime, int]]:
+    if cursor is None:
+        return None
+    try:
+        date_time_str, transaction_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(date_time_str), int(transaction_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid cursor {cursor}"
+        )
+
+
 def get_account_from_path(
     account_id: int = Path(...), db_session: Session = Depends(get_db_session)
 ) -> db_models.Account:
@@ -72,29 +112,50 @@ def get_account_from_path(
 
 # @router.get("", include_in_schema=False)
 @router.get("/", summary="List all Accounts", response_model=list[api_models.Account])
-def api_get_accounts(
+async def api_get_accounts(
     institution: Optional[str] = None,
     name: Optional[str] = None,
-    db_session: Session = Depends(get_db_session),
+    db_session: AsyncSession = Depends(get_async_db_session),
 ):
-    return crud.get_accounts(db_session=db_session, institution=institution, name=name)
+    return await async_crud.get_accounts(db_session=db_session, institution=institution, name=name)
 
 
 @router.get(
     "/summary/",
     summary="Get a summary of all account data",
+    description="Pass real_terms (a year) for balances and deposits in that year's prices.",
     response_model=List[api_models.AccountSummary],
 )
-def api_get_accounts_summary(
-    interpolate: bool = True, db_session: Session = Depends(get_db_session)
+async def api_get_accounts_summary(
+    request: Request,
+    interpolate: bool = True,
+    real_terms: Optional[int] = None,
+    session_factory: async_sessionmaker = Depends(get_async_session_factory),
 ):
-    logger.info(f"Getting account summary, {interpolate=}")
-    accounts: List[api_models.Account] = crud.get_accounts(db_session=db_session)
-    monthly_balance_results: List[api_models.MonthlyBalanceResult] = crud.get_monthly_balances(
-        db_session=db_session, interpolate=interpolate
+    logger.info(f"Getting account summary, {interpolate=}, {real_terms=}")
+
+    async def in_session(crud_function, **kwargs):
+        async with session_factory() as db_session:
+            return await crud_function(db_session=db_session, **kwargs)
+
+    etag = data_etag(
+        await in_session(
+            async_crud.get_data_versions,
+            keys=[crud.ACCOUNTS_VERSION],
+            prefixes=[crud.TRANSACTIONS_VERSION_PREFIX],
+        )
     )
-    last_transaction_dates: Dict[int, datetime] = crud.get_last_transaction_dates(
-        db_session=db_session
+    if (response := not_modified(request, etag)) is not None:
+        return response
+
+    # independent queries, each in its own session so they run concurrently
+    accounts: List[api_models.Account]
+    monthly_balance_results: List[api_models.MonthlyBalanceResult]
+    last_transaction_dates: Dict[int, datetime]
+    accounts, monthly_balance_results, last_transaction_dates = await asyncio.gather(
+        in_session(async_crud.get_accounts),
+        in_session(async_crud.get_monthly_balances, interpolate=interpolate, real_terms=real_terms),
+        in_session(async_crud.get_last_transaction_dates),
     )
 
     results = []
@@ -109,7 +170,7 @@ def api_get_accounts_summary(
         )
 
         results.append(
-            api_models.AccountSummary(
+            api_models.AccountSummary.model_construct(
                 account=account,
                 monthly_balances=monthly_balance_result,
                 last_transaction_date=last_transaction_dates.get(account.id, None),
@@ -125,46 +186,59 @@ def api_get_accounts_summary(
     not_assets = [
         val for val in results if val.account.account_type != api_models.AccountType.asset
     ]
-    return assets + not_assets
+    return trusted_json_response(
+        assets + not_assets, List[api_models.AccountSummary], headers=cache_headers(etag)
+    )
+
 
+@router.get(
+    "/export/",
+    summary="Get a backup of all accounts",
+    description="Pass since (e.g. the backup_datetime of the previous backup) for an incremental "
+    "backup holding only the changes made after it.",
+)
+def api_export(
+    background_tasks: BackgroundTasks,
+    since: Optional[datetime] = Depends(since_parser),
+    db_session: Session = Depends(get_db_session),
+):
+    # backups are rare, loaded when one is taken
+    from backend.backup import write_backup
 
-@router.get("/export/", summary="Get a backup of all accounts")
-def api_export(background_tasks: BackgroundTasks, db_session: Session = Depends(get_db_session)):
-    logger.info("Getting backup data")
-    backup_data = crud.get_account_backup(db_session=db_session)
-    logger.info("Saving backup data to zip")
-    backup_datetime_str = backup_data.backup_datetime.strftime("%Y_%m_%d_%H_%M_%S")
-    json_filename = f"backup_{backup_datetime_str}.json"
-    zip_filename = f"backup_{backup_datetime_str}.zip"
+    logger.info(f"Saving backup data to zip, {since=}")
     _, zip_file_path_str = mkstemp(suffix=".zip")
     zip_file_path = PathLibPath(zip_file_path_str)
 
     try:
-        backup_json = json.dumps(backup_data.model_dump(), default=pydantic_encoder, indent=2)
-        json_temp_path = zip_file_path.with_suffix(".json")
-
-        with json_temp_path.open("w") as f:
-            f.write(backup_json)
-
-        with zipfile.ZipFile(zip_file_path, "w") as zip_file:
-            zip_file.write(json_temp_path, arcname=json_filename)
+        with zipfile.ZipFile(zip_file_path, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+            backup = write_backup(db_session=db_session, zip_file=zip_file, since=since)
 
         background_tasks.add_task(zip_file_path.unlink)
-        background_tasks.add_task(json_temp_path.unlink)
 
+        backup_datetime_str = backup.backup_datetime.strftime("%Y_%m_%d_%H_%M_%S")
+        backup_kind = "" if since is None else "_incremental"
+        zip_filename = f"backup_{backup_datetime_str}{backup_kind}.zip"
         logger.info("Returning backup zip")
         return FileResponse(zip_file_path_str, filename=zip_filename, media_type="application/zip")
     except Exception as e:
         # In case of an error, remove any created files
         zip_file_path.unlink(missing_ok=True)
-        json_temp_path.unlink(missing_ok=True)
         raise e
 
 
-@router.post("/import/", summary="Import a previously exported backup zip file.")
+@router.post(
+    "/import/",
+    summary="Import a previously exported backup zip file.",
+    description="Optionally pass a chain of incremental backups taken after the full backup, "
+    "they are applied in order on top of it.",
+)
 async def import_backup(
-    db_session: Session = Depends(get_db_session), file: UploadFile = File(...)
+    db_session: Session = Depends(get_db_session),
+    file: UploadFile = File(...),
+    incremental_files: List[UploadFile] = File([]),
 ):
+    from backend.backup import restore_backups  # see api_export
+
     # todo check db empty?
     if len(crud.get_accounts(db_session=db_session)) != 0:
         raise HTTPException(
@@ -172,44 +246,26 @@ async def import_backup(
             detail="Database is not empty. Import cannot proceed.",
         )
 
-    logger.info("Extracting backup data from zip")
-    with TemporaryDirectory() as tmpdir:
-        tmpdir_path = PathLibPath(tmpdir)
-
-        try:
-            with zipfile.ZipFile(file.file) as zip_ref:
-                zip_file_list = zip_ref.namelist()
-                if len(zip_file_list) != 1 or not zip_file_list[0].endswith(".json"):
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="ZIP file must contain exactly one .json file.",
-                    )
-
-                # Extract the JSON file
-                zip_ref.extractall(tmpdir_path)
-        except zipfile.BadZipFile:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="The uploaded file is not a valid ZIP archive.",
+    try:
+        with ExitStack() as stack:
+            zip_file = stack.enter_context(zipfile.ZipFile(file.file))
+            incremental_zip_files = [
+                stack.enter_context(zipfile.ZipFile(incremental_file.file))
+                for incremental_file in incremental_files
+            ]
+            backups = restore_backups(
+                db_session=db_session,
+                zip_file=zip_file,
+                incremental_zip_files=incremental_zip_files,
             )
-
-        json_file_path = tmpdir_path / zip_file_list[0]
-
-        logger.info("Loading backup data from json")
-        try:
-            with open(json_file_path, "r") as json_file:
-                backup_data = json.load(json_file)
-                backup_model = api_models.BackupV1(**backup_data)
-        except (json.JSONDecodeError, ValidationError) as e:
-            raise HTTPException(status_code=400, detail=f"Error processing JSON file: {str(e)}")
-
-        logger.info(
-            f"Loading {len(backup_model.accounts)} accounts from {backup_model.backup_datetime} to DB"
+    except zipfile.BadZipFile:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The uploaded file is not a valid ZIP archive.",
         )
-        crud.restore_account_backup(db_session=db_session, backup=backup_model)
-        logger.info("Restore complete")
 
-        return status.HTTP_201_CREATED
+    logger.info(f"Restore of backups up to {backups[-1].backup_datetime} complete")
+    return status.HTTP_201_CREATED
 
 
 ### /{account_id}/ paths below here only ###
@@ -235,18 +291,75 @@ def api_create_account(
 @router.get(
     "/{account_id}/transactions/",
     summary="List all transactions for the account",
+    description="Pass limit for a page at a time, oldest first, and the X-Next-Cursor header of "
+    "a page as cursor for the next one.  There's no header on the last page.  Send Accept: "
+    f"{NDJSON_MEDIA_TYPE} to stream the transactions a line each instead.",
     response_model=List[api_models.Transaction],
 )
-def api_get_transactions(
+async def api_get_transactions(
+    request: Request,
     account_id: int,
     start_date: Optional[datetime] = Depends(start_date_parser),
     end_date: Optional[datetime] = Depends(end_date_parser),
-    db_session: Session = Depends(get_db_session),
+    cursor: Optional[Tuple[datetime, int]] = Depends(cursor_parser),
+    limit: Optional[int] = Query(None, ge=1, le=TRANSACTIONS_PAGE_LIMIT),
+    include_total: bool = Query(
+        False,
+        description="Send the number of transactions between the dates, all pages, in an "
+        "X-Total-Count header.",
+    ),
+    db_session: AsyncSession = Depends(get_async_db_session),
+    session_factory: async_sessionmaker = Depends(get_async_session_factory),
 ):
+    if wants_ndjson(request):
+
+        async def batches():
+            # its own session, the request's is closed before a streamed body is sent
+            async with session_factory() as stream_session:
+                async for batch in async_crud.stream_transactions(
+                    db_session=stream_session,
+                    account_id=account_id,
+                    start_date=start_date,
+                    end_date=end_date,
+                    after=cursor,
+                    limit=limit,
+                ):
+                    yield batch
+
+        return ndjson_response(batches(), api_models.Transaction)
+
+    etag = data_etag(
+        await async_crud.get_data_versions(
+            db_session=db_session, keys=crud.transactions_version_keys([account_id])
+        )
+    )
+    # the same url streams ndjson
+    if (response := not_modified(request, etag, vary="Accept")) is not None:
+        return response
+
     # logger.info(f"Getting transactions for account {account_id} from {start_date} to {end_date}")
-    return crud.get_transactions(
-        db_session=db_session, account_id=account_id, start_date=start_date, end_date=end_date
+    results = await async_crud.get_transactions(
+        db_session=db_session,
+        account_id=account_id,
+        start_date=start_date,
+        end_date=end_date,
+        after=cursor,
+        limit=None if limit is None else limit + 1,  # the extra one shows there's another page
     )
+    headers = cache_headers(etag, vary="Accept")
+    if limit is not None and len(results) > limit:
+        results = results[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(results[-1])
+    if include_total:
+        headers["X-Total-Count"] = str(
+            await async_crud.count_transactions(
+                db_session=db_session,
+                account_id=account_id,
+                start_date=start_date,
+                end_date=end_date,
+            )
+        )
+    return trusted_json_response(results, List[api_models.Transaction], headers=headers)
 
 
 @router.post(
@@ -260,6 +373,9 @@ def api_ingest_transactions(
     account: db_models.Account = Depends(get_account_from_path),
     db_session: Session = Depends(get_db_session),
 ):
+    # the ingesters pull in the parsers, loaded by the first upload
+    from backend.ingest import ingest_file
+
     if ingest_type is None:
         ingest_type = account.default_ingest_type
     result = ingest_file(
@@ -271,9 +387,14 @@ def api_ingest_transactions(
     logger.info(f"Ingest result: {result}")
 
     if result.transactions_inserted > 0:
-        # todo run rules only on new transactions
+        # the ingest replaced the transactions between its dates, so only those need the rules
         # todo can we make a trigger to make run rules happen? will this be a pain for tests?
-        crud.run_rules(db_session=db_session, account_ids=account.id)
+        crud.run_rules(
+            db_session=db_session,
+            account_ids=account.id,
+            start_date=result.start_date,
+            end_date=result.end_date,
+        )
     return result
 
 
@@ -282,17 +403,19 @@ def api_ingest_transactions(
     summary="Get the account balance, optionaly for a specified time frame",
     response_model=api_models.BalanceResult,
 )
-def api_get_account_balance(
+async def api_get_account_balance(
     account_id: int,  # todo could have a depends to check its a valid id or even make this the account object using a depends
     start_date: Optional[datetime] = Depends(start_date_parser),
     end_date: Optional[datetime] = Depends(end_date_parser),
-    db_session: Session = Depends(get_db_session),
+    db_session: AsyncSession = Depends(get_async_db_session),
 ):
-    return crud.get_balance(
-        db_session=db_session,
-        account_ids=[account_id],
-        start_date=start_date,
-        end_date=end_date,
+    return (
+        await async_crud.get_balance(
+            db_session=db_session,
+            account_ids=[account_id],
+            start_date=start_date,
+            end_date=end_date,
+        )
     )[
         0
     ]  # todo placeholder until we ensure account_id is valid
@@ -334,3 +457,71 @@ def api_set_balance(
         deposits_to_date=deposits_to_date,
         year_month=year_month,
     )
+
+
+@router.get(
+    "/{account_id}/transactions/monthly/",
+    summary="Get a month of transactions with the balance after each",
+    description="Pass year_month as YYYY-MM, the current month by default.  Also has the month's "
+    "start and end balances and deposits.",
+    response_model=api_models.MonthlyTransactions,
+)
+async def api_get_monthly_transactions(
+    request: Request,
+    account_id: int,
+    year_month: Optional[datetime] = Depends(year_month),
+    db_session: AsyncSession = Depends(get_async_db_session),
+):
+    if not await async_crud.get_account(account_id=account_id, db_session=db_session):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Account {account_id} not found"
+        )
+    etag = data_etag(
+        await async_crud.get_data_versions(
+            db_session=db_session, keys=crud.transactions_version_keys([account_id])
+        )
+    )
+    if (response := not_modified(request, etag)) is not None:
+        return response
+
+    result = await async_crud.get_monthly_transactions(
+        db_session=db_session,
+        account_id=account_id,
+        month_start=crud.round_date_to_month(year_month or datetime.now()),
+    )
+    return trusted_json_response(
+        result, api_models.MonthlyTransactions, headers=cache_headers(etag)
+    )
+
+
+@router.get(
+    "/{account_id}/rules/",
+    summary="List the account's transaction rules",
+    response_model=List[api_models.TransactionRule],
+)
+def api_get_rules(
+    account: db_models.Account = Depends(get_account_from_path),
+    db_session: Session = Depends(get_db_session),
+):
+    return crud.get_rules(db_session=db_session, account_ids=[account.id])
+
+
+@router.post(
+    "/{account_id}/rules/",
+    summary="Add a transaction rule to the account",
+    description="The rule runs on the account's transactions straight away, and on those added "
+    "later.  A tag_contains_any rule tags the transactions whose read_col contains any of its "
+    "values, see /api/tags/monthly/ for their monthly totals.",
+    response_model=api_models.TransactionRule,
+)
+def api_create_rule(
+    condition: Union[api_models.IsValueAdjContainsAny, api_models.TagContainsAny],
+    account: db_models.Account = Depends(get_account_from_path),
+    db_session: Session = Depends(get_db_session),
+):
+    rule = crud.create_transaction_rules(
+        db_session=db_session,
+        rules=api_models.TransactionRuleCreate(account_id=account.id, condition=condition),
+    )[0]
+    crud.run_rules(db_session=db_session, account_ids=account.id)
+    return rule
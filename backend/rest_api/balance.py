@@ -1,14 +1,21 @@
 import logging
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend import api_models, crud
-from backend.db import get_db_session
+from backend import api_models, async_crud, crud
+from backend.db import get_async_db_session
+from backend.request_metrics import TimedRoute
+from backend.responses import (
+    cache_headers,
+    data_etag,
+    not_modified,
+    trusted_json_response,
+)
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/balance", tags=["Balance"])
+router = APIRouter(prefix="/balance", tags=["Balance"], route_class=TimedRoute)
 
 
 def account_id_list_from_str(account_ids: Optional[str] = Query(None)) -> Optional[List[int]]:
@@ -20,13 +27,37 @@ def account_id_list_from_str(account_ids: Optional[str] = Query(None)) -> Option
 @router.get(
     "/monthly/",
     summary="Get the monthly account balance",
+    description="Pass real_terms (a year) for balances and deposits in that year's prices.",
     response_model=List[api_models.MonthlyBalanceResult],
 )
-def api_get_monthly_account_balance(
+async def api_get_monthly_account_balance(
+    request: Request,
     account_ids: Optional[List[int]] = Depends(account_id_list_from_str),
     interpolate: bool = True,
-    db_session: Session = Depends(get_db_session),
+    real_terms: Optional[int] = None,
+    db_session: AsyncSession = Depends(get_async_db_session),
 ):
-    return crud.get_monthly_balances(
-        db_session=db_session, account_ids=account_ids, interpolate=interpolate
+    if account_ids is None:
+        versions = await async_crud.get_data_versions(
+            db_session=db_session,
+            keys=[crud.ACCOUNTS_VERSION],
+            prefixes=[crud.TRANSACTIONS_VERSION_PREFIX],
+        )
+    else:
+        versions = await async_crud.get_data_versions(
+            db_session=db_session,
+            keys=[crud.ACCOUNTS_VERSION] + crud.transactions_version_keys(account_ids),
+        )
+    etag = data_etag(versions)
+    if (response := not_modified(request, etag)) is not None:
+        return response
+
+    results = await async_crud.get_monthly_balances(
+        db_session=db_session,
+        account_ids=account_ids,
+        interpolate=interpolate,
+        real_terms=real_terms,
+    )
+    return trusted_json_response(
+        results, List[api_models.MonthlyBalanceResult], headers=cache_headers(etag)
     )
@@ -1,14 +1,28 @@
 import logging
+from datetime import datetime
 from typing import List, Optional, Union
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from backend import api_models, crud
-from backend.db import get_db_session
+from backend import api_models, async_crud, crud
+from backend.db import get_async_db_session, get_db_session
+from backend.request_metrics import TimedRoute
+from backend.responses import (
+    cache_headers,
+    data_etag,
+    not_modified,
+    trusted_json_response,
+)
+from backend.rest_api.accounts import end_date_parser, parse_date, start_date_parser
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/dataseries", tags=["Data Series"])
+router = APIRouter(prefix="/dataseries", tags=["Data Series"], route_class=TimedRoute)
+
+
+def as_of_parser(as_of: Optional[str] = None) -> Optional[datetime]:
+    return parse_date(as_of)
 
 
 def keys_list_from_str(keys: Optional[str] = Query(None)) -> Optional[List[int]]:
@@ -22,12 +36,43 @@ def keys_list_from_str(keys: Optional[str] = Query(None)) -> Optional[List[int]]
     summary="Get a set of dated key-value pairs",
     response_model=List[api_models.DataSeries],
 )
-def api_get_data_seties(
+async def api_get_data_seties(
+    request: Request,
+    keys: Optional[List[str]] = Depends(keys_list_from_str),
+    start_date: Optional[datetime] = Depends(start_date_parser),
+    end_date: Optional[datetime] = Depends(end_date_parser),
+    latest: bool = Query(False, description="Only return the most recent value for each key."),
+    as_of: Optional[datetime] = Depends(as_of_parser),
+    db_session: AsyncSession = Depends(get_async_db_session),
+):
+    etag = data_etag(
+        await async_crud.get_data_versions(db_session=db_session, keys=[crud.DATA_SERIES_VERSION])
+    )
+    if (response := not_modified(request, etag)) is not None:
+        return response
+
+    if as_of is not None:
+        # the value in force at a date is the latest one on or before it
+        latest = True
+        end_date = min(end_date, as_of) if end_date else as_of
+
+    results = await async_crud.get_data_series(
+        db_session=db_session, keys=keys, start_date=start_date, end_date=end_date, latest=latest
+    )
+    return trusted_json_response(results, List[api_models.DataSeries], headers=cache_headers(etag))
+
+
+@router.get(
+    "/aggregate/",
+    summary="Get per key totals and latest values for each calendar or tax year",
+    response_model=List[api_models.DataSeriesAggregate],
+)
+def api_get_data_series_aggregates(
     keys: Optional[List[str]] = Depends(keys_list_from_str),
-    # could add date range filter here if needed in future
+    period: api_models.DataSeriesPeriod = api_models.DataSeriesPeriod.tax_year,
     db_session: Session = Depends(get_db_session),
 ):
-    return crud.get_data_series(db_session=db_session, keys=keys)
+    return crud.get_data_series_aggregates(db_session=db_session, period=period, keys=keys)
 
 
 @router.post(
@@ -1,11 +1,15 @@
 import logging
+from typing import Dict
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
 
-from backend import api_models
+from backend import api_models, crud
+from backend.db import get_async_engine, get_db_session, get_engine, get_pool_stats
+from backend.request_metrics import TimedRoute
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/metadata", tags=["Metadata"])
+router = APIRouter(prefix="/metadata", tags=["Metadata"], route_class=TimedRoute)
 
 API_VERSION = "1.6.0"
 
@@ -26,44 +30,22 @@ def api_get_ingest_types():
 @router.get(
     "/cpi/",
     summary="Get inflation rates (CPI)",
+    description="Annual rates by year, see real_terms on the balance endpoints for balances "
+    "already adjusted for inflation.",
 )
-def api_get_cpi():
-    # https://www.rateinflation.com/inflation-rate/uk-historical-inflation-rate/
+def api_get_cpi(db_session: Session = Depends(get_db_session)):
+    return crud.get_cpi_rates(db_session=db_session)
+
+
+@router.get(
+    "/pool/",
+    summary="Get database connection pool statistics",
+    description="Checked out and overflow connections and checkout wait times for the sync and "
+    "async engines, since the process started.",
+    response_model=Dict[str, api_models.PoolStats],
+)
+def api_get_pool_stats():
     return {
-        1989: 0.05216,
-        1990: 0.06999,
-        1991: 0.07519,
-        1992: 0.04232,
-        1993: 0.02533,
-        1994: 0.01994,
-        1995: 0.0263,
-        1996: 0.02425,
-        1997: 0.01825,
-        1998: 0.01557,
-        1999: 0.01329,
-        2000: 0.00796,
-        2001: 0.01234,
-        2002: 0.01259,
-        2003: 0.01362,
-        2004: 0.01344,
-        2005: 0.02057,
-        2006: 0.02329,
-        2007: 0.02323,
-        2008: 0.03602,
-        2009: 0.02165,
-        2010: 0.03298,
-        2011: 0.04464,
-        2012: 0.02828,
-        2013: 0.02565,
-        2014: 0.01461,
-        2015: 0.0004,
-        2016: 0.0066,
-        2017: 0.02683,
-        2018: 0.02478,
-        2019: 0.01791,
-        2020: 0.00851,
-        2021: 0.02588,
-        2022: 0.09067,
-        2023: 0.07303,
-        2024: 0.02530,
+        "sync": get_pool_stats(get_engine().pool),
+        "async": get_pool_stats(get_async_engine().pool),
     }
@@ -0,0 +1,76 @@
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend import api_models, async_crud, crud
+from backend.db import get_async_db_session
+from backend.request_metrics import TimedRoute
+from backend.responses import (
+    cache_headers,
+    data_etag,
+    not_modified,
+    trusted_json_response,
+)
+from backend.rest_api.accounts import end_date_parser, start_date_parser
+from backend.rest_api.balance import account_id_list_from_str
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/tags", tags=["Tags"], route_class=TimedRoute)
+
+
+def tag_list_from_str(tags: Optional[str] = Query(None)) -> Optional[List[str]]:
+    if tags is None:
+        return None
+    return tags.split(",")
+
+
+@router.get(
+    "/",
+    summary="List the tags the transaction rules give",
+    response_model=List[api_models.Tag],
+)
+async def api_get_tags(db_session: AsyncSession = Depends(get_async_db_session)):
+    return await async_crud.get_tags(db_session=db_session)
+
+
+@router.get(
+    "/monthly/",
+    summary="Get the monthly totals of tagged transactions",
+    description="The net total and number of each tag's transactions a month, over the accounts "
+    "in account_ids (all by default).  A transaction with more than one tag counts towards each.",
+    response_model=List[api_models.TagMonthlyTotal],
+)
+async def api_get_tag_monthly_totals(
+    request: Request,
+    account_ids: Optional[List[int]] = Depends(account_id_list_from_str),
+    tags: Optional[List[str]] = Depends(tag_list_from_str),
+    start_date: Optional[datetime] = Depends(start_date_parser),
+    end_date: Optional[datetime] = Depends(end_date_parser),
+    db_session: AsyncSession = Depends(get_async_db_session),
+):
+    # tags change along with the transactions' versions, see crud.run_rules
+    if account_ids is None:
+        versions = await async_crud.get_data_versions(
+            db_session=db_session, prefixes=[crud.TRANSACTIONS_VERSION_PREFIX]
+        )
+    else:
+        versions = await async_crud.get_data_versions(
+            db_session=db_session, keys=crud.transactions_version_keys(account_ids)
+        )
+    etag = data_etag(versions)
+    if (response := not_modified(request, etag)) is not None:
+        return response
+
+    results = await async_crud.get_tag_monthly_totals(
+        db_session=db_session,
+        account_ids=account_ids,
+        tags=tags,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    return trusted_json_response(
+        results, List[api_models.TagMonthlyTotal], headers=cache_headers(etag)
+    )
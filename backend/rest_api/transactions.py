@@ -0,0 +1,77 @@
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend import api_models, async_crud, crud
+from backend.db import get_async_db_session
+from backend.dialects import is_postgres
+from backend.request_metrics import TimedRoute
+from backend.responses import (
+    cache_headers,
+    data_etag,
+    not_modified,
+    trusted_json_response,
+)
+from backend.rest_api.accounts import end_date_parser, start_date_parser
+from backend.rest_api.balance import account_id_list_from_str
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/transactions", tags=["Transactions"], route_class=TimedRoute)
+
+
+@router.get(
+    "/search/",
+    summary="Search the transactions of all accounts",
+    description="Every word in q has to match, ignoring case and word endings. Use "
+    '"quoted words" for a phrase, word* for words starting with it and -word to leave out '
+    "transactions with it. Results are best match first, the snippet marks the matching "
+    "words with **.",
+    response_model=List[api_models.TransactionSearchResult],
+)
+async def api_search_transactions(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    account_ids: Optional[List[int]] = Depends(account_id_list_from_str),
+    start_date: Optional[datetime] = Depends(start_date_parser),
+    end_date: Optional[datetime] = Depends(end_date_parser),
+    limit: int = Query(50, ge=1, le=500),
+    db_session: AsyncSession = Depends(get_async_db_session),
+):
+    # the search vector and its index are postgres only
+    if not is_postgres(db_session):
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Search is only supported with a PostgreSQL database.",
+        )
+    tsquery = crud.build_tsquery(q)
+    if tsquery is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Search for at least one word."
+        )
+
+    if account_ids is None:
+        versions = await async_crud.get_data_versions(
+            db_session=db_session, prefixes=[crud.TRANSACTIONS_VERSION_PREFIX]
+        )
+    else:
+        versions = await async_crud.get_data_versions(
+            db_session=db_session, keys=crud.transactions_version_keys(account_ids)
+        )
+    etag = data_etag(versions)
+    if (response := not_modified(request, etag)) is not None:
+        return response
+
+    results = await async_crud.search_transactions(
+        db_session=db_session,
+        tsquery=tsquery,
+        account_ids=account_ids,
+        start_date=start_date,
+        end_date=end_date,
+        limit=limit,
+    )
+    return trusted_json_response(
+        results, List[api_models.TransactionSearchResult], headers=cache_headers(etag)
+    )
@@ -1,11 +1,14 @@
+import calendar
 import random
 from datetime import datetime, timedelta
 from decimal import Decimal
-from typing import List
+from typing import Dict, Iterator, List, Tuple
 
 from dateutil.relativedelta import relativedelta
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 
+from backend import crud
 from backend.api_models import (
     AccountCreate,
     AccountType,
@@ -17,6 +20,7 @@ from backend.api_models import (
     TransactionRuleCreate,
 )
 from backend.crud import two_dp
+from backend.money import round_pennies, to_pennies
 
 
 def random_date_month(dt):
@@ -42,6 +46,7 @@ class AccountSpec(BaseModel):
     contributions: Decimal | None = None
     monthly_withdrawals_max: Decimal | None = None
     monthly_withdrawals_min: Decimal | None = None
+    withdrawals_per_month: int | None = None  # random, 5 to 10, when not set
     growth_factor_max: Decimal | None = None
     growth_factor_min: Decimal | None = None
     value: Decimal | None = Decimal("0.00")
@@ -176,7 +181,7 @@ def create_tax_data_series():
     return results
 
 
-def create_sample_accounts():
+def create_sample_accounts(specs: List[AccountSpec] = ACCOUNT_SPECS):
     return [
         AccountCreate(
             institution=spec.institution,
@@ -185,13 +190,13 @@ def create_sample_accounts():
             default_ingest_type=spec.default_ingest_type,
             is_active=spec.is_active,
         )
-        for spec in ACCOUNT_SPECS
+        for spec in specs
     ]
 
 
-def create_sample_rules():
+def create_sample_rules(specs: List[AccountSpec] = ACCOUNT_SPECS):
     rules = []
-    for spec in ACCOUNT_SPECS:
+    for spec in specs:
         for condition in spec.conditions:
             rules.append(
                 TransactionRuleCreate(
@@ -210,8 +215,65 @@ def create_sample_transactions():
     return transactions
 
 
+class Dataset(BaseModel):
+    specs: List[AccountSpec]
+    accounts: List[AccountCreate]
+    rules: List[TransactionRuleCreate]
+    transactions: List[TransactionCreate]
+
+
+def create_dataset_specs(
+    num_accounts: int,
+    years: int,
+    transactions_per_month: int,
+    end_date: datetime | None = None,
+) -> List[AccountSpec]:
+    # ACCOUNT_SPECS repeated to num_accounts accounts with years of history up to end_date (now by
+    # default), the current accounts making transactions_per_month withdrawals
+    end_date = end_date or datetime.now()
+    start_date = (end_date - relativedelta(years=years)).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+    specs = []
+    for i in range(num_accounts):
+        template = ACCOUNT_SPECS[i % len(ACCOUNT_SPECS)]
+        specs.append(
+            template.model_copy(
+                update=dict(
+                    id=i + 1,
+                    name=f"{template.name} {i // len(ACCOUNT_SPECS) + 1}",
+                    start_date=start_date,
+                    end_date=end_date,
+                    withdrawals_per_month=transactions_per_month,
+                )
+            )
+        )
+    return specs
+
+
+def create_dataset(
+    num_accounts: int, years: int, transactions_per_month: int, seed: int = 42
+) -> Dataset:
+    random.seed(seed)
+    specs = create_dataset_specs(num_accounts, years, transactions_per_month)
+    saving_spec = next((spec for spec in specs if spec.account_type == AccountType.savings), None)
+    transactions: List[TransactionCreate] = []
+    for spec in specs:
+        create_sample_transactions_for_account(spec, transactions, saving_spec=saving_spec)
+
+    return Dataset(
+        specs=specs,
+        accounts=create_sample_accounts(specs),
+        rules=create_sample_rules(specs),
+        transactions=transactions,
+    )
+
+
 def create_sample_transactions_for_account(
-    spec: AccountSpec, transactions: List[TransactionCreate]
+    spec: AccountSpec,
+    transactions: List[TransactionCreate],
+    saving_spec: AccountSpec | None = SAVING_SPEC,
 ):
     dt = spec.start_date
 
@@ -224,7 +286,7 @@ def create_sample_transactions_for_account(
         else:
             create_growth_tx(spec, dt, transactions)
 
-        create_withdrawal_tx(spec, dt, transactions)
+        create_withdrawal_tx(spec, dt, transactions, saving_spec=saving_spec)
 
         # increase date by one month
         dt = dt + relativedelta(months=1)
@@ -345,14 +407,21 @@ def create_growth_tx(spec: AccountSpec, dt: datetime, transactions: List[Transac
     )
 
 
-def create_withdrawal_tx(spec: AccountSpec, dt: datetime, transactions: List[TransactionCreate]):
+def create_withdrawal_tx(
+    spec: AccountSpec,
+    dt: datetime,
+    transactions: List[TransactionCreate],
+    saving_spec: AccountSpec | None = SAVING_SPEC,
+):
     if spec.account_type != AccountType.current_credit:
         return
 
     if spec.monthly_withdrawals_max is None or spec.monthly_withdrawals_min is None:
         raise ValueError(f"Current account {spec.id} is missing withdrawal limits")
 
-    num_tx = random.randint(5, 10)
+    num_tx = spec.withdrawals_per_month
+    if num_tx is None:
+        num_tx = random.randint(5, 10)
 
     for _ in range(num_tx):
         amount = two_dp(
@@ -372,7 +441,7 @@ def create_withdrawal_tx(spec: AccountSpec, dt: datetime, transactions: List[Tra
         )
         spec.value += amount
 
-    if spec.value > 8000:
+    if saving_spec is not None and spec.value > 8000:
         amount = Decimal(random.randint(1, 7) * 1000)
 
         tx_date = random_date_month(dt)
@@ -390,11 +459,142 @@ def create_withdrawal_tx(spec: AccountSpec, dt: datetime, transactions: List[Tra
 
         transactions.append(
             TransactionCreate(
-                account_id=SAVING_SPEC.id,
+                account_id=saving_spec.id,
                 date_time=tx_date,
                 amount=amount,
                 transaction_type="Transfer from current account",
                 description="Deposit",
             )
         )
-        SAVING_SPEC.value += amount
+        saving_spec.value += amount
+
+
+# Datasets too big for a list of TransactionCreate models, millions of transactions for load
+# testing.  The same monthly model as above in integer pennies, generated a month at a time across
+# all the accounts from its own seeded generator and streamed to the database.
+
+
+def iter_transaction_rows(specs: List[AccountSpec], seed: int) -> Iterator[Tuple]:
+    # rows of crud.TRANSACTION_COPY_COLUMNS, the same for the same specs and seed
+    rng = random.Random(seed)
+    values = {spec.id: to_pennies(spec.value or 0) for spec in specs}
+    saving_spec = next((spec for spec in specs if spec.account_type == AccountType.savings), None)
+
+    month = 0
+    while True:
+        active = False
+        for spec in specs:
+            dt = spec.start_date + relativedelta(months=month)
+            if dt >= spec.end_date:
+                continue
+            active = True
+            yield from _contribution_row(spec, dt, values)
+            if month == 0:
+                yield from _initial_value_rows(spec, dt, values)
+            else:
+                yield from _growth_row(spec, dt, values, rng)
+            yield from _withdrawal_rows(spec, dt, values, rng, saving_spec)
+        if not active:
+            return
+        month += 1
+
+
+def _row(spec: AccountSpec, dt: datetime, pennies: int, transaction_type: str, description: str):
+    return (spec.id, dt, pennies, False, transaction_type, description)
+
+
+def _contribution_row(spec: AccountSpec, dt: datetime, values: Dict[int, int]):
+    match spec.account_type:
+        case AccountType.current_credit:
+            if spec.contributions is None:
+                pennies = abs(values[spec.id])  # a credit card, cleared each month
+                row = _row(spec, dt.replace(day=26), pennies, "Deposit", "Clear balance")
+            else:
+                pennies = to_pennies(spec.contributions)
+                row = _row(spec, dt.replace(day=26), pennies, "Deposit", "Pay")
+        case AccountType.pensions:
+            pennies = to_pennies(spec.contributions)
+            row = _row(spec, dt.replace(day=1), pennies, "Deposit", "Pension contribution")
+        case AccountType.loans:
+            pennies = to_pennies(spec.contributions)
+            row = _row(spec, dt.replace(day=3), pennies, "Deposit", "Loan repayment")
+        case AccountType.savings:
+            pennies = to_pennies(spec.contributions)
+            row = _row(spec, dt.replace(day=5), pennies, "Deposit", "Standing Order")
+        case _:
+            return
+    values[spec.id] += pennies
+    yield row
+
+
+def _initial_value_rows(spec: AccountSpec, dt: datetime, values: Dict[int, int]):
+    match spec.account_type:
+        case AccountType.asset:
+            contributions = to_pennies(spec.contributions)
+            yield _row(spec, dt, contributions, "Deposit", "Total Mortgage Contributions")
+            yield _row(
+                spec, dt, values[spec.id] - contributions, "Value Adjustment", "Market value"
+            )
+        case AccountType.loans:
+            yield _row(spec, dt, values[spec.id], "Withdrawal", "Loan drawdown")
+
+
+def _growth_row(spec: AccountSpec, dt: datetime, values: Dict[int, int], rng: random.Random):
+    if spec.account_type not in [
+        AccountType.asset,
+        AccountType.pensions,
+        AccountType.loans,
+        AccountType.savings,
+    ]:
+        return
+    growth_factor = rng.uniform(float(spec.growth_factor_min), float(spec.growth_factor_max))
+    pennies = round_pennies(values[spec.id] * (growth_factor - 1))
+    values[spec.id] += pennies
+    description = (
+        "Loan interest" if spec.account_type == AccountType.loans else "Market value change"
+    )
+    yield _row(spec, dt, pennies, "Value Adjustment", description)
+
+
+def _withdrawal_rows(
+    spec: AccountSpec,
+    dt: datetime,
+    values: Dict[int, int],
+    rng: random.Random,
+    saving_spec: AccountSpec | None,
+):
+    if spec.account_type != AccountType.current_credit:
+        return
+
+    num_tx = spec.withdrawals_per_month
+    if num_tx is None:
+        num_tx = rng.randint(5, 10)
+    days_in_month = calendar.monthrange(dt.year, dt.month)[1]
+    min_pennies = float(spec.monthly_withdrawals_min) * 100 / max(num_tx, 1)
+    max_pennies = float(spec.monthly_withdrawals_max) * 100 / max(num_tx, 1)
+
+    for _ in range(num_tx):
+        pennies = round_pennies(rng.uniform(min_pennies, max_pennies))
+        tx_date = dt.replace(day=rng.randint(1, days_in_month))
+        values[spec.id] += pennies
+        yield _row(spec, tx_date, pennies, "Withdrawal", "Withdrawal")
+
+    if saving_spec is not None and values[spec.id] > 800000:
+        pennies = rng.randint(1, 7) * 100000
+        tx_date = dt.replace(day=rng.randint(1, days_in_month))
+        values[spec.id] -= pennies
+        values[saving_spec.id] += pennies
+        yield _row(spec, tx_date, -pennies, "Transfer to ISA", "Transfer")
+        yield _row(saving_spec, tx_date, pennies, "Transfer from current account", "Deposit")
+
+
+def bulk_load_dataset(db_session: Session, specs: List[AccountSpec], seed: int) -> int:
+    # accounts, rules and then the transactions in one stream, running the rules once at the end
+    crud.create_accounts(db_session=db_session, accounts=create_sample_accounts(specs))
+    crud.create_transaction_rules(db_session=db_session, rules=create_sample_rules(specs))
+    years = range(
+        min(spec.start_date.year for spec in specs), max(spec.end_date.year for spec in specs) + 1
+    )
+    count = crud.copy_transactions(db_session, iter_transaction_rows(specs, seed), years)
+    crud.run_rules(db_session=db_session)
+    return count
@@ -6,20 +6,43 @@ from typing import List
 
 import pytest
 from pydantic import BaseModel
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from sqlalchemy_utils import create_database, database_exists, drop_database
 
 from backend import crud
-from backend.db import Base, get_db_session, get_db_url
+from backend.db import (
+    Base,
+    create_async_db_engine,
+    create_db_engine,
+    get_async_db_session,
+    get_async_session_factory,
+    get_db_session,
+    get_db_url,
+    is_sqlite,
+)
 from backend.main import app
-from backend.test.sample_data_utils import (
+from backend.sample_data import (
     create_sample_accounts,
     create_sample_rules,
     create_sample_transactions,
 )
 
 
+def pytest_configure(config):
+    config.addinivalue_line("markers", "postgres: needs postgres, skipped when testing sqlite")
+
+
+def pytest_collection_modifyitems(config, items):
+    # DATABASE_URL=sqlite:// runs the suite without a postgres server
+    if not is_sqlite(get_db_url()):
+        return
+    for item in items:
+        if "postgres" in item.keywords:
+            item.add_marker(pytest.mark.skip(reason="needs postgres"))
+
+
 @pytest.fixture(scope="session")
 def unique_test_db_name(request):
     worker_id = getattr(request.config, "workerinput", {}).get("workerid", "master")
@@ -29,18 +52,49 @@ def unique_test_db_name(request):
 @pytest.fixture(scope="session")
 def db_engine(unique_test_db_name):
     base_url = get_db_url()
+    if is_sqlite(base_url):
+        # a private in-memory database, gone once the engine closes its connection
+        test_db_url = f"sqlite:///file:{unique_test_db_name}?mode=memory&cache=shared&uri=true"
+        engine = create_db_engine(test_db_url)
+        yield engine
+        engine.dispose()
+        return
+
     test_db_url = f"{base_url}{unique_test_db_name}"
 
     if not database_exists(test_db_url):
         create_database(test_db_url)
 
-    engine = create_engine(test_db_url)
+    engine = create_db_engine(test_db_url)
     yield engine
 
     engine.dispose()  # Ensure all connections are closed
     drop_database(test_db_url)
 
 
+@pytest.fixture(scope="function")
+def short_timeout_session(db_engine, monkeypatch):
+    # on connections with a statement timeout a long statement would run past
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "300")
+    engine = create_db_engine(db_engine.url.render_as_string(hide_password=False), NullPool)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    yield session
+
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def async_session_factory(db_engine):
+    # TestClient runs each request in a new event loop and asyncpg connections can't move between
+    # loops, so no pooling
+    async_engine = create_async_db_engine(
+        db_engine.url.render_as_string(hide_password=False), poolclass=NullPool
+    )
+    return async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
 @pytest.fixture(scope="function", autouse=True)
 def db_session(db_engine):
     """
@@ -57,7 +111,7 @@ def db_session(db_engine):
 
 
 @pytest.fixture(scope="function", autouse=True)
-def setup_test_environment(db_session):
+def setup_test_environment(db_session, async_session_factory):
     """
     Override the FastAPI dependencies to use the test database session.
     """
@@ -65,7 +119,13 @@ def setup_test_environment(db_session):
     def get_db_override():
         yield db_session
 
+    async def get_async_db_override():
+        async with async_session_factory() as async_db_session:
+            yield async_db_session
+
     app.dependency_overrides[get_db_session] = get_db_override
+    app.dependency_overrides[get_async_db_session] = get_async_db_override
+    app.dependency_overrides[get_async_session_factory] = lambda: async_session_factory
 
     yield  # This allows the fixture to run both at setup and teardown
 
@@ -95,5 +155,5 @@ def insert_sample_accounts(db_session, sample_accounts):
 @pytest.fixture(scope="function")
 def insert_sample_data(db_session, sample_accounts, sample_rules, sample_transactions):
     crud.create_accounts(db_session=db_session, accounts=sample_accounts)
-    crud.create_transaction_rules(db_session=db_session, rules=create_sample_rules)
+    crud.create_transaction_rules(db_session=db_session, rules=sample_rules)
     crud.create_transactions(db_session=db_session, transactions=sample_transactions)
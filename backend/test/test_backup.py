@@ -0,0 +1,241 @@
+import csv
+import io
+import json
+import zipfile
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from backend.api_models import (
+    AccountBackup,
+    AccountCreate,
+    AccountType,
+    BackupV1,
+    DataSeriesCreate,
+    TagContainsAny,
+    TransactionCreate,
+)
+from backend.backup import restore_backups, write_backup
+from backend.db import Base
+from backend.db_models import DeletedRecord
+from backend.main import app
+
+pytestmark = pytest.mark.postgres
+
+client = TestClient(app)
+
+
+def clear_tables(db_session):
+    for table in reversed(Base.metadata.sorted_tables):
+        db_session.execute(table.delete())
+    db_session.commit()
+
+
+def import_zip(content: bytes, incremental_contents: list[bytes] = []):
+    files = [("file", ("backup.zip", content, "application/zip"))]
+    files.extend(
+        ("incremental_files", (f"incremental_{i}.zip", incremental, "application/zip"))
+        for i, incremental in enumerate(incremental_contents)
+    )
+    return client.post("/api/accounts/import/", files=files)
+
+
+def read_manifest(content: bytes) -> dict:
+    with zipfile.ZipFile(io.BytesIO(content)) as zip_file:
+        return json.loads(zip_file.read("manifest.json"))
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+def test_export_import_roundtrip(db_session):
+    summary_before = client.get("/api/accounts/summary/").json()
+    transactions_before = client.get("/api/accounts/1/transactions/").json()
+
+    response = client.get("/api/accounts/export/")
+    assert response.status_code == 200
+
+    manifest = read_manifest(response.content)
+    assert manifest["version"] == "2.0.0"
+    assert manifest["since"] is None
+    assert {table["name"] for table in manifest["tables"]} == {
+        "accounts",
+        "transaction_rule",
+        "transactions",
+        "data_series_keys",
+        "data_series",
+    }
+
+    clear_tables(db_session)
+    assert import_zip(response.content).status_code == 200
+
+    assert client.get("/api/accounts/summary/").json() == summary_before
+    assert client.get("/api/accounts/1/transactions/").json() == transactions_before
+
+
+def show_statement_timeout(db_session) -> str:
+    return db_session.execute(text("SHOW statement_timeout")).scalar()
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+def test_backups_lift_statement_timeout(db_session, short_timeout_session):
+    transactions_before = client.get("/api/accounts/1/transactions/").json()
+    assert show_statement_timeout(short_timeout_session) == "300ms"
+    short_timeout_session.rollback()
+
+    zip_bytes = io.BytesIO()
+    with zipfile.ZipFile(zip_bytes, "w") as zip_file:
+        write_backup(db_session=short_timeout_session, zip_file=zip_file)
+    # for the backup's transaction only
+    assert show_statement_timeout(short_timeout_session) == "0"
+    short_timeout_session.rollback()
+    assert show_statement_timeout(short_timeout_session) == "300ms"
+    short_timeout_session.rollback()
+
+    clear_tables(db_session)
+    with zipfile.ZipFile(zip_bytes) as zip_file:
+        restore_backups(db_session=short_timeout_session, zip_file=zip_file)
+    assert client.get("/api/accounts/1/transactions/").json() == transactions_before
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+def test_import_tags_transactions_again(db_session):
+    # tags come from the rules rather than the backup
+    condition = TagContainsAny(values=["withdrawal"], tag="cash")
+    client.post("/api/accounts/2/rules/", json=condition.model_dump())
+    totals_before = client.get("/api/tags/monthly/").json()
+    assert totals_before
+
+    response = client.get("/api/accounts/export/")
+    clear_tables(db_session)
+    assert import_zip(response.content).status_code == 200
+
+    assert client.get("/api/tags/monthly/").json() == totals_before
+
+
+def with_decimal_amounts(content: bytes) -> bytes:
+    # rewrite an export as it was before transaction amounts were stored in pennies
+    zip_bytes = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(content)) as source, zipfile.ZipFile(zip_bytes, "w") as target:
+        for name in source.namelist():
+            data = source.read(name)
+            if name == "transactions.csv":
+                rows = list(csv.DictReader(io.StringIO(data.decode())))
+                for row in rows:
+                    row["amount"] = str(Decimal(row.pop("amount_pennies")).scaleb(-2))
+                text_file = io.StringIO()
+                writer = csv.DictWriter(text_file, fieldnames=rows[0].keys())
+                writer.writeheader()
+                writer.writerows(rows)
+                data = text_file.getvalue().encode()
+            target.writestr(name, data)
+    return zip_bytes.getvalue()
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+def test_import_backup_with_decimal_amounts(db_session):
+    transactions_before = client.get("/api/accounts/1/transactions/").json()
+    backup = with_decimal_amounts(client.get("/api/accounts/export/").content)
+
+    clear_tables(db_session)
+    assert import_zip(backup).status_code == 200
+    assert client.get("/api/accounts/1/transactions/").json() == transactions_before
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+def test_incremental_backup_chain(db_session, sample_accounts):
+    condition = TagContainsAny(values=["coffee", "refund"], tag="cafe")
+    client.post("/api/accounts/2/rules/", json=condition.model_dump())
+    full_backup = client.get("/api/accounts/export/").content
+    since = read_manifest(full_backup)["backup_datetime"]
+
+    # replace a few days of transactions and add a new account
+    csv_file = "date,description,amount\n01/03/2020,Coffee,-2.50\n05/03/2020,Refund,10.00\n"
+    response = client.post(
+        "/api/accounts/2/transactions/",
+        files={"upload_file": ("transactions.csv", csv_file, "text/csv")},
+    )
+    assert response.json()["transactions_deleted"] > 0
+    client.post(
+        "/api/accounts/",
+        json={**sample_accounts[0].model_dump(), "name": "New Account"},
+    )
+
+    response = client.get("/api/accounts/export/", params={"since": since})
+    assert response.status_code == 200
+    incremental_backup = response.content
+    tables = {table["name"]: table["rows"] for table in read_manifest(incremental_backup)["tables"]}
+    assert tables["accounts"] == 1
+    assert tables["transactions"] == 2
+    assert tables["deleted_records"] == db_session.query(DeletedRecord).count()
+
+    accounts_before = client.get("/api/accounts/").json()
+    transactions_before = client.get("/api/accounts/2/transactions/").json()
+    totals_before = client.get("/api/tags/monthly/").json()
+    assert totals_before
+
+    clear_tables(db_session)
+    assert import_zip(full_backup, [incremental_backup]).status_code == 200
+
+    assert client.get("/api/accounts/").json() == accounts_before
+    assert client.get("/api/accounts/2/transactions/").json() == transactions_before
+    # the deleted transactions' tags went with them
+    assert client.get("/api/tags/monthly/").json() == totals_before
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+def test_import_rejects_broken_backup_chain(db_session):
+    full_backup = client.get("/api/accounts/export/").content
+    since = read_manifest(full_backup)["backup_datetime"]
+    incremental_backup = client.get("/api/accounts/export/", params={"since": since}).content
+    later_backup = client.get("/api/accounts/export/", params={"since": "2100-01-01"}).content
+
+    clear_tables(db_session)
+    assert import_zip(incremental_backup).status_code == 400
+    assert import_zip(full_backup, [full_backup]).status_code == 400
+    assert import_zip(full_backup, [incremental_backup, later_backup]).status_code == 400
+    assert client.get("/api/accounts/").json() == []
+
+
+def test_import_v1_backup(sample_accounts):
+    backup = BackupV1(
+        accounts=[
+            AccountBackup(
+                account=AccountCreate(
+                    institution="Bank", name="Current", account_type=AccountType.current_credit
+                ),
+                transactions=[
+                    TransactionCreate(
+                        account_id=99, date_time="2024-01-01T00:00:00", amount="10.50"
+                    ),
+                    TransactionCreate(
+                        account_id=99, date_time="2024-02-01T00:00:00", amount="-0.25"
+                    ),
+                ],
+            )
+        ],
+        data_series=[DataSeriesCreate(date_time="2024-01-01T00:00:00", key="Salary", value="1")],
+    )
+    zip_bytes = io.BytesIO()
+    with zipfile.ZipFile(zip_bytes, "w") as zip_file:
+        zip_file.writestr("backup.json", backup.model_dump_json())
+
+    assert import_zip(zip_bytes.getvalue()).status_code == 200
+
+    balance = client.get("/api/accounts/1/balance/").json()
+    assert balance["balance"] == "10.25"
+    assert len(client.get("/api/dataseries/").json()) == 1
+
+    # ids were copied so the sequences must have moved past them
+    response = client.post("/api/accounts/", json=sample_accounts[0].model_dump())
+    assert response.status_code == 200
+    assert response.json()[0]["id"] == 2
+
+
+def test_import_rejects_non_empty_database(sample_accounts):
+    client.post("/api/accounts/", json=sample_accounts[0].model_dump())
+    assert import_zip(b"not a zip").status_code == 409
+
+
+def test_import_rejects_bad_zip():
+    assert import_zip(b"not a zip").status_code == 400
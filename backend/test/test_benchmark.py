@@ -0,0 +1,71 @@
+from fastapi.testclient import TestClient
+
+from backend.api_models import AccountType
+from backend.benchmark import compare_reports, percentile, run_benchmark
+from backend.dialects import is_postgres
+from backend.main import app
+from backend.sample_data import create_dataset
+
+client = TestClient(app)
+
+
+def test_create_dataset_scales():
+    small = create_dataset(num_accounts=6, years=1, transactions_per_month=5)
+    large = create_dataset(num_accounts=12, years=2, transactions_per_month=5)
+
+    assert len(small.accounts) == 6 and len(large.accounts) == 12
+    assert len(large.rules) == 2 * len(small.rules)
+    assert 3.5 * len(small.transactions) < len(large.transactions) < 4.5 * len(small.transactions)
+
+    # each current account makes the requested number of withdrawals a month
+    current_account = next(
+        spec for spec in small.specs if spec.account_type == AccountType.current_credit
+    )
+    withdrawals = [
+        tx
+        for tx in small.transactions
+        if tx.account_id == current_account.id and tx.transaction_type == "Withdrawal"
+    ]
+    assert len(withdrawals) == 5 * 13
+
+    # seeded, so runs are comparable
+    assert create_dataset(6, 1, 5).transactions == small.transactions
+
+
+def test_percentile():
+    values = [0.5, 0.1, 0.4, 0.2, 0.3]
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 0)) == (
+        0.3,
+        0.5,
+        0.1,
+    )
+
+
+def test_run_benchmark(db_session):
+    dataset = create_dataset(num_accounts=6, years=1, transactions_per_month=2)
+    operations = run_benchmark(client, db_session, dataset, runs=2)
+
+    expected = {
+        "load_dataset",
+        "accounts_summary",
+        "balance_monthly",
+        "transactions",
+        "ingest_csv",
+        "run_rules",
+    }
+    if is_postgres(db_session):
+        expected |= {"export", "import"}
+    assert set(operations) == expected
+
+    stats = {name: operation.as_dict() for name, operation in operations.items()}
+    assert stats["load_dataset"]["runs"] == 1
+    assert stats["accounts_summary"]["runs"] == 2
+    assert stats["accounts_summary"]["p95_ms"] >= stats["accounts_summary"]["p50_ms"] > 0
+    assert stats["ingest_csv"]["items_per_second"] > 0
+
+    report = dict(dataset=dict(accounts=6), database="postgresql", operations=stats)
+    baseline = dict(
+        report,
+        operations={"accounts_summary": dict(p50_ms=stats["accounts_summary"]["p50_ms"] * 2)},
+    )
+    assert compare_reports(report, baseline)[1].endswith("-50.0%")
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from backend import crud, db_models
+from backend.api_models import AccountType
+from backend.money import to_pennies
+from backend.sample_data import (
+    bulk_load_dataset,
+    create_dataset_specs,
+    iter_transaction_rows,
+)
+
+END_DATE = datetime(2024, 6, 30)
+
+
+def test_transaction_rows_seeded():
+    specs = create_dataset_specs(6, years=2, transactions_per_month=5, end_date=END_DATE)
+    rows = list(iter_transaction_rows(specs, seed=1))
+
+    assert rows == list(iter_transaction_rows(specs, seed=1))
+    assert rows != list(iter_transaction_rows(specs, seed=2))
+    assert all(len(row) == len(crud.TRANSACTION_COPY_COLUMNS) for row in rows)
+
+    # a pay day and the requested withdrawals a month, 25 months from June 2022
+    current_account = next(
+        spec for spec in specs if spec.account_type == AccountType.current_credit
+    )
+    types = [row[4] for row in rows if row[0] == current_account.id]
+    assert types.count("Deposit") == 25
+    assert types.count("Withdrawal") == 5 * 25
+    assert all(datetime(2022, 6, 1) <= row[1] < END_DATE for row in rows)
+
+
+def test_bulk_load_dataset(db_session):
+    specs = create_dataset_specs(12, years=2, transactions_per_month=20, end_date=END_DATE)
+    rows = list(iter_transaction_rows(specs, seed=7))
+
+    assert bulk_load_dataset(db_session, specs, seed=7) == len(rows)
+
+    count, total = db_session.execute(
+        select(func.count(), func.sum(db_models.Transaction.amount_pennies))
+    ).one()
+    assert (count, total) == (len(rows), sum(row[2] for row in rows))
+
+    # the rules ran once the load was done
+    ruled_accounts = {spec.id for spec in specs if spec.conditions}
+    for spec in specs:
+        transactions = crud.get_transactions(db_session, account_id=spec.id)
+        for transaction in transactions:
+            expected = (
+                spec.id in ruled_accounts and transaction.transaction_type == "Value Adjustment"
+            )
+            assert transaction.is_value_adjustment == expected
+
+    balances = {balance.account_id: balance.balance for balance in crud.get_balance(db_session)}
+    for spec in specs:
+        assert to_pennies(balances[spec.id]) == sum(row[2] for row in rows if row[0] == spec.id)
+
+
+@pytest.mark.postgres
+def test_bulk_load_runs_past_statement_timeout(short_timeout_session):
+    # the load is one COPY statement, far longer than the requests' timeout
+    specs = create_dataset_specs(8, years=10, transactions_per_month=100, end_date=END_DATE)
+    count = bulk_load_dataset(short_timeout_session, specs, seed=3)
+    assert count == short_timeout_session.scalar(select(func.count(db_models.Transaction.id)))
@@ -0,0 +1,121 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import crud
+from backend.api_models import DataSeriesCreate, TransactionCreate
+from backend.main import app
+from backend.responses import CACHE_CONTROL, etag_matches
+
+client = TestClient(app)
+
+CONDITIONAL_PATHS = [
+    "/api/accounts/summary/",
+    "/api/balance/monthly/",
+    "/api/balance/monthly/?account_ids=1",
+    "/api/accounts/1/transactions/",
+]
+
+
+def get_etag(path: str) -> str:
+    response = client.get(path)
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == CACHE_CONTROL
+    return response.headers["etag"]
+
+
+def add_transaction(db_session, account_id: int):
+    crud.create_transactions(
+        db_session=db_session,
+        transactions=TransactionCreate(
+            account_id=account_id,
+            date_time=datetime(2024, 1, 15),
+            amount=Decimal("-12.34"),
+            transaction_type="Payment",
+            description="test",
+        ),
+    )
+
+
+@pytest.mark.parametrize(
+    "if_none_match,expected",
+    [
+        ('W/"abc"', True),
+        ('"abc"', True),
+        ('"xyz", W/"abc"', True),
+        ("*", True),
+        ('W/"xyz"', False),
+        ("", False),
+    ],
+)
+def test_etag_matches(if_none_match, expected):
+    assert etag_matches(if_none_match, 'W/"abc"') == expected
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+@pytest.mark.parametrize("path", CONDITIONAL_PATHS)
+def test_not_modified(path):
+    etag = get_etag(path)
+    assert etag.startswith('W/"')
+
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert response.headers["cache-control"] == CACHE_CONTROL
+
+    response = client.get(path, headers={"If-None-Match": 'W/"something-else"'})
+    assert response.status_code == 200
+    assert response.json()
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+def test_transaction_writes_change_etags(db_session):
+    etags = {path: get_etag(path) for path in CONDITIONAL_PATHS}
+
+    add_transaction(db_session, account_id=2)
+    # account 1's transactions and monthly balances are unchanged
+    changed = {path for path in CONDITIONAL_PATHS if get_etag(path) != etags[path]}
+    assert changed == {"/api/accounts/summary/", "/api/balance/monthly/"}
+
+    add_transaction(db_session, account_id=1)
+    assert all(get_etag(path) != etags[path] for path in CONDITIONAL_PATHS)
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+def test_ingest_changes_etag():
+    path = "/api/accounts/1/transactions/"
+    etag = get_etag(path)
+    csv_file = (
+        '"date","transaction_type","description","amount","notes"\n'
+        '"15/01/2024","Payment","test","-12.34",\n'
+    )
+    response = client.post(
+        "/api/accounts/1/transactions/?ingest_type=csv",
+        files={"upload_file": ("transactions.csv", csv_file.encode(), "text/csv")},
+    )
+    assert response.status_code == 200
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_data_series_etag(db_session):
+    path = "/api/dataseries/"
+    values = [DataSeriesCreate(date_time=datetime(2024, 1, 1), key="salary", value="1000")]
+    crud.create_data_series(db_session=db_session, values=values)
+    etag = get_etag(path)
+
+    # writing the same values again changes nothing
+    crud.create_data_series(db_session=db_session, values=values)
+    assert get_etag(path) == etag
+
+    values[0].value = "2000"
+    crud.create_data_series(db_session=db_session, values=values)
+    assert get_etag(path) != etag
+
+
+def test_account_writes_change_etag(db_session, sample_accounts):
+    etag = get_etag("/api/accounts/summary/")
+    crud.create_accounts(db_session=db_session, accounts=sample_accounts[:1])
+    assert get_etag("/api/accounts/summary/") != etag
@@ -0,0 +1,52 @@
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.api_models import MonthlyBalanceResult
+from backend.cpi import UK_CPI_RATES, cpi_rows
+from backend.main import app
+
+client = TestClient(app)
+
+
+def test_cpi_rows_compound_annual_rates():
+    rows = cpi_rows({2020: Decimal("0.1"), 2021: Decimal("0.2")})
+    price_indexes = {row["date_time"].strftime("%Y-%m"): row["price_index"] for row in rows}
+
+    assert len(rows) == 24
+    assert price_indexes["2020-01"] == 1
+    assert price_indexes["2021-01"] == Decimal("1.1")
+    assert price_indexes["2020-07"] == pytest.approx(Decimal("1.1") ** Decimal("0.5"))
+
+
+def test_get_cpi():
+    response = client.get("/api/metadata/cpi/")
+    assert response.status_code == 200
+    assert {int(year): Decimal(str(rate)) for year, rate in response.json().items()} == (
+        UK_CPI_RATES
+    )
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+def test_get_monthly_balance_real_terms():
+    nominal = [
+        MonthlyBalanceResult.model_validate(val)
+        for val in client.get("/api/balance/monthly/").json()
+    ]
+    real = [
+        MonthlyBalanceResult.model_validate(val)
+        for val in client.get("/api/balance/monthly/", params={"real_terms": 2020}).json()
+    ]
+
+    for nominal_result, real_result in zip(nominal, real):
+        assert nominal_result.account_id == real_result.account_id
+        for nominal_mb, real_mb in zip(
+            nominal_result.monthly_balances, real_result.monthly_balances
+        ):
+            if nominal_mb.year_month == "2020-01":
+                assert real_mb.end_balance == nominal_mb.end_balance
+            elif nominal_mb.year_month == "2015-01" and nominal_mb.end_balance > 0:
+                # earlier money is worth more in 2020 prices
+                assert real_mb.end_balance > nominal_mb.end_balance
+            assert real_mb.monthly_balance == real_mb.end_balance - real_mb.start_balance
@@ -0,0 +1,106 @@
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="function")
+def insert_salary_data_series():
+    values = [
+        {"date_time": "2023-04-05T00:00:00", "key": "Salary", "value": "1,000.50"},
+        {"date_time": "2023-04-06T00:00:00", "key": "Salary", "value": "2000"},
+        {"date_time": "2024-01-31T00:00:00", "key": "Salary", "value": "3000"},
+        {"date_time": "2024-04-06T00:00:00", "key": "Salary", "value": "4000"},
+        {"date_time": "2023-05-01T00:00:00", "key": "Company", "value": "Acme"},
+        {"date_time": "2024-02-01T00:00:00", "key": "Company", "value": "Nuka Cola"},
+    ]
+    response = client.post("/api/dataseries/", json=values)
+    assert response.json()["values_added"] == len(values)
+
+
+@pytest.mark.usefixtures("insert_salary_data_series")
+def test_get_data_series_by_key():
+    response = client.get("/api/dataseries/", params={"keys": "Company"})
+    assert response.status_code == 200
+    assert [val["value"] for val in response.json()] == ["Acme", "Nuka Cola"]
+    assert {val["key"] for val in response.json()} == {"Company"}
+
+
+@pytest.mark.usefixtures("insert_salary_data_series")
+def test_add_data_series_upserts():
+    values = [
+        {"date_time": "2023-04-05T00:00:00", "key": "Salary", "value": "1,000.50"},
+        {"date_time": "2023-04-06T00:00:00", "key": "Salary", "value": "2500"},
+        {"date_time": "2025-04-06T00:00:00", "key": "Salary", "value": "5000"},
+        {"date_time": "2025-04-06T00:00:00", "key": "Salary", "value": "5500"},
+    ]
+    response = client.post("/api/dataseries/", json=values)
+    assert response.status_code == 200
+    assert response.json() == {"values_added": 1, "values_updated": 1, "values_unchanged": 1}
+
+    response = client.get("/api/dataseries/", params={"keys": "Salary"})
+    assert [val["value"] for val in response.json()] == ["1,000.50", "2500", "3000", "4000", "5500"]
+
+
+@pytest.mark.usefixtures("insert_salary_data_series")
+def test_get_data_series_date_range():
+    response = client.get(
+        "/api/dataseries/",
+        params={"keys": "Salary", "start_date": "2023-04-06", "end_date": "2024-01-31"},
+    )
+    assert response.status_code == 200
+    assert [val["value"] for val in response.json()] == ["2000", "3000"]
+
+
+@pytest.mark.usefixtures("insert_salary_data_series")
+def test_get_latest_data_series():
+    response = client.get("/api/dataseries/", params={"latest": True})
+    assert response.status_code == 200
+    assert {val["key"]: val["value"] for val in response.json()} == {
+        "Salary": "4000",
+        "Company": "Nuka Cola",
+    }
+
+
+@pytest.mark.usefixtures("insert_salary_data_series")
+def test_get_data_series_as_of():
+    response = client.get("/api/dataseries/", params={"as_of": "2024-01-31"})
+    assert response.status_code == 200
+    assert {val["key"]: val["value"] for val in response.json()} == {
+        "Salary": "3000",
+        "Company": "Acme",
+    }
+
+    response = client.get("/api/dataseries/", params={"keys": "Company", "as_of": "2020-01-01"})
+    assert response.json() == []
+
+
+@pytest.mark.usefixtures("insert_salary_data_series")
+def test_aggregate_data_series_by_tax_year():
+    response = client.get("/api/dataseries/aggregate/", params={"keys": "Salary"})
+    assert response.status_code == 200
+
+    aggregates = {val["period"]: val for val in response.json()}
+    assert sorted(aggregates) == [2022, 2023, 2024]
+    # compared as numbers, sqlite sums numerics as floats so the scale can differ
+    assert Decimal(aggregates[2022]["total"]) == Decimal("1000.50")
+    assert Decimal(aggregates[2023]["total"]) == Decimal("5000")
+    assert aggregates[2023]["count"] == 2
+    assert aggregates[2023]["latest_value"] == "3000"
+    assert aggregates[2023]["latest_date_time"] == "2024-01-31T00:00:00"
+
+
+@pytest.mark.usefixtures("insert_salary_data_series")
+def test_aggregate_data_series_by_calendar_year():
+    response = client.get("/api/dataseries/aggregate/", params={"period": "calendar_year"})
+    assert response.status_code == 200
+
+    aggregates = {(val["key"], val["period"]): val for val in response.json()}
+    assert Decimal(aggregates[("Salary", 2023)]["total"]) == Decimal("3000.50")
+    assert aggregates[("Salary", 2024)]["latest_value"] == "4000"
+    assert aggregates[("Company", 2024)]["total"] is None
+    assert aggregates[("Company", 2024)]["latest_value"] == "Nuka Cola"
@@ -0,0 +1,36 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from backend.db import APPLICATION_NAME, get_pool_stats
+from backend.main import app
+
+pytestmark = pytest.mark.postgres
+
+client = TestClient(app)
+
+
+def test_connection_settings(db_engine):
+    with db_engine.connect() as connection:
+        assert connection.execute(text("SHOW statement_timeout")).scalar() == "30s"
+        assert connection.execute(text("SHOW application_name")).scalar() == APPLICATION_NAME
+
+
+def test_pool_stats_track_checkouts(db_engine):
+    before = get_pool_stats(db_engine.pool)
+    with db_engine.connect():
+        during = get_pool_stats(db_engine.pool)
+    after = get_pool_stats(db_engine.pool)
+
+    assert before.pool_class == "TimedQueuePool"
+    assert during.checked_out == before.checked_out + 1
+    assert during.checkouts == before.checkouts + 1
+    assert after.checked_out == before.checked_out
+    assert after.wait_seconds_max >= 0
+
+
+def test_get_pool_stats():
+    response = client.get("/api/metadata/pool/")
+    assert response.status_code == 200
+    assert set(response.json()) == {"sync", "async"}
+    assert response.json()["async"]["pool_class"] == "TimedAsyncAdaptedQueuePool"
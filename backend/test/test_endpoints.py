@@ -1,8 +1,24 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import List
+
 import pytest
+from fastapi.encoders import jsonable_encoder
 from fastapi.testclient import TestClient
-
-from backend.api_models import Account, AccountCreate, IngestType
+from sqlalchemy import text
+
+from backend import crud
+from backend.api_models import (
+    Account,
+    AccountCreate,
+    AccountSummary,
+    IngestType,
+    Transaction,
+    TransactionCreate,
+)
 from backend.main import app
+from backend.responses import trusted_json_response
 
 # todo divide into separate files
 
@@ -27,6 +43,22 @@ def test_get_account_summary():
     assert response.status_code == 200
 
 
+@pytest.mark.usefixtures("insert_sample_data")
+def test_get_account_summary_matches_balances(db_session, sample_accounts):
+    response = client.get(f"/api/accounts/summary/")
+    assert response.status_code == 200
+
+    summaries = [AccountSummary.model_validate(val) for val in response.json()]
+    assert len(summaries) == len(sample_accounts)
+
+    balances = {result.account_id: result for result in crud.get_balance(db_session=db_session)}
+    for summary in summaries:
+        if summary.account.id in balances:
+            assert summary.last_transaction_date == (
+                balances[summary.account.id].last_transaction_date
+            )
+
+
 @pytest.mark.usefixtures("insert_sample_accounts")
 def test_get_account_by_id():
     account_id = 1
@@ -40,6 +72,22 @@ def test_list_transactions():
     assert response.status_code == 200
 
 
+@pytest.mark.postgres
+def test_transactions_partitioned_by_year(db_session, sample_accounts):
+    crud.create_accounts(db_session=db_session, accounts=sample_accounts[0])
+    crud.create_transactions(
+        db_session=db_session,
+        transactions=TransactionCreate(
+            account_id=1, date_time=datetime(1999, 6, 1), amount=Decimal("1.00")
+        ),
+    )
+
+    # the partition for the year is created on insert
+    assert db_session.execute(text("SELECT COUNT(*) FROM transactions_1999")).scalar() == 1
+    response = client.get(f"/api/accounts/1/transactions/")
+    assert [transaction["date_time"] for transaction in response.json()] == ["1999-06-01T00:00:00"]
+
+
 @pytest.mark.skip(reason="Need sample files to test this")
 def test_ingest_transactions():
     account_id = 1
@@ -48,6 +96,18 @@ def test_ingest_transactions():
     assert response.status_code == 200
 
 
+@pytest.mark.usefixtures("insert_sample_data")
+def test_trusted_json_response_matches_validated(db_session):
+    transactions = crud.get_transactions(db_session=db_session, account_id=1)
+    assert transactions
+
+    response = trusted_json_response(transactions, List[Transaction])
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == jsonable_encoder(
+        [Transaction.model_validate(tx) for tx in transactions]
+    )
+
+
 def test_get_account_balance():
     account_id = 1
     response = client.get(f"/api/accounts/{account_id}/balance/")
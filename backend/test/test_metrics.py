@@ -0,0 +1,91 @@
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.db import init_engines
+from backend.main import app
+from backend.metrics import Counter, Gauge, Histogram, Registry
+
+client = TestClient(app)
+
+CSV = b"""\
+"date","transaction_type","description","amount","notes"
+"01/01/2001","","Opening Balance","100.00",
+"02/01/2001","","CASH ATM","-20.00",
+"""
+
+
+def scrape() -> dict:
+    samples = {}
+    for line in client.get("/metrics").text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_render_prometheus_text(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr("backend.metrics.REGISTRY", registry)
+    counter = Counter("things_total", "Things.", ["kind"])
+    gauge = Gauge("level", "Level.")
+    histogram = Histogram("latency_seconds", "Latency.", ["route"], buckets=(0.1, 1.0))
+
+    counter.inc(kind='a "b"')
+    counter.inc(2, kind='a "b"')
+    gauge.set(5)
+    gauge.dec()
+    histogram.observe(0.5, route="/x")
+    histogram.observe(2, route="/x")
+
+    assert registry.render().splitlines() == [
+        "# HELP things_total Things.",
+        "# TYPE things_total counter",
+        'things_total{kind="a \\"b\\""} 3.0',
+        "# HELP level Level.",
+        "# TYPE level gauge",
+        "level 4.0",
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/x",le="0.1"} 0',
+        'latency_seconds_bucket{route="/x",le="1.0"} 1',
+        'latency_seconds_bucket{route="/x",le="+Inf"} 2',
+        'latency_seconds_sum{route="/x"} 2.5',
+        'latency_seconds_count{route="/x"} 2',
+    ]
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+def test_metrics_endpoint():
+    assert client.get("/api/accounts/summary/").status_code == 200
+    assert client.get("/api/accounts/1/transactions/").status_code == 200
+    response = client.post(
+        "/api/accounts/2/transactions/",
+        files={"upload_file": ("transactions.csv", CSV, "text/csv")},
+    )
+    assert response.status_code == 200
+
+    init_engines()  # the pool metrics cover the app's engines once they exist
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = scrape()
+
+    # labelled by route template, not by path
+    route = '{method="GET",route="/api/accounts/{account_id}/transactions/",status="200"}'
+    assert samples[f"http_request_duration_seconds_count{route}"] >= 1
+    assert samples[f"http_request_duration_seconds_sum{route}"] > 0
+    assert samples["http_requests_in_flight"] == 1  # the scrape itself
+
+    assert samples['ingest_rows_total{ingest_type="csv"}'] >= 2
+    assert samples['ingest_duration_seconds_count{ingest_type="csv"}'] >= 1
+    assert any(name.startswith("balance_interpolation_seconds_count{") for name in samples)
+
+    assert samples['sqlalchemy_compiled_cache_total{result="hit"}'] > 0
+    # the tests run on their own engines, so only check the app's pools are reported
+    pool_samples = [name for name in samples if name.startswith("db_pool_")]
+    assert {re.fullmatch(r'db_pool_\w+\{engine="(\w+)"\}', name)[1] for name in pool_samples} == {
+        "sync",
+        "async",
+    }
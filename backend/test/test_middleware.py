@@ -0,0 +1,158 @@
+import asyncio
+import gzip
+import zlib
+
+import brotli
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+
+from backend.compression import (
+    CompressionMiddleware,
+    choose_encoding,
+    parse_accept_encoding,
+)
+from backend.main import LoggingMiddleware, app
+
+client = TestClient(app)
+
+LARGE_TEXT = "0123456789" * 500
+
+
+def create_test_app(**compression_options) -> FastAPI:
+    test_app = FastAPI()
+
+    @test_app.get("/small")
+    def small():
+        return PlainTextResponse("small")
+
+    @test_app.get("/large")
+    def large():
+        return PlainTextResponse(LARGE_TEXT)
+
+    @test_app.get("/zip")
+    def zip_file():
+        return PlainTextResponse(LARGE_TEXT, media_type="application/zip")
+
+    @test_app.get("/error")
+    def error():
+        raise RuntimeError("boom")
+
+    test_app.add_middleware(CompressionMiddleware, **compression_options)
+    test_app.add_middleware(LoggingMiddleware)
+    return test_app
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, br;q=0.8, identity;q=0") == {
+        "gzip": 1.0,
+        "br": 0.8,
+        "identity": 0.0,
+    }
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected",
+    [
+        ("gzip, deflate, br", "br"),
+        ("gzip, br;q=0.5", "gzip"),
+        ("gzip", "gzip"),
+        ("*", "br"),
+        ("br;q=0, *", "gzip"),
+        ("deflate", None),
+        ("", None),
+    ],
+)
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding, ["br", "gzip"]) == expected
+
+
+@pytest.mark.parametrize(
+    "encoding,decompress", [("gzip", gzip.decompress), ("br", brotli.decompress)]
+)
+def test_compresses_large_responses(encoding, decompress):
+    # read raw, the client would decode it
+    with TestClient(create_test_app()).stream(
+        "GET", "/large", headers={"Accept-Encoding": encoding}
+    ) as response:
+        body = b"".join(response.iter_raw())
+    assert response.headers["content-encoding"] == encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(body) < len(LARGE_TEXT)
+    assert decompress(body).decode() == LARGE_TEXT
+
+
+def test_compressed_streaming_response():
+    async def streaming_app(scope, receive, send):
+        headers = [(b"content-type", b"application/x-ndjson")]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        for i in range(0, len(LARGE_TEXT), 1000):
+            chunk = LARGE_TEXT[i : i + 1000].encode()
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(CompressionMiddleware(streaming_app)(scope, None, send))
+
+    start, *bodies = messages
+    headers = Headers(raw=start["headers"])
+    assert headers["content-encoding"] == "gzip"
+    assert "content-length" not in headers
+    # each chunk is flushed, so decodes as it arrives
+    decompressor = zlib.decompressobj(31)
+    for i, message in enumerate(bodies[:-1]):
+        assert (
+            decompressor.decompress(message["body"])
+            == LARGE_TEXT[i * 1000 : (i + 1) * 1000].encode()
+        )
+    decompressor.decompress(bodies[-1]["body"])
+    assert decompressor.eof
+
+
+@pytest.mark.parametrize(
+    "path,accept_encoding",
+    [("/small", "gzip"), ("/zip", "gzip"), ("/large", "deflate"), ("/large", "")],
+)
+def test_uncompressed_responses(path, accept_encoding):
+    response = TestClient(create_test_app()).get(path, headers={"Accept-Encoding": accept_encoding})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    # the encoding was still negotiated
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_compression_configuration():
+    test_client = TestClient(create_test_app(encodings=["gzip"], minimum_size=10))
+    response = test_client.get("/large", headers={"Accept-Encoding": "br, gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    response = test_client.get("/large", headers={"Accept-Encoding": "br"})
+    assert "content-encoding" not in response.headers
+
+    test_client = TestClient(create_test_app(encodings=[]))
+    response = test_client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+
+
+def test_unhandled_error_logged_and_returned(caplog):
+    response = TestClient(create_test_app()).get("/error", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 500
+    assert response.json() == {"detail": "boom"}
+    assert "Unhandled error: boom" in caplog.text
+    assert "Request URL: http://testserver/error" in caplog.text
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+def test_api_responses_compressed():
+    response = client.get("/api/accounts/summary/", headers={"Accept-Encoding": "br"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "br"
+    assert "server-timing" in response.headers
+    assert response.json()
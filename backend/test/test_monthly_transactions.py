@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import crud
+from backend.api_models import MonthlyTransactions
+from backend.main import app
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("insert_sample_data")
+
+
+def balance_before(db_session, account_id: int, date_time: datetime):
+    return crud.get_balance(
+        db_session=db_session, account_ids=[account_id], end_date=date_time - timedelta(seconds=1)
+    )[0]
+
+
+def test_running_balances(db_session):
+    account_id = 1
+    last_date = crud.get_last_transaction_dates(db_session, account_ids=[account_id])[account_id]
+    month_start = crud.round_date_to_month(last_date - timedelta(days=100))
+    next_month_start = crud.get_first_day_of_next_month(month_start)
+
+    month = crud.get_monthly_transactions(db_session, account_id, month_start)
+    assert month.year_month == month_start.strftime("%Y-%m")
+    assert month.transactions
+    assert all(month_start <= tx.date_time < next_month_start for tx in month.transactions)
+    assert [tx.id for tx in month.transactions] == [
+        tx.id
+        for tx in crud.get_transactions(
+            db_session, account_id, month_start, next_month_start - timedelta(seconds=1)
+        )
+    ]
+
+    start = balance_before(db_session, account_id, month_start)
+    end = balance_before(db_session, account_id, next_month_start)
+    assert month.start_balance == start.balance
+    assert month.end_balance == end.balance
+    assert month.deposits_to_date == end.deposits_to_date
+    assert month.monthly_deposits == end.deposits_to_date - start.deposits_to_date
+
+    balance = month.start_balance
+    for transaction in month.transactions:
+        balance += transaction.amount
+        assert transaction.balance == balance
+    assert balance == month.end_balance
+
+    next_month = crud.get_monthly_transactions(db_session, account_id, next_month_start)
+    assert next_month.start_balance == month.end_balance
+
+
+def test_months_without_transactions(db_session):
+    account_id = 1
+    before = crud.get_monthly_transactions(db_session, account_id, datetime(1990, 1, 1))
+    assert before.transactions == []
+    assert before.start_balance == before.end_balance == Decimal(0)
+    assert before.monthly_deposits == before.deposits_to_date == Decimal(0)
+
+    after = crud.get_monthly_transactions(db_session, account_id, datetime(2100, 1, 1))
+    balance = crud.get_balance(db_session=db_session, account_ids=[account_id])[0]
+    assert after.transactions == []
+    assert after.start_balance == after.end_balance == balance.balance
+    assert after.deposits_to_date == balance.deposits_to_date
+    assert after.monthly_deposits == Decimal(0)
+
+
+def test_monthly_transactions_endpoint(db_session):
+    account_id = 1
+    last_date = crud.get_last_transaction_dates(db_session, account_ids=[account_id])[account_id]
+    year_month = last_date.strftime("%Y-%m")
+
+    response = client.get(
+        f"/api/accounts/{account_id}/transactions/monthly/", params=dict(year_month=year_month)
+    )
+    assert response.status_code == 200
+    month = MonthlyTransactions.model_validate(response.json())
+    assert month == crud.get_monthly_transactions(
+        db_session, account_id, crud.round_date_to_month(last_date)
+    )
+
+    response = client.get(
+        f"/api/accounts/{account_id}/transactions/monthly/",
+        params=dict(year_month=year_month),
+        headers={"If-None-Match": response.headers["etag"]},
+    )
+    assert response.status_code == 304
+
+    response = client.get(
+        f"/api/accounts/{account_id}/transactions/monthly/", params=dict(year_month="May 2024")
+    )
+    assert response.status_code == 400
+
+    response = client.get("/api/accounts/999/transactions/monthly/")
+    assert response.status_code == 404
@@ -0,0 +1,88 @@
+import threading
+import time
+from contextvars import copy_context
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import profiling
+from backend.main import app
+
+client = TestClient(app)
+
+
+def busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+@pytest.fixture
+def profiling_enabled(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL_SECONDS", 0.001)
+    monkeypatch.setattr(profiling, "_rate_limiter", profiling.RateLimiter(2))
+
+
+def test_profile_samples_registered_threads():
+    profile = profiling.Profile(0.001)
+    token = profiling._active_profile.set(profile)
+    profile.start()
+    try:
+
+        def handler():
+            thread_profile = profiling.add_current_thread()
+            try:
+                busy(0.05)
+            finally:
+                profiling.remove_thread(thread_profile)
+
+        # as the threadpool does, run the handler in a copy of the request's context
+        thread = threading.Thread(target=copy_context().run, args=(handler,))
+        thread.start()
+        thread.join()
+    finally:
+        profile.stop()
+        profiling._active_profile.reset(token)
+
+    folded = profile.folded().splitlines()
+    assert folded
+    stack, count = folded[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert any(";handler (" in line and ";busy (" in line for line in folded)
+    assert profile.thread_ids == {threading.get_ident()}
+
+
+def test_rate_limiter():
+    limiter = profiling.RateLimiter(2, window_seconds=0.05)
+    assert [limiter.allow() for _ in range(3)] == [True, True, False]
+    time.sleep(0.05)
+    assert limiter.allow()
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+def test_not_profiled_unless_enabled_and_requested(profiling_enabled, monkeypatch):
+    assert "X-Profile-Id" not in client.get("/api/accounts/").headers
+
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", False)
+    assert "X-Profile-Id" not in client.get("/api/accounts/?profile=1").headers
+
+
+@pytest.mark.usefixtures("insert_sample_data", "profiling_enabled")
+def test_profile_request():
+    response = client.get("/api/accounts/summary/", headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    profile_response = client.get(f"/profiles/{response.headers['X-Profile-Id']}")
+    assert profile_response.status_code == 200
+    assert profile_response.headers["content-type"].startswith("text/plain")
+
+    response = client.get("/api/dataseries/aggregate/?profile=1")
+    assert response.status_code == 200
+    assert client.get(f"/profiles/{response.headers['X-Profile-Id']}").status_code == 200
+
+    # over the rate limit the request is served without profiling
+    response = client.get("/api/accounts/summary/?profile=1")
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+
+    assert client.get("/profiles/unknown").status_code == 404
@@ -0,0 +1,145 @@
+from datetime import datetime
+from typing import Iterator
+
+import pytest
+from sqlalchemy import Executable, delete, text
+from sqlalchemy.dialects import postgresql
+
+from backend import crud, db_models
+
+pytestmark = pytest.mark.postgres
+
+ACCOUNTS = 20
+TRANSACTIONS_PER_ACCOUNT = 2000
+DATA_SERIES_KEYS = 20
+VALUES_PER_KEY = 500
+
+# tables big enough that a sequential scan means a missing index, including partitions of them
+CHECKED_TABLES = ("transactions", "data_series")
+
+
+@pytest.fixture(scope="function")
+def generated_dataset(db_engine, db_session):
+    # a few years of daily-ish transactions per account, analyzed so the planner sees its shape
+    crud.ensure_transaction_partitions(db_session, range(2015, 2021))
+    db_session.execute(
+        text(
+            """
+            INSERT INTO accounts (name, account_type, institution, is_active, default_ingest_type)
+            SELECT 'Account ' || n, 'savings', 'Bank', true, 'csv'
+            FROM generate_series(1, :accounts) AS n;
+
+            INSERT INTO transactions (
+                account_id, date_time, amount_pennies, is_value_adjustment, description
+            )
+            SELECT
+                1 + n % :accounts,
+                TIMESTAMP '2015-01-01' + (n / :accounts) * INTERVAL '1 day',
+                (n % 100000) - 50000,
+                n % 7 = 0,
+                'Shop ' || n % 1000
+            FROM generate_series(0, :accounts * :transactions_per_account - 1) AS n;
+
+            INSERT INTO data_series_keys (key)
+            SELECT 'Key ' || n FROM generate_series(1, :keys) AS n;
+
+            INSERT INTO data_series (key_id, date_time, value)
+            SELECT 1 + n % :keys, TIMESTAMP '2015-01-01' + (n / :keys) * INTERVAL '1 day', n::text
+            FROM generate_series(0, :keys * :values_per_key - 1) AS n;
+            """
+        ),
+        dict(
+            accounts=ACCOUNTS,
+            transactions_per_account=TRANSACTIONS_PER_ACCOUNT,
+            keys=DATA_SERIES_KEYS,
+            values_per_key=VALUES_PER_KEY,
+        ),
+    )
+    db_session.commit()
+
+    with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM ANALYZE"))
+
+
+def plan_nodes(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def explain(db_session, statement: Executable) -> dict:
+    # EXPLAIN without ANALYZE only plans, so deletes are safe to check too
+    compiled = statement.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    return db_session.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()[0]["Plan"]
+
+
+START = datetime(2017, 1, 1)
+END = datetime(2017, 12, 31)
+
+CRUD_QUERIES = {
+    "get_transactions": lambda: crud.transactions_select(account_id=3),
+    "get_transactions_date_range": lambda: crud.transactions_select(
+        account_id=3, start_date=START, end_date=END
+    ),
+    "get_transactions_page": lambda: crud.transactions_select(
+        account_id=3, after=(START, 10000), limit=100
+    ),
+    "count_transactions": lambda: crud.transactions_count_select(
+        account_id=3, start_date=START, end_date=END
+    ),
+    "get_monthly_transactions": lambda: crud.monthly_transactions_select(3, START),
+    "search_transactions": lambda: crud.transaction_search_select("shop & 123"),
+    "search_transactions_filtered": lambda: crud.transaction_search_select(
+        "shop & 123", account_ids=[3], start_date=START, end_date=END
+    ),
+    "get_balance": lambda: crud.balance_selects(account_ids=[3])[0],
+    "get_balance_deposits": lambda: crud.balance_selects(account_ids=[3])[1],
+    "get_balance_date_range": lambda: crud.balance_selects(
+        account_ids=[3], start_date=START, end_date=END
+    )[0],
+    "get_last_transaction_dates": lambda: crud.last_transaction_dates_select(account_ids=[3]),
+    "get_monthly_balances": lambda: crud.monthly_balances_select(account_ids=[3]),
+    "delete_transactions": lambda: delete(db_models.Transaction).where(
+        db_models.Transaction.date_time.between(START, END)
+        & (db_models.Transaction.account_id == 3)
+    ),
+    "get_data_series": lambda: crud.data_series_select(keys=["Key 3"]),
+    "get_data_series_date_range": lambda: crud.data_series_select(
+        keys=["Key 3"], start_date=START, end_date=END
+    ),
+    "get_data_series_latest": lambda: crud.data_series_select(keys=["Key 3"], latest=True),
+}
+
+
+@pytest.mark.usefixtures("generated_dataset")
+@pytest.mark.parametrize("query_name", CRUD_QUERIES)
+def test_query_avoids_sequential_scans(db_session, query_name):
+    plan = explain(db_session, CRUD_QUERIES[query_name]())
+
+    seq_scans = [
+        node["Relation Name"]
+        for node in plan_nodes(plan)
+        if node["Node Type"] == "Seq Scan"
+        and any(
+            node["Relation Name"] == table or node["Relation Name"].startswith(f"{table}_2")
+            for table in CHECKED_TABLES
+        )
+    ]
+    assert not seq_scans, f"{query_name} sequentially scans {seq_scans}"
+
+
+@pytest.mark.usefixtures("generated_dataset")
+def test_transactions_page_skips_earlier_partitions(db_session):
+    plan = explain(db_session, CRUD_QUERIES["get_transactions_page"]())
+    partitions = {node["Relation Name"] for node in plan_nodes(plan) if "Relation Name" in node}
+    assert partitions
+    assert all(partition >= "transactions_2017" for partition in partitions), partitions
+
+
+@pytest.mark.usefixtures("generated_dataset")
+def test_search_uses_search_vector_index(db_session):
+    plan = explain(db_session, CRUD_QUERIES["search_transactions"]())
+    indexes = {node.get("Index Name") for node in plan_nodes(plan)}
+    assert any(index and "search_vector" in index for index in indexes), indexes
@@ -0,0 +1,53 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from backend.main import app
+from backend.request_metrics import RequestMetrics, _request_metrics
+
+client = TestClient(app)
+
+
+def parse_server_timing(header: str) -> dict:
+    timings = {}
+    for metric in header.split(", "):
+        name, *params = metric.split(";")
+        timings[name] = dict(param.split("=", 1) for param in params)
+    return timings
+
+
+def test_queries_recorded_in_context(db_session):
+    metrics = RequestMetrics()
+    token = _request_metrics.set(metrics)
+    try:
+        db_session.execute(text("SELECT 1")).all()
+        db_session.execute(text("SELECT 2")).all()
+    finally:
+        _request_metrics.reset(token)
+
+    assert metrics.queries == 2
+    assert metrics.db_seconds > 0
+
+
+def test_queries_outside_requests_not_recorded(db_session):
+    db_session.execute(text("SELECT 1")).all()
+    assert _request_metrics.get() is None
+
+
+@pytest.mark.usefixtures("insert_sample_data")
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/api/accounts/summary/",  # async, with concurrent sessions
+        "/api/accounts/1/transactions/",  # async
+        "/api/dataseries/aggregate/",  # sync, in the threadpool
+    ],
+)
+def test_server_timing_header(path):
+    response = client.get(path)
+    assert response.status_code == 200
+
+    timings = parse_server_timing(response.headers["Server-Timing"])
+    assert set(timings) == {"db", "python", "serialize", "total"}
+    assert int(timings["db"]["desc"].strip('"').split()[0]) > 0
+    assert float(timings["total"]["dur"]) >= float(timings["serialize"]["dur"]) > 0
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from backend import async_crud, crud
+from backend.api_models import DataSeriesCreate, DataSeriesPeriod
+from backend.db import Base, create_async_db_engine, create_db_engine
+
+SQLITE_URL = "sqlite:///file:test_sqlite?mode=memory&cache=shared&uri=true"
+
+DATA_SERIES = [
+    DataSeriesCreate(date_time=datetime(2023, 4, 5), key="Salary", value="1000.50"),
+    DataSeriesCreate(date_time=datetime(2023, 4, 6), key="Salary", value="2000"),
+    DataSeriesCreate(date_time=datetime(2024, 1, 31), key="Salary", value="3000"),
+    DataSeriesCreate(date_time=datetime(2024, 1, 31), key="Company", value="Acme"),
+]
+
+
+@pytest.fixture(scope="function")
+def sqlite_engine():
+    engine = create_db_engine(SQLITE_URL)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def sqlite_session(sqlite_engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=sqlite_engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture(scope="function")
+def both_sessions(db_session, sqlite_session, sample_accounts, sample_rules, sample_transactions):
+    # the same data in the test database and sqlite
+    for session in (db_session, sqlite_session):
+        crud.create_accounts(db_session=session, accounts=sample_accounts)
+        crud.create_transaction_rules(db_session=session, rules=sample_rules)
+        crud.create_transactions(db_session=session, transactions=sample_transactions)
+        crud.create_data_series(db_session=session, values=DATA_SERIES)
+    return db_session, sqlite_session
+
+
+def test_sqlite_queries_match(both_sessions):
+    db_session, sqlite_session = both_sessions
+
+    for query in (
+        lambda session: crud.get_monthly_balances(session),
+        lambda session: crud.get_monthly_balances(session, real_terms=2020),
+        # unordered, so keyed by account
+        lambda session: {result.account_id: result for result in crud.get_balance(session)},
+        lambda session: crud.get_transactions(session, account_id=1),
+        lambda session: crud.get_data_series(session, latest=True),
+        lambda session: crud.get_data_series_aggregates(session, DataSeriesPeriod.tax_year),
+    ):
+        assert query(sqlite_session) == query(db_session)
+
+
+def test_sqlite_data_series_upsert(sqlite_session):
+    crud.create_data_series(db_session=sqlite_session, values=DATA_SERIES)
+    result = crud.create_data_series(
+        db_session=sqlite_session,
+        values=[
+            DataSeriesCreate(date_time=datetime(2023, 4, 5), key="Salary", value="1000.50"),
+            DataSeriesCreate(date_time=datetime(2023, 4, 6), key="Salary", value="2500"),
+            DataSeriesCreate(date_time=datetime(2025, 1, 1), key="Salary", value="4000"),
+        ],
+    )
+    assert (result.values_added, result.values_updated, result.values_unchanged) == (1, 1, 1)
+
+
+@pytest.mark.usefixtures("sqlite_engine")
+def test_sqlite_async_session(sqlite_session, sample_accounts, sample_transactions, monkeypatch):
+    crud.create_accounts(db_session=sqlite_session, accounts=sample_accounts)
+    crud.create_transactions(db_session=sqlite_session, transactions=sample_transactions)
+
+    # the balances are built off the event loop's thread
+    build_threads = []
+    build_monthly_balances = crud.build_monthly_balances
+
+    def recording_build(**kwargs):
+        build_threads.append(threading.get_ident())
+        return build_monthly_balances(**kwargs)
+
+    monkeypatch.setattr(crud, "build_monthly_balances", recording_build)
+
+    async def async_monthly_balances():
+        async_engine = create_async_db_engine(SQLITE_URL)
+        try:
+            async with async_sessionmaker(async_engine)() as async_session:
+                return await async_crud.get_monthly_balances(async_session)
+        finally:
+            await async_engine.dispose()
+
+    assert asyncio.run(async_monthly_balances()) == crud.get_monthly_balances(sqlite_session)
+    assert build_threads[0] != threading.get_ident()
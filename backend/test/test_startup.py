@@ -0,0 +1,37 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from backend.db import engines_initialised
+from backend.main import app
+
+LAZY_MODULES = ["ofxtools", "asyncpg", "psycopg2", "backend.backup", "backend.ingest"]
+
+
+def test_import_is_lazy():
+    # a fresh interpreter, this one has imported everything by now
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, backend.main; "
+            f"print([module for module in {LAZY_MODULES!r} if module in sys.modules])",
+        ],
+        cwd=Path(__file__).parents[2],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_lifespan_creates_engines():
+    with TestClient(app) as client:
+        assert engines_initialised()
+        metrics = client.get("/metrics").text
+        assert 'startup_seconds{phase="imports"}' in metrics
+        assert 'startup_seconds{phase="engines"}' in metrics
+
+    assert not engines_initialised()
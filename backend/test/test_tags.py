@@ -0,0 +1,228 @@
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+from backend import crud, db_models
+from backend.api_models import (
+    IsValueAdjContainsAny,
+    TagContainsAny,
+    TagMonthlyTotal,
+    TransactionCreate,
+)
+from backend.main import app
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("insert_sample_data")
+
+CONDITIONS = {
+    1: [
+        TagContainsAny(values=["pay"], tag="income"),
+        TagContainsAny(values=["withdrawal"], tag="cash"),
+    ],
+    2: [
+        TagContainsAny(values=["withdrawal", "transfer"], tag="spending"),
+        TagContainsAny(values=["withdrawal"], tag="cash"),
+    ],
+}
+
+
+def add_tag_rules(account_id: int):
+    for condition in CONDITIONS[account_id]:
+        response = client.post(
+            f"/api/accounts/{account_id}/rules/", json=condition.model_dump(mode="json")
+        )
+        assert response.status_code == 200
+
+
+def expected_totals(db_session, account_ids: Optional[List[int]] = None) -> List[TagMonthlyTotal]:
+    # grouping every transaction the rules match, what the precomputed totals save doing
+    totals: Dict[Tuple[str, str], List] = defaultdict(lambda: [0, Decimal(0)])
+    for rule in crud.get_rules(db_session=db_session, account_ids=account_ids):
+        if not isinstance(rule.condition, TagContainsAny):
+            continue
+        for transaction in crud.get_transactions(db_session, rule.account_id):
+            if rule.condition.evaluate(transaction):
+                total = totals[(transaction.date_time.strftime("%Y-%m"), rule.condition.tag)]
+                total[0] += 1
+                total[1] += transaction.amount
+    return [
+        TagMonthlyTotal(tag=tag, year_month=year_month, transaction_count=count, total=amount)
+        for (year_month, tag), (count, amount) in sorted(totals.items())
+    ]
+
+
+def test_tag_rules_fill_monthly_totals(db_session):
+    assert crud.get_tag_monthly_totals(db_session) == []
+
+    add_tag_rules(1)
+    add_tag_rules(2)
+    assert [tag.name for tag in crud.get_tags(db_session)] == ["cash", "income", "spending"]
+    totals = crud.get_tag_monthly_totals(db_session)
+    assert {total.tag for total in totals} == {"income", "spending", "cash"}
+    assert totals == expected_totals(db_session)
+
+    # running the rules again changes nothing
+    crud.run_rules(db_session=db_session)
+    assert crud.get_tag_monthly_totals(db_session) == totals
+
+
+def test_totals_follow_transaction_changes(db_session):
+    add_tag_rules(2)
+
+    crud.create_transactions(
+        db_session=db_session,
+        transactions=[
+            TransactionCreate(
+                account_id=2,
+                date_time=datetime(2023, 6, 15),
+                amount=Decimal("-20.00"),
+                transaction_type="Payment",
+                description="Cash withdrawal",
+            ),
+            TransactionCreate(
+                account_id=2,
+                date_time=datetime(2023, 6, 16),
+                amount=Decimal("-5.00"),
+                transaction_type="Payment",
+                description="Bakery",
+            ),
+        ],
+    )
+    assert crud.get_tag_monthly_totals(db_session) == expected_totals(db_session)
+
+    # an ingest replaces the transactions between its first and last dates, and their tags
+    csv_file = (
+        '"date","transaction_type","description","amount","notes"\n'
+        '"01/06/2023","Payment","Transfer out","-100.00",\n'
+        '"30/06/2023","Payment","Cafe","-3.50",\n'
+    )
+    response = client.post(
+        "/api/accounts/2/transactions/?ingest_type=csv",
+        files={"upload_file": ("transactions.csv", csv_file.encode(), "text/csv")},
+    )
+    assert response.status_code == 200
+    june = crud.get_tag_monthly_totals(
+        db_session, start_date=datetime(2023, 6, 1), end_date=datetime(2023, 6, 30)
+    )
+    assert june == [
+        TagMonthlyTotal(
+            tag="spending", year_month="2023-06", transaction_count=1, total=Decimal("-100.00")
+        )
+    ]
+    assert crud.get_tag_monthly_totals(db_session) == expected_totals(db_session)
+
+    # without the rules the tags go
+    db_session.execute(delete(db_models.TransactionRule).where(db_models.TransactionRule.id > 0))
+    db_session.commit()
+    crud.run_rules(db_session=db_session)
+    assert crud.get_tag_monthly_totals(db_session) == []
+    assert db_session.query(db_models.TransactionTag).count() == 0
+
+
+def test_value_adjustment_and_tag_rules_on_one_ingest(db_session):
+    for condition in [
+        IsValueAdjContainsAny(values=["interest"]),
+        TagContainsAny(values=["interest"], tag="interest"),
+    ]:
+        response = client.post("/api/accounts/2/rules/", json=condition.model_dump(mode="json"))
+        assert response.status_code == 200
+
+    csv_file = (
+        '"date","transaction_type","description","amount","notes"\n'
+        '"01/07/2023","Payment","Interest paid","12.34",\n'
+        '"31/07/2023","Payment","Cafe","-3.50",\n'
+    )
+    response = client.post(
+        "/api/accounts/2/transactions/?ingest_type=csv",
+        files={"upload_file": ("transactions.csv", csv_file.encode(), "text/csv")},
+    )
+    assert response.status_code == 200
+
+    july = crud.get_transactions(db_session, 2, datetime(2023, 7, 1), datetime(2023, 7, 31))
+    assert [(tx.description, tx.is_value_adjustment) for tx in july] == [
+        ("Interest paid", True),
+        ("Cafe", False),
+    ]
+    totals = crud.get_tag_monthly_totals(
+        db_session, start_date=datetime(2023, 7, 1), end_date=datetime(2023, 7, 31)
+    )
+    assert totals == [
+        TagMonthlyTotal(
+            tag="interest", year_month="2023-07", transaction_count=1, total=Decimal("12.34")
+        )
+    ]
+    assert crud.get_tag_monthly_totals(db_session) == expected_totals(db_session)
+
+
+def test_deletes_cascade_to_tags(db_session):
+    add_tag_rules(2)
+    transaction_id = db_session.query(db_models.TransactionTag.transaction_id).first()[0]
+    db_session.execute(
+        delete(db_models.Transaction).where(db_models.Transaction.id == transaction_id)
+    )
+    db_session.commit()
+    tagged = db_session.query(db_models.TransactionTag.transaction_id)
+    assert transaction_id not in {tagged_id for (tagged_id,) in tagged}
+
+    # deleting the account takes its totals too
+    for model in [db_models.TransactionRule, db_models.Transaction, db_models.Account]:
+        column = model.id if model is db_models.Account else model.account_id
+        db_session.execute(delete(model).where(column == 2))
+    db_session.commit()
+    assert db_session.query(db_models.TransactionTag).count() == 0
+    assert db_session.query(db_models.TagMonthlyTotal).count() == 0
+
+
+def test_tag_monthly_totals_endpoint(db_session):
+    add_tag_rules(1)
+    add_tag_rules(2)
+
+    response = client.get("/api/tags/")
+    assert [tag["name"] for tag in response.json()] == ["cash", "income", "spending"]
+
+    path = "/api/tags/monthly/"
+    params = dict(account_ids="2", tags="cash", start_date="2023-01-01", end_date="2023-12-31")
+    response = client.get(path, params=params)
+    assert response.status_code == 200
+    totals = [TagMonthlyTotal.model_validate(total) for total in response.json()]
+    assert totals == [
+        total
+        for total in expected_totals(db_session, account_ids=[2])
+        if total.tag == "cash" and total.year_month.startswith("2023")
+    ]
+    assert totals
+
+    # account 1's totals are summed in with account 2's
+    both = client.get(path, params=dict(params, account_ids="1,2")).json()
+    assert sum(total["transaction_count"] for total in both) > sum(
+        total.transaction_count for total in totals
+    )
+
+    etag = response.headers["etag"]
+    response = client.get(path, params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_rules_endpoint():
+    add_tag_rules(1)
+    rules = client.get("/api/accounts/1/rules/").json()
+    assert [rule["condition"]["type_id"] for rule in rules].count("tag_contains_any") == 2
+
+    response = client.post("/api/accounts/1/rules/", json=dict(type_id="unknown", values=["x"]))
+    assert response.status_code == 422
+    response = client.post("/api/accounts/999/rules/", json=CONDITIONS[1][0].model_dump())
+    assert response.status_code == 404
+
+    # only text columns can be tagged on
+    condition = dict(CONDITIONS[1][0].model_dump(), read_col="amount")
+    response = client.post("/api/accounts/1/rules/", json=condition)
+    assert response.status_code == 422
+    condition = dict(CONDITIONS[1][0].model_dump(), read_col="notes", values=["x"])
+    response = client.post("/api/accounts/1/rules/", json=condition)
+    assert response.status_code == 200
@@ -0,0 +1,88 @@
+import json
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.main import app
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("insert_sample_data")
+
+PATH = "/api/accounts/1/transactions/"
+
+
+def get_pages(limit: int, **params) -> List[List[dict]]:
+    pages = []
+    params = dict(params, limit=limit)
+    while True:
+        response = client.get(PATH, params=params)
+        assert response.status_code == 200
+        pages.append(response.json())
+        if "x-next-cursor" not in response.headers:
+            return pages
+        params["cursor"] = response.headers["x-next-cursor"]
+
+
+def test_pages_cover_every_transaction():
+    transactions = client.get(PATH).json()
+    assert len(transactions) > 10
+
+    pages = get_pages(limit=7)
+    assert [len(page) for page in pages[:-1]] == [7] * (len(pages) - 1)
+    assert 1 <= len(pages[-1]) <= 7
+    assert [transaction for page in pages for transaction in page] == transactions
+
+
+def test_pages_within_dates():
+    params = dict(start_date="2023-01-01T00:00:00", end_date="2023-12-31T23:59:59")
+    transactions = client.get(PATH, params=params).json()
+    assert transactions
+
+    pages = get_pages(limit=3, **params)
+    assert [transaction for page in pages for transaction in page] == transactions
+
+
+def test_last_page_has_no_cursor():
+    count = len(client.get(PATH).json())
+    response = client.get(PATH, params=dict(limit=count))
+    assert len(response.json()) == count
+    assert "x-next-cursor" not in response.headers
+
+
+def test_total_count():
+    params = dict(start_date="2023-01-01T00:00:00", end_date="2023-12-31T23:59:59")
+    count = len(client.get(PATH, params=params).json())
+
+    response = client.get(PATH, params=dict(params, limit=2, include_total=True))
+    assert len(response.json()) == 2
+    assert response.headers["x-total-count"] == str(count)
+    assert "x-total-count" not in client.get(PATH, params=dict(limit=2)).headers
+
+
+@pytest.mark.parametrize("params", [dict(limit=0), dict(limit=100000), dict(cursor="not-a-cursor")])
+def test_invalid_page_params(params):
+    response = client.get(PATH, params=params)
+    assert response.status_code in (400, 422)
+
+
+@pytest.mark.parametrize("params", [{}, dict(limit=5)])
+def test_ndjson_stream(params):
+    transactions = client.get(PATH, params=params).json()
+
+    response = client.get(PATH, params=params, headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert "etag" not in response.headers
+    lines = response.text.splitlines()
+    assert [json.loads(line) for line in lines] == transactions
+
+
+def test_json_and_its_304_vary_on_accept():
+    response = client.get(PATH)
+    assert "Accept" in [value.strip() for value in response.headers["vary"].split(",")]
+
+    response = client.get(PATH, headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+    assert "Accept" in [value.strip() for value in response.headers["vary"].split(",")]
@@ -0,0 +1,143 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import crud
+from backend.api_models import TransactionCreate, TransactionSearchResult
+from backend.dialects import is_postgres
+from backend.main import app
+
+client = TestClient(app)
+
+PATH = "/api/transactions/search/"
+
+SEARCHED_TRANSACTIONS = [
+    (1, datetime(2023, 3, 4), "Zanzibar Coffee Roasters", "Card Payment", None),
+    (1, datetime(2023, 5, 6), "Zanzibar Coffee Roasters", "Card Payment", "beans for the office"),
+    (2, datetime(2023, 7, 8), "Coffee beans from Zanzibar", "Card Payment", None),
+    (2, datetime(2024, 1, 2), "Roastery gift card", "Card Payment", "zanzibar blend"),
+]
+
+
+@pytest.fixture(scope="function")
+def searched_transactions(db_session, insert_sample_data):
+    crud.create_transactions(
+        db_session=db_session,
+        transactions=[
+            TransactionCreate(
+                account_id=account_id,
+                date_time=date_time,
+                amount=Decimal("-4.50"),
+                description=description,
+                transaction_type=transaction_type,
+                notes=notes,
+            )
+            for account_id, date_time, description, transaction_type, notes in SEARCHED_TRANSACTIONS
+        ],
+    )
+
+
+@pytest.mark.parametrize(
+    "search,expected",
+    [
+        ("coffee", "coffee"),
+        ("Coffee  beans", "Coffee & beans"),
+        ("roast*", "roast:*"),
+        ('"coffee roasters" -gift', "coffee <-> roasters & !(gift)"),
+        ('"unfinished phrase', "unfinished <-> phrase"),
+        ("co-op", "co <-> op"),
+        ("a'); drop", "a & drop"),
+        ("-coffee", None),
+        ("* & !", None),
+        ("", None),
+    ],
+)
+def test_build_tsquery(search, expected):
+    assert crud.build_tsquery(search) == expected
+
+
+def search(**params) -> list[TransactionSearchResult]:
+    response = client.get(PATH, params=params)
+    assert response.status_code == 200
+    return [TransactionSearchResult.model_validate(result) for result in response.json()]
+
+
+@pytest.mark.postgres
+@pytest.mark.usefixtures("searched_transactions")
+def test_search_ranks_and_marks_matches():
+    results = search(q="zanzibar coffee")
+    assert [result.description for result in results] == [
+        "Zanzibar Coffee Roasters",
+        "Zanzibar Coffee Roasters",
+        "Coffee beans from Zanzibar",
+    ]
+    assert results[0].rank >= results[1].rank >= results[2].rank > 0
+    # equal ranks, the most recent first
+    assert results[0].date_time > results[1].date_time
+    assert (
+        results[0].snippet == "**Zanzibar** **Coffee** Roasters Card Payment beans for the office"
+    )
+
+    # words are stemmed and notes searched too
+    assert [result.notes for result in search(q="blends")] == ["zanzibar blend"]
+    assert {result.description for result in search(q="roast*")} == {
+        "Zanzibar Coffee Roasters",
+        "Roastery gift card",
+    }
+
+
+@pytest.mark.postgres
+@pytest.mark.usefixtures("searched_transactions")
+def test_search_phrases_and_exclusions():
+    assert len(search(q='"coffee roasters"')) == 2
+    assert len(search(q='"roasters coffee"')) == 0
+    assert [result.description for result in search(q="zanzibar -coffee")] == ["Roastery gift card"]
+
+
+@pytest.mark.postgres
+@pytest.mark.usefixtures("searched_transactions")
+def test_search_filters():
+    assert {result.account_id for result in search(q="zanzibar", account_ids="2")} == {2}
+    assert len(search(q="zanzibar", account_ids="1,2")) == 4
+    dates = [
+        result.date_time
+        for result in search(q="zanzibar", start_date="2023-05-01", end_date="2023-12-31")
+    ]
+    assert dates == [datetime(2023, 7, 8), datetime(2023, 5, 6)]
+    assert len(search(q="zanzibar", limit=1)) == 1
+
+
+@pytest.mark.postgres
+@pytest.mark.usefixtures("searched_transactions")
+def test_search_etag(db_session):
+    response = client.get(PATH, params=dict(q="zanzibar"))
+    etag = response.headers["etag"]
+    response = client.get(PATH, params=dict(q="zanzibar"), headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    crud.create_transactions(
+        db_session=db_session,
+        transactions=TransactionCreate(
+            account_id=2,
+            date_time=datetime(2024, 2, 1),
+            amount=Decimal("-3"),
+            description="Zanzibar again",
+            transaction_type="Card Payment",
+        ),
+    )
+    response = client.get(PATH, params=dict(q="zanzibar"), headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+
+
+@pytest.mark.parametrize("params", [dict(q="-coffee"), dict(q=""), dict(q="a", limit=0)])
+def test_invalid_searches(db_session, params):
+    response = client.get(PATH, params=params)
+    assert response.status_code in ((400, 422) if is_postgres(db_session) else (422, 501))
+
+
+def test_search_needs_postgres(db_session):
+    response = client.get(PATH, params=dict(q="coffee"))
+    assert response.status_code == (200 if is_postgres(db_session) else 501)
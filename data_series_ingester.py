@@ -31,6 +31,8 @@ def ingest_data_series(csv_file):
                 data_series_list.append(DataSeriesCreate(date_time=date_time, key=key, value=value))
     result = add_data_series_values(data_series_list)
     print(f"Values added: {result.values_added}")
+    print(f"Values updated: {result.values_updated}")
+    print(f"Values unchanged: {result.values_unchanged}")
 
 
 def main():
@@ -1,30 +1,89 @@
+import argparse
 import os
+import time
+from datetime import datetime
 
-from backend import crud
-from backend.db import SessionLocal
-from backend.test.sample_data_utils import (
-    create_sample_accounts,
-    create_sample_rules,
-    create_sample_transactions,
-    create_tax_data_series,
-)
+# The container runs this before every start, so the backend and the generators are only imported
+# once there's data to load.
 
-sample_accounts = create_sample_accounts()
-sample_rules = create_sample_rules()
-sample_transactions = create_sample_transactions()
-sample_data_series = create_tax_data_series()
 
-db_session = SessionLocal()
+def load_demo_data(db_session):
+    from backend import crud
+    from backend.sample_data import (
+        create_sample_accounts,
+        create_sample_rules,
+        create_sample_transactions,
+        create_tax_data_series,
+    )
+
+    sample_accounts = create_sample_accounts()
+    sample_rules = create_sample_rules()
+    sample_transactions = create_sample_transactions()
+    sample_data_series = create_tax_data_series()
+
+    print(f"Adding {len(sample_accounts)} accounts.")
+    crud.create_accounts(db_session=db_session, accounts=sample_accounts)
+    print(f"Adding {len(sample_rules)} rules.")
+    crud.create_transaction_rules(db_session=db_session, rules=sample_rules)
+    print(f"Adding {len(sample_transactions)} transactions.")
+    crud.create_transactions(db_session=db_session, transactions=sample_transactions)
+    print(f"Adding {len(sample_data_series)} data series values.")
+    crud.create_data_series(db_session=db_session, values=sample_data_series)
+
+
+def load_generated_data(db_session, args: argparse.Namespace):
+    from backend.sample_data import bulk_load_dataset, create_dataset_specs
+
+    specs = create_dataset_specs(
+        num_accounts=args.accounts,
+        years=args.years,
+        transactions_per_month=args.transactions_per_month,
+        end_date=args.end_date,
+    )
+    start = time.perf_counter()
+    count = bulk_load_dataset(db_session, specs, seed=args.seed)
+    print(
+        f"Added {len(specs)} accounts and {count} transactions in {time.perf_counter() - start:.1f}s."
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load the demo sample data when LOAD_SAMPLE_DATA=true, or with --accounts a "
+        "generated dataset of any size for load testing."
+    )
+    parser.add_argument("--accounts", type=int, help="Number of accounts to generate")
+    parser.add_argument("--years", type=int, default=10, help="Years of history")
+    parser.add_argument(
+        "--transactions-per-month",
+        type=int,
+        default=40,
+        help="Withdrawals a month from each current account",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--end-date",
+        type=datetime.fromisoformat,
+        help="Date the history runs up to, e.g. 2024-12-31, today by default.  Fix it as well as "
+        "the seed to get the same data every time.",
+    )
+    args = parser.parse_args()
+
+    if args.accounts is None and os.getenv("LOAD_SAMPLE_DATA", "false").lower() != "true":
+        return
+
+    from backend import crud
+    from backend.db import get_session_factory
+
+    db_session = get_session_factory()()
 
-if os.getenv("LOAD_SAMPLE_DATA", "false").lower() == "true":
     if crud.get_accounts(db_session=db_session):
         print("Database already populated, not loading sample data.")
+    elif args.accounts is None:
+        load_demo_data(db_session)
     else:
-        print(f"Adding {len(sample_accounts)} accounts.")
-        crud.create_accounts(db_session=db_session, accounts=sample_accounts)
-        print(f"Adding {len(sample_rules)} rules.")
-        crud.create_transaction_rules(db_session=db_session, rules=sample_rules)
-        print(f"Adding {len(sample_transactions)} transactions.")
-        crud.create_transactions(db_session=db_session, transactions=sample_transactions)
-        print(f"Adding {len(sample_data_series)} data series values.")
-        crud.create_data_series(db_session=db_session, values=sample_data_series)
+        load_generated_data(db_session, args)
+
+
+if __name__ == "__main__":
+    main()